@@ -0,0 +1,86 @@
+# coding=utf-8
+"""
+Fixtures, shared by the unit tests.
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from trololo.client import TrololoClient
+from trololo.idmapper import TrololoIdMapper
+from trololo.mirror import TrololoMirror
+
+BOARD = {
+    "id": "b1", "name": "Board",
+    "lists": [{"id": "l1", "name": "Todo", "pos": 1}, {"id": "l2", "name": "Done", "pos": 2}],
+    "cards": [{"id": "c1", "name": "First", "idList": "l1", "pos": 2, "idLabels": []},
+              {"id": "c2", "name": "Second", "idList": "l1", "pos": 1, "idLabels": []}],
+    "labels": [{"id": "a1", "name": "bug", "color": "red"}],
+    "actions": [{"id": "5a1", "type": "commentCard", "date": "2019-01-01",
+                 "data": {"text": "hello", "card": {"id": "c1"}}}],
+}
+
+
+@pytest.fixture
+def make_response():
+    """
+    Get maker of the fake HTTP responses.
+
+    :return:
+    """
+    def make(payload=None, status_code=200, text=""):
+        response = MagicMock()
+        response.status_code = status_code
+        response.text = text
+        response.json = MagicMock(return_value=payload)
+
+        return response
+
+    return make
+
+
+@pytest.fixture
+def make_client():
+    """
+    Get maker of the clients without network, answering by the request function.
+
+    :return:
+    """
+    def make(request):
+        client = TrololoClient("uid", "key", "token")
+        client._request = MagicMock(side_effect=request)
+
+        return client
+
+    return make
+
+
+@pytest.fixture
+def make_mirror(make_client, tmp_path):
+    """
+    Get maker of the mirrors of the board over the client without network.
+
+    :return:
+    """
+    def make(actions=None):
+        def request(uri, query=None, method="GET", refresh=False):
+            assert refresh, "Mirror is not synced from the cache"
+            if uri == "boards/b1/actions":
+                return [{"id": "5a0"}] if query.get("limit") == 1 else list(actions or [])
+            return dict(BOARD, lists=[dict(obj) for obj in BOARD["lists"]],
+                        cards=[dict(obj) for obj in BOARD["cards"]], actions=[dict(obj) for obj in BOARD["actions"]])
+
+        return TrololoMirror(make_client(request), str(tmp_path / "mirror.db"))
+
+    return make
+
+
+@pytest.fixture
+def mapper(tmp_path):
+    """
+    Get ID mapper in the temporary directory.
+
+    :return:
+    """
+    with patch("sys.stderr.write", MagicMock()):
+        return TrololoIdMapper(str(tmp_path))
@@ -3,6 +3,7 @@
 Unit tests for App
 """
 
+import os
 import pytest
 import yaml.parser
 from unittest.mock import MagicMock, patch, mock_open
@@ -89,3 +90,105 @@ class TestTrololoApp(object):
             assert stderr.called
             assert err_msg in stderr.call_args[0][0]
             assert "\nError:\n  {}\n\n".format(err_msg) == stderr.call_args[0][0]
+
+    def test_render_streams_blocks(self, app):
+        """
+        Test every block of the output is written and flushed as soon as it is produced.
+
+        :param app:
+        :return:
+        """
+        app._datamapper = MagicMock()
+        stdout = MagicMock()
+        with patch("sys.stdout", stdout):
+            app._render(iter([["first", "line"], ["second"]]))
+        assert stdout.write.call_count == 2
+        assert stdout.flush.call_count == 2
+        assert stdout.write.call_args_list[0][0][0].startswith("first")
+        app._datamapper.save.assert_called_once_with(True)
+
+    def test_render_stops_on_broken_pipe(self, app):
+        """
+        Test output generator is stopped once the reader is gone, while the IDs are still saved.
+
+        :param app:
+        :return:
+        """
+        fetched = []
+
+        def blocks():
+            for idx in range(10):
+                fetched.append(idx)
+                yield [str(idx)]
+
+        app._datamapper = MagicMock()
+        stdout = MagicMock()
+        stdout.write = MagicMock(side_effect=[None, BrokenPipeError()])
+        stdout.fileno = MagicMock(side_effect=ValueError())
+        with patch("sys.stdout", stdout):
+            app._render(blocks())
+        assert fetched == [0, 1]
+        app._datamapper.save.assert_called_once_with(True)
+
+    def test_config_cache(self, app, tmp_path, monkeypatch):
+        """
+        Test configuration is parsed once and again, once it has changed.
+
+        :param app:
+        :return:
+        """
+        monkeypatch.chdir(str(tmp_path))
+        with open("edward.conf", "w") as cfg_h:
+            cfg_h.write("uid: me\nmapper: sqlite\n")
+        assert app._load_config("edward.conf") == {"uid": "me", "mapper": "sqlite"}
+        assert os.path.exists(app.CONFIG_CACHE_FILE)
+
+        with patch("yaml.safe_load", MagicMock(side_effect=AssertionError("parsed again"))):
+            assert app._load_config("edward.conf") == {"uid": "me", "mapper": "sqlite"}
+
+        with open("edward.conf", "a") as cfg_h:
+            cfg_h.write("search: false\n")
+        assert app._load_config("edward.conf") == {"uid": "me", "mapper": "sqlite", "search": False}
+
+    @patch("trololo.app.TrololoClient", MagicMock(return_value=MagicMock(throttled=0)))
+    @patch("trololo.app.get_mapper", MagicMock())
+    def test_search_opt_in(self, app, tmp_path, monkeypatch):
+        """
+        Test search index is not written, unless it is enabled in the configuration.
+
+        :param app:
+        :return:
+        """
+        monkeypatch.chdir(str(tmp_path))
+        with open("edward.conf", "w") as cfg_h:
+            cfg_h.write("uid: me\n")
+        app.cli_args = MagicMock(command="search", no_cache=True, timings=False)
+        app.cmd_args = ["crash"]
+        stderr = MagicMock()
+        with patch("sys.stderr.write", stderr):
+            with pytest.raises(SystemExit):
+                app.run()
+        assert 'Enable it with "search: true"' in stderr.call_args[0][0]
+        assert not os.path.exists(".edward-search.db")
+
+        with open("edward.conf", "a") as cfg_h:
+            cfg_h.write("search: true\n")
+        with patch("trololo.app.TrololoApp._render", MagicMock()):
+            app.run()
+        assert app._index_options == {}
+
+    def test_timings(self, app):
+        """
+        Test timings are reported for every phase.
+
+        :param app:
+        :return:
+        """
+        app._client = MagicMock(network=0.5, requests=3)
+        app._timings.update(config=0.001, command=app._timings["init"])
+        stderr = MagicMock()
+        with patch("sys.stderr.write", stderr):
+            app._report_timings()
+        report = stderr.call_args[0][0]
+        assert report.startswith("Timings: import ")
+        assert "config 0.001s, network 0.500s in 3 requests, command " in report
@@ -0,0 +1,115 @@
+# coding=utf-8
+"""
+Unit tests for the response cache.
+"""
+
+import os
+from unittest.mock import MagicMock
+
+from trololo.cache import TrololoCache
+from trololo.client import TrololoClient
+
+
+class TestTrololoCache(object):
+    """
+    Test response cache.
+    """
+    def test_key_without_credentials(self, tmp_path):
+        """
+        Test credentials are not the part of the key.
+
+        :return:
+        """
+        cache = TrololoCache(str(tmp_path))
+        url = "https://api.trello.com/1/boards/1"
+        assert cache.get_key(url, {"key": "a", "token": "b", "fields": "name"}) == \
+            cache.get_key(url, {"key": "c", "token": "d", "fields": "name"})
+        assert cache.get_key(url, {"fields": "name"}) != cache.get_key(url, {"fields": "all"})
+
+    def test_ttl_per_resource(self, tmp_path):
+        """
+        Test time to live is chosen by the resource and the nested ones.
+
+        :return:
+        """
+        cache = TrololoCache(str(tmp_path), ttl={"labels": 1000})
+        assert cache.get_ttl("boards/1/labels") == 1000
+        assert cache.get_ttl("boards/1") == TrololoCache.TTL["boards"]
+        assert cache.get_ttl("members/me/boards") == TrololoCache.TTL["boards"]
+        assert cache.get_ttl("cards/1/actions") == TrololoCache.TTL["actions"]
+        assert cache.get_ttl("batch", {"urls": "/boards/1/labels,/cards/2"}) == TrololoCache.TTL["cards"]
+        assert cache.get_ttl("boards/1", {"lists": "none", "labels": "all"}) == TrololoCache.TTL["boards"]
+        assert cache.get_ttl("boards/1", {"lists": "open", "cards": "open", "actions": "commentCard"}) == \
+            TrololoCache.TTL["actions"]
+        assert cache.get_ttl("batch", {"urls": "/boards/1?cards=open&lists=open,/boards/2/labels"}) == \
+            TrololoCache.TTL["cards"]
+
+    def test_fresh_and_revalidated(self, tmp_path, make_response):
+        """
+        Test fresh entry is answered from the disk, expired one is revalidated by ETag.
+
+        :return:
+        """
+        client = TrololoClient("uid", "key", "token", cache=TrololoCache(str(tmp_path)))
+        response = make_response([{"id": "1", "name": "label"}])
+        response.headers = {"ETag": "W/abc"}
+        client._session.request = MagicMock(return_value=response)
+
+        assert client._request("boards/1/labels") == client._request("boards/1/labels")
+        assert client._session.request.call_count == 1
+
+        client._cache.expire()
+        not_modified = make_response(status_code=304)
+        not_modified.headers = {"ETag": "W/abc"}
+        client._session.request = MagicMock(return_value=not_modified)
+        assert client._request("boards/1/labels") == [{"id": "1", "name": "label"}]
+        assert client._session.request.call_args[1]["headers"]["If-None-Match"] == "W/abc"
+
+    def test_refresh(self, tmp_path, make_response):
+        """
+        Test fresh entry is revalidated, once asked to refresh.
+
+        :return:
+        """
+        client = TrololoClient("uid", "key", "token", cache=TrololoCache(str(tmp_path)))
+        response = make_response([{"id": "1"}])
+        response.headers = {"ETag": "W/abc"}
+        client._session.request = MagicMock(return_value=response)
+        client._request("boards/1/actions", {"limit": 5})
+
+        response = make_response([{"id": "2"}, {"id": "1"}])
+        response.headers = {"ETag": "W/def"}
+        client._session.request = MagicMock(return_value=response)
+        assert list(client._pages("boards/1/actions", limit=5, refresh=True)) == [{"id": "2"}, {"id": "1"}]
+        assert client._session.request.call_args[1]["headers"]["If-None-Match"] == "W/abc"
+
+    def test_lru_eviction(self, tmp_path):
+        """
+        Test least recently used entries are evicted over the size limit.
+
+        :return:
+        """
+        cache = TrololoCache(str(tmp_path), size=0.01)
+        for idx in range(4):
+            cache.put(str(idx), "x" * 2400, None, 60)
+            os.utime(os.path.join(str(tmp_path), str(idx)), (idx, idx))
+        cache.get("0")
+        cache.put("last", "x" * 2400, None, 60)
+
+        assert cache.get("0") is not None
+        assert cache.get("last") is not None
+        assert cache.get("1") is None
+
+    def test_overwrite_size(self, tmp_path):
+        """
+        Test overwritten entry is not counted twice in the size of the cache.
+
+        :return:
+        """
+        cache = TrololoCache(str(tmp_path), size=0.01)
+        cache.put("other", "x" * 2400, None, 60)
+        for _ in range(5):
+            cache.put("same", "x" * 2400, None, 60)
+
+        assert cache._size == cache._get_size()
+        assert cache.get("other") is not None
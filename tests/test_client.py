@@ -0,0 +1,327 @@
+# coding=utf-8
+"""
+Unit tests for the network client.
+"""
+
+import time
+import asyncio
+import pytest
+import concurrent.futures
+from unittest.mock import MagicMock
+
+from trololo.client import Trololo, TrololoClient, AsyncTrololoClient
+from trololo.lalala import TrololoList, TrololoCard
+import trololo.exceptions
+
+
+class TestTrololoClient(object):
+    """
+    Test network client.
+    """
+    def test_session_pool_reused(self, make_response):
+        """
+        Test all requests are going through the same keep-alive session.
+
+        :return:
+        """
+        client = TrololoClient("uid", "key", "token", pool_size=4, timeout=[3, 15])
+        client._session.request = MagicMock(return_value=make_response({"id": "1", "name": "list"}))
+        client.get_lists("1")
+        client.get_cards("2")
+
+        assert client._session.request.call_count == 2
+        for call in client._session.request.call_args_list:
+            assert call[1]["timeout"] == (3, 15)
+            assert call[1]["params"]["key"] == "key"
+            assert call[1]["params"]["token"] == "token"
+        assert client._session.get_adapter("https://api.trello.com/1/")._pool_maxsize == 4
+
+    def test_session_closed(self):
+        """
+        Test connection pool is released on leaving the context and is not used after.
+
+        :return:
+        """
+        session = MagicMock()
+        with Trololo("uid", "key", "token") as client:
+            client._session = session
+        assert session.close.called
+        assert client._Trololo__session is None
+        assert client._session is not session
+
+    def test_session_on_demand(self, make_response):
+        """
+        Test HTTP session is created on the first request, which is counted for the timings.
+
+        :return:
+        """
+        with Trololo("uid", "key", "token") as client:
+            assert client._Trololo__session is None
+        assert client._Trololo__session is None
+
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(return_value=make_response({"id": "1", "name": "list"}))
+        client.get_lists("1")
+        assert client.requests == 1
+        assert client.network > 0
+
+    def test_session_thread_safe(self, make_response):
+        """
+        Test parallel first requests create only one session, which is closed.
+
+        :return:
+        """
+        sessions = []
+
+        def get_session(pool_size):
+            time.sleep(0.01)
+            session = MagicMock()
+            session.request = MagicMock(return_value=make_response({"id": "1", "name": "list"}))
+            sessions.append(session)
+            return session
+
+        client = TrololoClient("uid", "key", "token")
+        client._get_session = get_session
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda idx: client._request("lists/{}".format(idx)), range(8)))
+        client.close()
+
+        assert len(sessions) == 1
+        assert sessions[0].request.call_count == 8
+        assert sessions[0].close.called
+
+    def test_unauthorised(self, make_response):
+        """
+        Test unauthorised response.
+
+        :return:
+        """
+        client = Trololo("uid", "key", "token")
+        client._session.request = MagicMock(return_value=make_response(status_code=401, text="invalid key"))
+        with pytest.raises(trololo.exceptions.UnauthorisedError) as ex:
+            client._request("boards/1")
+        assert "invalid key" in str(ex.value)
+
+    def test_batch_get_cards(self, make_response):
+        """
+        Test cards are fetched through the batch endpoint, ten at a time.
+
+        :return:
+        """
+        def batch(method, url, params=None, **kwargs):
+            routes = params["urls"].split(",")
+            assert url.endswith("/batch")
+            assert all(route.endswith("?filter=open&fields=all&customFieldItems=true") for route in routes)
+            return make_response([{"200": {"id": route.split("?")[0].split("/")[-1], "name": "card"}}
+                                 for route in routes])
+
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(side_effect=batch)
+        cards = client.get_cards(*[str(idx) for idx in range(25)])
+
+        assert client._session.request.call_count == 3
+        assert [card.id for card in cards] == [str(idx) for idx in range(25)]
+
+    def test_get_cards_projection(self, make_response):
+        """
+        Test only the requested fields of the cards are fetched.
+
+        :return:
+        """
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(return_value=make_response({"id": "1", "name": "card"}))
+        card = client.get_cards("1", fields="name", custom_fields=False)[0]
+
+        params = client._session.request.call_args[1]["params"]
+        assert params["fields"] == "name"
+        assert "customFieldItems" not in params
+        assert card.name == "card"
+
+    def test_board_tree_card_projection(self, make_response):
+        """
+        Test cards of the board tree are always fetched with their list ID to nest them.
+
+        :return:
+        """
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(return_value=make_response(
+            {"id": "b", "name": "board", "lists": [{"id": "l", "name": "list"}],
+             "cards": [{"id": "c", "name": "card", "idList": "l"}]}))
+        board = client.get_board_tree("b", actions=False, labels=False, fields="name", card_fields="name")
+
+        params = client._session.request.call_args[1]["params"]
+        assert params["fields"] == "name"
+        assert params["card_fields"] == "idList,name"
+        assert board.get_lists()[0].get_cards()[0].name == "card"
+
+    def test_get_board_labels(self, make_response):
+        """
+        Test labels of the board are fetched without the lists, cards and comments.
+
+        :return:
+        """
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(return_value=make_response(
+            {"id": "b", "name": "board", "labels": [{"id": "lb", "name": "bug"}]}))
+        board = client.get_board_tree("b", lists=False, fields="name")
+
+        params = client._session.request.call_args[1]["params"]
+        assert params["lists"] == "none"
+        assert "cards" not in params
+        assert "actions" not in params
+        assert board.get_labels()[0].name == "bug"
+
+    def test_get_boards_by_ids(self, make_response):
+        """
+        Test boards, given by IDs, are fetched directly instead of listing all of them.
+
+        :return:
+        """
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(return_value=make_response(
+            [{"200": {"id": "1", "name": "first"}}, {"200": {"id": "2", "name": "second"}}]))
+        boards = client.get_boards("1", "2", fields="name", lists="none")
+
+        assert client._session.request.call_count == 1
+        assert client._session.request.call_args[1]["params"]["urls"] == "/boards/1?fields=name&lists=none," \
+                                                                         "/boards/2?fields=name&lists=none"
+        assert [board.name for board in boards] == ["first", "second"]
+
+    def test_get_all_boards(self, make_response):
+        """
+        Test boards of the member are listed without IDs.
+
+        :return:
+        """
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(return_value=make_response([{"id": "1", "name": "first"}]))
+        boards = client.get_boards()
+
+        assert client._session.request.call_args[0][1].endswith("/members/uid/boards")
+        assert [board.name for board in boards] == ["first"]
+
+    def test_batch_failure(self, make_response):
+        """
+        Test failed route in the batch raises an error.
+
+        :return:
+        """
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(return_value=make_response(
+            [{"200": {"id": "1", "name": "list"}}, {"name": "NotFoundError", "statusCode": 404}]))
+        with pytest.raises(trololo.exceptions.UnknownResourceError) as ex:
+            client.get_lists("1", "2")
+        assert "lists/2" in str(ex.value)
+
+    def test_get_board_tree(self, make_response):
+        """
+        Test board graph is built from the nested response, paging comments.
+
+        :return:
+        """
+        board = {
+            "id": "b1", "name": "board",
+            "lists": [{"id": "l1", "name": "todo"}, {"id": "l2", "name": "done"}],
+            "cards": [{"id": "c1", "name": "first", "idList": "l1"}, {"id": "c2", "name": "second", "idList": "l1"}],
+            "actions": [{"id": "a1", "data": {"text": "hi", "card": {"id": "c2"}}}],
+        }
+        page = [{"id": "a2", "data": {"text": "there", "card": {"id": "c2"}}}]
+
+        client = TrololoClient("uid", "key", "token")
+        client.ACTIONS_LIMIT = 1
+        client._session.request = MagicMock(side_effect=[make_response(board), make_response(page),
+                                                         make_response([])])
+        t_board = client.get_board_tree("b1")
+        lists = t_board.get_lists()
+
+        assert [t_list.name for t_list in lists] == ["todo", "done"]
+        assert [card.name for card in lists[0].get_cards()] == ["first", "second"]
+        assert lists[1].get_cards() == []
+        assert [action.get_text() for action in lists[0].get_cards()[1].get_actions()] == ["hi", "there"]
+        assert client._session.request.call_args_list[1][1]["params"]["before"] == "a1"
+        assert client._session.request.call_count == 3
+
+    def test_stream_cards(self, make_response):
+        """
+        Test cards of the list are decoded from the response stream.
+
+        :return:
+        """
+        response = make_response()
+        response.iter_content = MagicMock(return_value=iter([b'[{"id": "c1", "name": "fir', b'st"}, {"id": "c2"',
+                                                             b', "name": "second"}]']))
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(return_value=response)
+        cards = TrololoList.load(client, {"id": "l1", "name": "list"}).iter_cards()
+
+        assert next(cards).name == "first"
+        assert client._session.request.call_args[1]["stream"]
+        assert [card.name for card in cards] == ["second"]
+        assert response.close.called
+
+    def test_card_history_pages(self, make_response):
+        """
+        Test card history is fetched page by page, with the type filter and page limit.
+
+        :return:
+        """
+        pages = {
+            None: [{"id": "a3", "data": {"text": "3"}}, {"id": "a2", "data": {"text": "2"}}],
+            "a2": [{"id": "a1", "data": {"text": "1"}}],
+        }
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(
+            side_effect=lambda method, url, params=None, **kw: make_response(pages[params.get("before")]))
+        card = TrololoCard.load(client, {"id": "c1", "name": "card"})
+
+        assert [action.get_text() for action in card.iter_history(page_size=2)] == ["3", "2", "1"]
+        assert client._session.request.call_count == 2
+        for call in client._session.request.call_args_list:
+            assert call[1]["params"]["filter"] == "commentCard"
+            assert call[1]["params"]["limit"] == 2
+
+    def test_card_history_stop(self, make_response):
+        """
+        Test card history is not fetched further than the next page, once iteration is stopped.
+
+        :return:
+        """
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(return_value=make_response([{"id": "a", "data": {"text": "x"}}] * 2))
+        history = TrololoCard.load(client, {"id": "c1", "name": "card"}).iter_history(page_size=2, since="2019-01-01")
+
+        assert next(history).get_text() == "x"
+        history.close()
+        assert client._session.request.call_count <= 2
+        assert client._session.request.call_args_list[0][1]["params"]["since"] == "2019-01-01"
+
+
+class TestAsyncTrololoClient(object):
+    """
+    Test asyncio client.
+    """
+    def test_get_cards_and_actions(self, make_response):
+        """
+        Test cards and their actions are fetched by coroutines.
+
+        :return:
+        """
+        def request(method, url, params=None, **kwargs):
+            if url.endswith("/batch"):
+                return make_response([{"200": {"id": route.split("?")[0].split("/")[-1], "name": "card"}}
+                                      for route in params["urls"].split(",")])
+            return make_response([{"id": "a", "data": {"text": url}}])
+
+        async def fetch():
+            async with AsyncTrololoClient("uid", "key", "token") as client:
+                client.client._session = MagicMock()
+                client.client._session.request = MagicMock(side_effect=request)
+                cards = await client.get_cards("c1", "c2", "c3")
+                assert client.client._session.request.call_count == 1
+                actions = await asyncio.gather(*[client.get_actions(card) for card in cards])
+                return cards, actions
+
+        cards, actions = asyncio.run(fetch())
+        assert [card.id for card in cards] == ["c1", "c2", "c3"]
+        assert [action[0].get_text() for action in actions] == [
+            "https://api.trello.com/1/cards/{}/actions".format(card_id) for card_id in ["c1", "c2", "c3"]]
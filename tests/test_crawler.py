@@ -0,0 +1,75 @@
+# coding=utf-8
+"""
+Unit tests for the crawler.
+"""
+
+import time
+import random
+import threading
+
+import pytest
+
+from trololo.crawler import TrololoCrawler
+
+
+class TestTrololoCrawler(object):
+    """
+    Test bounded-concurrency crawler.
+    """
+    def test_serial_map(self):
+        """
+        Test single job runs in the calling thread.
+
+        :return:
+        """
+        with TrololoCrawler() as crawler:
+            assert crawler.map(lambda _: threading.current_thread(), range(3)) == [threading.current_thread()] * 3
+
+    def test_parallel_map_order(self):
+        """
+        Test results are returned in the order of the items, regardless of the completion.
+
+        :return:
+        """
+        def fetch(item):
+            time.sleep(random.random() / 100)
+            return item * 2
+
+        with TrololoCrawler(jobs=8) as crawler:
+            assert crawler.map(fetch, range(50)) == [item * 2 for item in range(50)]
+
+    def test_imap_bounded(self):
+        """
+        Test items are consumed lazily, while results keep the order of the items.
+
+        :return:
+        """
+        taken = []
+
+        def items():
+            for idx in range(20):
+                taken.append(idx)
+                yield idx
+
+        with TrololoCrawler(jobs=2) as crawler:
+            results = crawler.imap(lambda idx: time.sleep(random.random() / 100) or idx * 2, items())
+            assert next(results) == 0
+            assert len(taken) <= 4
+            assert list(results) == [idx * 2 for idx in range(1, 20)]
+
+    def test_imap_items_error(self):
+        """
+        Test results of the calls in flight are yielded before the error of the items.
+
+        :return:
+        """
+        def items():
+            yield from range(3)
+            raise ValueError("broken")
+
+        results = []
+        with TrololoCrawler(jobs=4) as crawler:
+            with pytest.raises(ValueError):
+                for result in crawler.imap(lambda idx: time.sleep(random.random() / 100) or idx * 2, items()):
+                    results.append(result)
+        assert results == [0, 2, 4]
@@ -3,10 +3,16 @@
 Unit test for ID mapper
 """
 
+import os
+import sys
+import fcntl
+import pickle
 import pytest
+import threading
+import subprocess
 from unittest.mock import MagicMock, patch, mock_open
 
-from trololo.idmapper import TrololoIdMapper
+from trololo.idmapper import TrololoIdMapper, TrololoSqliteIdMapper, TrololoMmapIdMapper, get_mapper
 from trololo.lalala import TrololoBoard, TrololoList, TrololoCard, TrololoAction, TrololoLabel
 import trololo.exceptions
 
@@ -135,6 +141,7 @@ class TestIDMapper(object):
 
     @patch("sys.stderr.write", MagicMock())
     @patch("trololo.idmapper.open", mock_open(), create=True)
+    @patch("fcntl.flock", MagicMock())
     def test_save_dump(self):
         """
         Test save.
@@ -153,6 +160,7 @@ class TestIDMapper(object):
 
     @patch("sys.stderr.write", MagicMock())
     @patch("trololo.idmapper.open", mock_open(), create=True)
+    @patch("fcntl.flock", MagicMock())
     @patch("pickle.dump", MagicMock(side_effect=IOError("Electricians made popcorn in the power supply")))
     def test_save_dump_failure(self):
         """
@@ -161,6 +169,465 @@ class TestIDMapper(object):
         :return:
         """
 
+        mapper = TrololoIdMapper("/tmp")
+        mapper.add_board(TrololoBoard.load(None, {"id": "networking", "name": "Loop in redundant loopback"}))
         with pytest.raises(Exception) as ex:
-            TrololoIdMapper("/tmp").save()
+            mapper.save()
         assert "popcorn" in str(ex)
+
+    @patch("sys.stderr.write", MagicMock())
+    def test_prefix_lookup(self):
+        """
+        Test prefix lookup takes only names, starting with the text.
+
+        :return:
+        """
+        mapper = TrololoIdMapper("/tmp")
+        for idx, name in enumerate(["Sprint 1", "Sprint 10", "Sprint 2", "Sprin", "Backlog", "Sprint 1 review"]):
+            mapper.add_list(TrololoList.load(None, {"id": "l{}".format(idx), "name": name}))
+
+        assert [name for name, _ in mapper._find(TrololoIdMapper.S_LIST, "Sprint 1")] == [
+            "Sprint 1", "Sprint 1 review", "Sprint 10"]
+        assert mapper.get_id_by_name("Sprint 2")[TrololoIdMapper.S_LIST] == {"l2"}
+        assert mapper.get_id_by_name("Back", TrololoIdMapper.S_LIST)[TrololoIdMapper.S_LIST] == {"l4"}
+
+    @patch("sys.stderr.write", MagicMock())
+    def test_prefix_lookup_ambiguous(self):
+        """
+        Test ambiguous prefix raises an error, unless restricted to the other section.
+
+        :return:
+        """
+        mapper = TrololoIdMapper("/tmp")
+        mapper.add_card(TrololoCard.load(None, {"id": "c1", "name": "Release notes"}))
+        mapper.add_card(TrololoCard.load(None, {"id": "c2", "name": "Release plan"}))
+        mapper.add_board(TrololoBoard.load(None, {"id": "b1", "name": "Release board"}))
+
+        with pytest.raises(trololo.exceptions.DataMapperError) as ex:
+            mapper.get_id_by_name("Release")
+        assert "More than one ID" in str(ex.value)
+        with pytest.raises(trololo.exceptions.DataMapperError) as ex:
+            mapper.get_id_by_name("Release", TrololoIdMapper.S_CARD)
+        assert 'Did you mean: "Release plan", "Release notes"' in str(ex.value)
+        assert mapper.get_id_by_name("Release", TrololoIdMapper.S_BOARD)[TrololoIdMapper.S_BOARD] == {"b1"}
+
+
+    @pytest.mark.parametrize("storage", ["pickle", "sqlite", "mmap"])
+    @patch("sys.stderr.write", MagicMock())
+    def test_name_by_id(self, storage, tmp_path):
+        """
+        Test name is looked up by the ID, before and after it is saved.
+
+        :return:
+        """
+        mapper = get_mapper(str(tmp_path), storage)
+        assert mapper.get_name_by_id("l1", TrololoIdMapper.S_LIST) is None
+        mapper.add_list(TrololoList.load(None, {"id": "l1", "name": "Backlog"}))
+        assert mapper.get_name_by_id("l1", TrololoIdMapper.S_LIST) == "Backlog"
+        mapper.save()
+
+        mapper = get_mapper(str(tmp_path), storage)
+        assert mapper.get_name_by_id("l1", TrololoIdMapper.S_LIST) == "Backlog"
+        assert mapper.get_name_by_id("l1", TrololoIdMapper.S_CARD) is None
+
+    @pytest.mark.parametrize("storage", ["pickle", "sqlite", "mmap"])
+    @patch("sys.stderr.write", MagicMock())
+    def test_fuzzy_lookup(self, storage, tmp_path):
+        """
+        Test names in the section are found by the substring or with typos,
+        unless there is no clear candidate or several names start with the text.
+
+        :return:
+        """
+        mapper = get_mapper(str(tmp_path), storage)
+        for idx, name in enumerate(["Sprint 42", "Sprint 42 review", "Sprint 43", "Backlog"]):
+            mapper.add_list(TrololoList.load(None, {"id": "l{}".format(idx), "name": name}))
+        mapper.save()
+
+        assert mapper.get_id_by_name("sprint 42", TrololoIdMapper.S_LIST)[TrololoIdMapper.S_LIST] == {"l0"}
+        assert mapper.get_id_by_name("sprnt 43", TrololoIdMapper.S_LIST)[TrololoIdMapper.S_LIST] == {"l2"}
+        assert mapper.get_id_by_name("review", TrololoIdMapper.S_LIST)[TrololoIdMapper.S_LIST] == {"l1"}
+        with pytest.raises(trololo.exceptions.DataMapperError) as ex:
+            mapper.get_id_by_name("Sprint 4", TrololoIdMapper.S_LIST)
+        assert 'Did you mean: "Sprint 42", "Sprint 43", "Sprint 42 review"' in str(ex.value)
+        with pytest.raises(trololo.exceptions.DataMapperError):
+            mapper.get_id_by_name("Sprint 42", TrololoIdMapper.S_LIST)
+        with pytest.raises(trololo.exceptions.DataMapperError):
+            mapper.get_id_by_name("sprint 42", TrololoIdMapper.S_CARD)
+
+        mapper = get_mapper(str(tmp_path), storage)
+        mapper.add_list(TrololoList.load(None, {"id": "l4", "name": "Icebox"}))
+        assert [name for name, _, _ in mapper.find_names("icebox", TrololoIdMapper.S_LIST)] == ["Icebox"]
+        assert mapper.get_id_by_name("backlg", TrololoIdMapper.S_LIST)[TrololoIdMapper.S_LIST] == {"l3"}
+        with pytest.raises(trololo.exceptions.DataMapperError):
+            mapper.get_id_by_name("backlg", TrololoIdMapper.S_LIST, fuzzy=False)
+        assert any(name.endswith(".lists" + TrololoIdMapper.NGRAM_SUFFIX) for name in os.listdir(str(tmp_path)))
+
+    @pytest.mark.parametrize("storage", ["pickle", "sqlite", "mmap"])
+    @patch("sys.stderr.write", MagicMock())
+    def test_fuzzy_index_journal(self, storage, tmp_path):
+        """
+        Test trigram index is brought up to date by the saved changes, instead of building it again.
+
+        :return:
+        """
+        mapper = get_mapper(str(tmp_path), storage)
+        mapper.add_list(TrololoList.load(None, {"id": "l0", "name": "Backlog"}))
+        mapper.save()
+        assert mapper.get_id_by_name("backlog", TrololoIdMapper.S_LIST)[TrololoIdMapper.S_LIST] == {"l0"}
+        path = [str(tmp_path / name) for name in os.listdir(str(tmp_path))
+                if name.endswith(".lists" + TrololoIdMapper.NGRAM_SUFFIX)][0]
+        mtime = os.stat(path).st_mtime_ns
+
+        mapper.add_list(TrololoList.load(None, {"id": "l1", "name": "Icebox"}))
+        mapper.remove(TrololoIdMapper.S_LIST, "l0")
+        mapper.save()
+        mapper = get_mapper(str(tmp_path), storage)
+        mapper.add_list(TrololoList.load(None, {"id": "l2", "name": "Review"}))
+        mapper.save()
+
+        mapper = get_mapper(str(tmp_path), storage)
+        assert mapper.get_id_by_name("icebox", TrololoIdMapper.S_LIST)[TrololoIdMapper.S_LIST] == {"l1"}
+        assert mapper.get_id_by_name("review", TrololoIdMapper.S_LIST)[TrololoIdMapper.S_LIST] == {"l2"}
+        assert mapper.find_names("backlog", TrololoIdMapper.S_LIST) == []
+        assert os.stat(path).st_mtime_ns == mtime
+
+    @pytest.mark.parametrize("storage", ["pickle", "sqlite", "mmap"])
+    @patch("sys.stderr.write", MagicMock())
+    def test_fuzzy_lookup_while_saving(self, storage, tmp_path):
+        """
+        Test lookups in the trigram index and saves from other threads do not wait for each other forever.
+
+        :return:
+        """
+        mapper = get_mapper(str(tmp_path), storage)
+        mapper.add_list(TrololoList.load(None, {"id": "l0", "name": "Backlog"}))
+        mapper.save()
+
+        def save():
+            for idx in range(1, 50):
+                mapper.add_list(TrololoList.load(None, {"id": "l{}".format(idx), "name": "List {}".format(idx)}))
+                mapper.save()
+
+        def lookup():
+            for _ in range(50):
+                mapper.find_names("backlg", TrololoIdMapper.S_LIST)
+                mapper.load()
+
+        threads = [threading.Thread(target=save, daemon=True), threading.Thread(target=lookup, daemon=True)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        assert not any(thread.is_alive() for thread in threads)
+
+    @pytest.mark.parametrize("storage", ["pickle", "sqlite", "mmap"])
+    @patch("sys.stderr.write", MagicMock())
+    def test_remove(self, storage, tmp_path):
+        """
+        Test removed and renamed objects are forgotten, before and after they are saved.
+
+        :return:
+        """
+        mapper = get_mapper(str(tmp_path), storage)
+        for idx, name in enumerate(["Sprint 42", "Sprint 43", "Backlog"]):
+            mapper.add_list(TrololoList.load(None, {"id": "l{}".format(idx), "name": name}))
+        mapper.save()
+
+        mapper = get_mapper(str(tmp_path), storage)
+        assert [name for name, _, _ in mapper.find_names("sprint", TrololoIdMapper.S_LIST)] == [
+            "Sprint 42", "Sprint 43"]
+        mapper.remove(TrololoIdMapper.S_LIST, "l1")
+        mapper.remove(TrololoIdMapper.S_LIST, "l2", "Backlog")
+        mapper.add_list(TrololoList.load(None, {"id": "l2", "name": "Icebox"}))
+        mapper.add_list(TrololoList.load(None, {"id": "l3", "name": "Review"}))
+        mapper.remove(TrololoIdMapper.S_LIST, "l3")
+        assert mapper.get_id_by_name("Sprint", TrololoIdMapper.S_LIST)[TrololoIdMapper.S_LIST] == {"l0"}
+        assert [name for name, _, _ in mapper.find_names("sprint", TrololoIdMapper.S_LIST)] == ["Sprint 42"]
+        mapper.save()
+
+        for mapper in [mapper, get_mapper(str(tmp_path), storage)]:
+            assert mapper.get_name_by_id("l1", TrololoIdMapper.S_LIST) is None
+            assert mapper.get_name_by_id("l2", TrololoIdMapper.S_LIST) == "Icebox"
+            assert mapper.get_name_by_id("l3", TrololoIdMapper.S_LIST) is None
+            assert [name for name, _, _ in mapper.find_names("sprint", TrololoIdMapper.S_LIST)] == ["Sprint 42"]
+            with pytest.raises(trololo.exceptions.DataMapperError):
+                mapper.get_id_by_name("Backlog", TrololoIdMapper.S_LIST)
+
+        mapper.add_list(TrololoList.load(None, {"id": "l1", "name": "Sprint 43"}))
+        mapper.save()
+        assert get_mapper(str(tmp_path), storage).get_id_by_name("Sprint 43")[TrololoIdMapper.S_LIST] == {"l1"}
+
+
+    def test_imported_on_demand(self, tmp_path):
+        """
+        Test modules of the other storages and of the name index are not imported by the pickled data map.
+
+        :return:
+        """
+        code = ("import sys; import trololo.idmapper as idmapper; "
+                "mapper = idmapper.get_mapper(sys.argv[1]); mapper.get_id_by_name('deadbeef'); mapper.save(); "
+                "print(' '.join(sorted({'sqlite3', 'mmap', 'trololo.mapindex', 'trololo.ngram'} & set(sys.modules))))")
+        imported = subprocess.check_output([sys.executable, "-c", code, str(tmp_path)],
+                                           cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                           stderr=subprocess.DEVNULL)
+        assert imported.decode("utf-8").split() == []
+
+class TestSqliteIDMapper(object):
+    """
+    Test ID mapper on SQLite storage.
+    """
+
+    def test_add_save_find(self, tmp_path):
+        """
+        Test names are found before and after they are saved.
+
+        :return:
+        """
+        mapper = TrololoSqliteIdMapper(str(tmp_path))
+        mapper.add_card(TrololoCard.load(None, {"id": "c1", "name": "Princess Leia's visit card"}))
+        mapper.add_list(TrololoList.load(None, {"id": "l1", "name": "Princess list"}))
+        assert mapper.get_id_by_name("Princess L", TrololoIdMapper.S_CARD)[TrololoIdMapper.S_CARD] == {"c1"}
+        mapper.save()
+
+        mapper = TrololoSqliteIdMapper(str(tmp_path))
+        s_res = mapper.get_id_by_name("Princess L")
+        assert s_res[TrololoIdMapper.S_CARD] == {"c1"}
+        assert s_res[TrololoIdMapper.S_LIST] == set()
+        assert mapper.get_id_by_name("Princess", TrololoIdMapper.S_LIST)[TrololoIdMapper.S_LIST] == {"l1"}
+
+    def test_ambiguous(self, tmp_path):
+        """
+        Test ambiguous name raises an error.
+
+        :return:
+        """
+        mapper = TrololoSqliteIdMapper(str(tmp_path))
+        mapper.add_card(TrololoCard.load(None, {"id": "c1", "name": "Release notes"}))
+        mapper.save()
+        mapper.add_card(TrololoCard.load(None, {"id": "c2", "name": "Release plan"}))
+
+        with pytest.raises(trololo.exceptions.DataMapperError) as ex:
+            mapper.get_id_by_name("Release")
+        assert "More than one ID" in str(ex.value)
+
+    def test_migration(self, tmp_path):
+        """
+        Test pickled data map is imported once.
+
+        :return:
+        """
+        with patch("sys.stderr.write", MagicMock()):
+            mapper = TrololoIdMapper(str(tmp_path))
+        mapper.add_board(TrololoBoard.load(None, {"id": "han_solo", "name": "Millennium Falcon"}))
+        mapper.save()
+
+        assert get_mapper(str(tmp_path), "sqlite").get_id_by_name("Millennium")[TrololoIdMapper.S_BOARD] == {
+            "han_solo"}
+        for name in os.listdir(str(tmp_path)):
+            if name.startswith(TrololoIdMapper.DATA_MAPPER_FILE):
+                os.remove(str(tmp_path / name))
+        assert TrololoSqliteIdMapper(str(tmp_path)).get_id_by_name("Millennium")[TrololoIdMapper.S_BOARD] == {
+            "han_solo"}
+
+
+class TestIDMapperJournal(object):
+    """
+    Test journal of the ID mapper.
+    """
+
+    def test_save_only_changes(self, tmp_path):
+        """
+        Test only new pairs are appended and nothing is written without them.
+
+        :return:
+        """
+        with patch("sys.stderr.write", MagicMock()):
+            mapper = TrololoIdMapper(str(tmp_path))
+        board = TrololoBoard.load(None, {"id": "b1", "name": "Board"})
+        mapper.add_board(board)
+        mapper.save()
+        journal = str(tmp_path / "edward.bin.journal")
+        size = os.path.getsize(journal)
+
+        mapper.add_board(board)
+        mapper.save()
+        assert os.path.getsize(journal) == size
+
+        mapper.add_card(TrololoCard.load(None, {"id": "c1", "name": "Card"}))
+        mapper.save()
+        assert os.path.getsize(journal) > size
+
+        with patch("sys.stderr.write", MagicMock()):
+            mapper = TrololoIdMapper(str(tmp_path))
+        assert mapper.get_id_by_name("Card")[TrololoIdMapper.S_CARD] == {"c1"}
+        assert mapper.get_id_by_name("Board")[TrololoIdMapper.S_BOARD] == {"b1"}
+
+    def test_journal_only(self, tmp_path):
+        """
+        Test missing data map is not reported, while the journal is there.
+
+        :return:
+        """
+        with patch("sys.stderr.write", MagicMock()):
+            mapper = TrololoIdMapper(str(tmp_path))
+        mapper.add_board(TrololoBoard.load(None, {"id": "b1", "name": "Board"}))
+        mapper.save()
+
+        stderr = MagicMock()
+        with patch("sys.stderr.write", stderr):
+            mapper = TrololoIdMapper(str(tmp_path))
+        assert not stderr.called
+        assert mapper.get_id_by_name("Board")[TrololoIdMapper.S_BOARD] == {"b1"}
+
+    def test_compact(self, tmp_path):
+        """
+        Test journal is compacted into the data map over the size limit.
+
+        :return:
+        """
+        with patch("sys.stderr.write", MagicMock()):
+            mapper = TrololoIdMapper(str(tmp_path))
+        mapper.JOURNAL_SIZE = 0
+        mapper.add_board(TrololoBoard.load(None, {"id": "b1", "name": "Board"}))
+        mapper.save()
+        mapper._TrololoIdMapper__compactor.join()
+
+        assert os.path.getsize(str(tmp_path / "edward.bin.journal")) == 0
+        assert TrololoIdMapper(str(tmp_path)).get_id_by_name("Board")[TrololoIdMapper.S_BOARD] == {"b1"}
+
+    def test_interrupted_journal(self, tmp_path):
+        """
+        Test incomplete record of the journal is cut off and the rest is kept.
+
+        :return:
+        """
+        with patch("sys.stderr.write", MagicMock()):
+            mapper = TrololoIdMapper(str(tmp_path))
+        mapper.add_board(TrololoBoard.load(None, {"id": "b1", "name": "Board"}))
+        mapper.save()
+        with open(str(tmp_path / "edward.bin.journal"), "ab") as jnh:
+            jnh.write(b"\x80\x04\x95garbage")
+
+        with patch("sys.stderr.write", MagicMock()):
+            mapper = TrololoIdMapper(str(tmp_path))
+        mapper.add_card(TrololoCard.load(None, {"id": "c1", "name": "Card"}))
+        mapper.save()
+
+        with patch("sys.stderr.write", MagicMock()):
+            mapper = TrololoIdMapper(str(tmp_path))
+        assert mapper.get_id_by_name("Board")[TrololoIdMapper.S_BOARD] == {"b1"}
+        assert mapper.get_id_by_name("Card")[TrololoIdMapper.S_CARD] == {"c1"}
+
+    @pytest.mark.parametrize("storage", ["pickle", "mmap"])
+    @patch("sys.stderr.write", MagicMock())
+    def test_journal_being_written(self, storage, tmp_path):
+        """
+        Test record, which is being written by another process, is skipped and not cut off.
+
+        :return:
+        """
+        mapper = get_mapper(str(tmp_path), storage)
+        mapper.add_board(TrololoBoard.load(None, {"id": "b1", "name": "Board"}))
+        mapper.save()
+        record = pickle.dumps({TrololoIdMapper.S_BOARD: {"Other": {"b2"}}})
+
+        with open(str(tmp_path / (mapper.DATA_MAPPER_FILE + mapper.JOURNAL_SUFFIX)), "ab") as jnh:
+            fcntl.flock(jnh, fcntl.LOCK_EX)
+            jnh.write(record[:5])
+            jnh.flush()
+            mapper = get_mapper(str(tmp_path), storage)
+            assert mapper.get_id_by_name("Board")[TrololoIdMapper.S_BOARD] == {"b1"}
+            with pytest.raises(trololo.exceptions.DataMapperError):
+                mapper.get_id_by_name("Other")
+            jnh.write(record[5:])
+
+        mapper = get_mapper(str(tmp_path), storage)
+        assert mapper.get_id_by_name("Other")[TrololoIdMapper.S_BOARD] == {"b2"}
+
+
+class TestMmapIDMapper(object):
+    """
+    Test ID mapper on the memory-mapped index.
+    """
+
+    def test_add_save_find(self, tmp_path):
+        """
+        Test names are found before and after they are merged into the index.
+
+        :return:
+        """
+        mapper = get_mapper(str(tmp_path), "mmap")
+        for idx, name in enumerate(["Sprint 1", "Sprint 10", "Sprint 2", "Спринт 3", "Backlog"]):
+            mapper.add_list(TrololoList.load(None, {"id": "l{}".format(idx), "name": name}))
+        assert mapper.get_id_by_name("Sprint 2")[TrololoIdMapper.S_LIST] == {"l2"}
+        mapper.save()
+
+        mapper = TrololoMmapIdMapper(str(tmp_path))
+        assert [name for name, _ in mapper._find(TrololoIdMapper.S_LIST, "Sprint 1")] == ["Sprint 1", "Sprint 10"]
+        assert mapper.get_id_by_name("Спр")[TrololoIdMapper.S_LIST] == {"l3"}
+        mapper.add_card(TrololoCard.load(None, {"id": "c1", "name": "Sprint card"}))
+        mapper.save()
+
+        mapper = TrololoMmapIdMapper(str(tmp_path))
+        assert mapper.get_id_by_name("Sprint c")[TrololoIdMapper.S_CARD] == {"c1"}
+        assert mapper.get_id_by_name("Back")[TrololoIdMapper.S_LIST] == {"l4"}
+        with pytest.raises(trololo.exceptions.DataMapperError):
+            mapper.get_id_by_name("Sprint", TrololoIdMapper.S_LIST)
+
+    def test_journal(self, tmp_path):
+        """
+        Test new names are appended to the journal and merged into the index over the size limit.
+
+        :return:
+        """
+        mapper = TrololoMmapIdMapper(str(tmp_path))
+        mapper.add_board(TrololoBoard.load(None, {"id": "b1", "name": "Board"}))
+        mapper.save()
+        mtime = os.stat(str(tmp_path / "edward.idx")).st_mtime_ns
+        mapper.add_card(TrololoCard.load(None, {"id": "c1", "name": "Card"}))
+        mapper.save()
+        assert os.stat(str(tmp_path / "edward.idx")).st_mtime_ns == mtime
+
+        mapper = TrololoMmapIdMapper(str(tmp_path))
+        assert mapper.get_id_by_name("Card")[TrololoIdMapper.S_CARD] == {"c1"}
+        assert mapper.get_name_by_id("b1", TrololoIdMapper.S_BOARD) == "Board"
+        mapper.JOURNAL_SIZE = 0
+        mapper.add_card(TrololoCard.load(None, {"id": "c2", "name": "Card"}))
+        mapper.save()
+        assert os.path.getsize(str(tmp_path / "edward.idx.journal")) == 0
+
+        mapper = TrololoMmapIdMapper(str(tmp_path))
+        assert mapper._find(TrololoIdMapper.S_CARD, "Card") == [("Card", {"c1", "c2"})]
+
+    def test_known_pair_not_saved(self, tmp_path):
+        """
+        Test index is not rewritten for the known pairs.
+
+        :return:
+        """
+        mapper = TrololoMmapIdMapper(str(tmp_path))
+        board = TrololoBoard.load(None, {"id": "b1", "name": "Board"})
+        mapper.add_board(board)
+        mapper.save()
+        mtime = os.stat(str(tmp_path / "edward.idx")).st_mtime_ns
+
+        mapper = TrololoMmapIdMapper(str(tmp_path))
+        mapper.add_board(board)
+        mapper.save()
+        assert os.stat(str(tmp_path / "edward.idx")).st_mtime_ns == mtime
+
+    def test_migration(self, tmp_path):
+        """
+        Test index is built from the pickled data map.
+
+        :return:
+        """
+        with patch("sys.stderr.write", MagicMock()):
+            mapper = TrololoIdMapper(str(tmp_path))
+        mapper.add_board(TrololoBoard.load(None, {"id": "han_solo", "name": "Millennium Falcon"}))
+        mapper.save()
+
+        assert TrololoMmapIdMapper(str(tmp_path)).get_id_by_name("Millennium")[TrololoIdMapper.S_BOARD] == {
+            "han_solo"}
+
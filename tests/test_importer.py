@@ -0,0 +1,175 @@
+# coding=utf-8
+"""
+Unit tests for the bulk import.
+"""
+
+import os
+import json
+import time
+import random
+
+import pytest
+
+from trololo.importer import TrololoImporter, iter_rows
+from trololo.lalala import TrololoList, TrololoLabel
+import trololo.exceptions
+
+
+@pytest.fixture
+def client(make_client):
+    """
+    Get client, which creates the objects without network.
+
+    :return:
+    """
+    def request(uri, query=None, method="GET"):
+        if uri == "cards":
+            if query["name"] == "broken":
+                raise trololo.exceptions.RequestError("Bad Request")
+            return {"id": "c-{}".format(query["name"]), "name": query["name"], "idList": query["idList"],
+                    "idLabels": query.get("idLabels")}
+        return {"id": "a-{}".format(query["text"]), "data": {"text": query["text"]}}
+
+    return make_client(request)
+
+
+@pytest.fixture
+def mapper(mapper):
+    """
+    Get mapper with the known names.
+
+    :return:
+    """
+    mapper.add_list(TrololoList.load(None, {"id": "l1", "name": "Backlog"}))
+    mapper.add_label(TrololoLabel.load(None, {"id": "a1", "name": "bug"}))
+    return mapper
+
+
+class TestTrololoImporter(object):
+    """
+    Test bulk import.
+    """
+    def test_csv_rows(self, tmp_path):
+        """
+        Test rows of CSV file are read by the header.
+
+        :return:
+        """
+        path = str(tmp_path / "cards.csv")
+        with open(path, "w") as imh:
+            imh.write("list,name,labels\nBacklog,First,\"bug,a2\"\n")
+        assert list(iter_rows(path)) == [{"list": "Backlog", "name": "First", "labels": "bug,a2"}]
+
+    def test_import_resolves_names(self, tmp_path, client, mapper):
+        """
+        Test names of the lists and labels are resolved, cards and comments are created in order.
+
+        :return:
+        """
+        path = str(tmp_path / "cards.jsonl")
+        with open(path, "w") as imh:
+            for idx in range(10):
+                imh.write(json.dumps({"list": "Backlog", "name": "card{}".format(idx), "labels": "bug"}) + "\n")
+            imh.write(json.dumps({"card": "c0ffee", "comment": "done"}) + "\n")
+
+        results = list(TrololoImporter(client, mapper, jobs=3).run(path))
+
+        assert [result.line for result in results] == list(range(1, 12))
+        assert all(result.error is None for result in results)
+        assert results[0].obj.name == "card0"
+        assert results[0].obj.idLabels == "a1"
+        assert results[-1].kind == "comment"
+        assert client._request.call_args_list[0][0][0] == "cards"
+        assert client._request.call_args_list[0][1]["query"]["idList"] == "l1"
+        assert not os.path.exists(path + TrololoImporter.PROGRESS_SUFFIX)
+
+    def test_import_resumes(self, tmp_path, client, mapper):
+        """
+        Test failed rows are reported and only they are imported on the next run.
+
+        :return:
+        """
+        path = str(tmp_path / "cards.jsonl")
+        with open(path, "w") as imh:
+            imh.write(json.dumps({"list": "Backlog", "name": "first"}) + "\n")
+            imh.write(json.dumps({"list": "Backlog", "name": "broken"}) + "\n")
+            imh.write(json.dumps({"list": "Unknown", "name": "third"}) + "\n")
+
+        results = list(TrololoImporter(client, mapper, jobs=2).run(path))
+        assert [result.error is None for result in results] == [True, False, False]
+        assert isinstance(results[2].error, trololo.exceptions.DataMapperError)
+        with open(path + TrololoImporter.PROGRESS_SUFFIX) as prh:
+            assert prh.read() == "1\n"
+
+        results = list(TrololoImporter(client, mapper).run(path))
+        assert [result.line for result in results] == [2, 3]
+
+    def test_import_broken_lines(self, tmp_path, client, mapper):
+        """
+        Test broken lines and names, which only look alike, fail their rows only.
+
+        :return:
+        """
+        path = str(tmp_path / "cards.jsonl")
+        with open(path, "w") as imh:
+            imh.write('{"list": "Backlog", "name": "first"\n')
+            imh.write('["Backlog", "second"]\n')
+            imh.write(json.dumps({"list": "Backlg", "name": "third"}) + "\n")
+            imh.write(json.dumps({"list": "Back", "name": "fourth"}) + "\n")
+
+        results = list(TrololoImporter(client, mapper, jobs=2).run(path))
+        assert [result.error is None for result in results] == [False, False, False, True]
+        assert isinstance(results[0].error, ValueError)
+        assert isinstance(results[1].error, trololo.exceptions.CLIError)
+        assert isinstance(results[2].error, trololo.exceptions.DataMapperError)
+        assert results[3].obj.idList == "l1"
+
+    def test_import_order(self, tmp_path, client, mapper):
+        """
+        Test cards of the same list are added in order of the rows.
+
+        :return:
+        """
+        lists = ["Backlog", "Icebox"]
+        path = str(tmp_path / "cards.jsonl")
+        with open(path, "w") as imh:
+            for idx in range(20):
+                imh.write(json.dumps({"list": lists[idx % 2], "name": "card{}".format(idx)}) + "\n")
+
+        request = client._request.side_effect
+        added = []
+
+        def slow_request(uri, query=None, method="GET"):
+            time.sleep(random.random() / 100)
+            added.append(query)
+            return request(uri, query=query, method=method)
+
+        client._request.side_effect = slow_request
+        mapper.add_list(TrololoList.load(None, {"id": "l2", "name": "Icebox"}))
+        results = list(TrololoImporter(client, mapper, jobs=4).run(path))
+        assert all(result.error is None for result in results)
+
+        for list_id, start in [("l1", 0), ("l2", 1)]:
+            names = [query["name"] for query in added if query["idList"] == list_id]
+            assert names == ["card{}".format(idx) for idx in range(start, 20, 2)]
+
+    def test_import_read_error(self, tmp_path, client, mapper):
+        """
+        Test rows in flight are kept in the progress, when the file cannot be read further.
+
+        :return:
+        """
+        path = str(tmp_path / "cards.jsonl")
+        with open(path, "wb") as imh:
+            for idx in range(500):
+                imh.write(json.dumps({"list": "Backlog", "name": "card{}".format(idx)}).encode("utf-8") + b"\n")
+            imh.write(b"\xff\xfe\n")
+
+        results = []
+        with pytest.raises(UnicodeDecodeError):
+            for result in TrololoImporter(client, mapper, jobs=4).run(path):
+                results.append(result)
+
+        assert len(results) == client._request.call_count > 0
+        with open(path + TrololoImporter.PROGRESS_SUFFIX) as prh:
+            assert prh.read().split() == [str(result.line) for result in results]
@@ -0,0 +1,69 @@
+# coding=utf-8
+"""
+Unit tests for the incremental JSON decoder.
+"""
+
+import json
+import pytest
+
+from trololo.jsonstream import iter_array
+
+
+def get_chunks(data, size):
+    """
+    Split data into chunks.
+
+    :param data:
+    :param size:
+    :return:
+    """
+    return (data[offset:offset + size] for offset in range(0, len(data), size))
+
+
+class TestJsonStream(object):
+    """
+    Test incremental JSON array decoder.
+    """
+
+    @pytest.mark.parametrize("size", [1, 2, 3, 7, 1024])
+    def test_decode_by_chunks(self, size):
+        """
+        Test array is decoded from chunks of any size, including split UTF-8 characters and numbers.
+
+        :return:
+        """
+        items = [{"id": "1", "name": "Заявка ☃", "data": {"text": "a, b]"}},
+                 12345, "str", [1, [2]], None, 1.5e3]
+        data = json.dumps(items, indent=1, ensure_ascii=False).encode("utf-8")
+        assert list(iter_array(get_chunks(data, size))) == items
+
+    def test_empty(self):
+        """
+        Test empty array.
+
+        :return:
+        """
+        assert list(iter_array([b" [ ", b"] "])) == []
+
+    def test_lazy(self):
+        """
+        Test elements are yielded before the rest of the data is read.
+
+        :return:
+        """
+        def chunks():
+            yield b'[{"id": 1}, '
+            raise AssertionError("Read too far")
+
+        assert next(iter_array(chunks())) == {"id": 1}
+
+    def test_truncated(self):
+        """
+        Test truncated array raises an error.
+
+        :return:
+        """
+        with pytest.raises(ValueError):
+            list(iter_array([b'[{"id": 1}, {"id"']))
+        with pytest.raises(ValueError):
+            list(iter_array([b'{"id": 1}']))
@@ -2,7 +2,60 @@
 Test lalala library.
 """
 
-from trololo.lalala import TrololoObject, TrololoAction
+import pytest
+import tracemalloc
+from unittest.mock import MagicMock
+
+from trololo.lalala import TrololoObject, TrololoAction, TrololoCard, TrololoList, TrololoLabel
+
+
+def get_card_json(idx):
+    """
+    Card data, as it comes from Trello.
+
+    :param idx:
+    :return:
+    """
+    return {
+        "id": "card{}".format(idx),
+        "name": "Card {}".format(idx),
+        "desc": "",
+        "idList": "list",
+        "badges": {"votes": 0, "comments": idx, "attachmentsByType": {"trello": {"board": 0, "card": 0}}},
+        "limits": {"attachments": {"perCard": {"status": "ok", "disableAt": 950, "warnAt": 900}}},
+    }
+
+
+def load_dynamic(data, obj):
+    """
+    Load data to the object, creating a class per nested dict.
+
+    :param data:
+    :param obj:
+    :return:
+    """
+    for key, value in data.items():
+        if isinstance(value, dict):
+            setattr(obj, key, load_dynamic(value, type(key, (), {})))
+        else:
+            setattr(obj, key, value)
+    return obj
+
+
+def get_allocated(loader, count=200):
+    """
+    Get memory, allocated by the loaded cards.
+
+    :param loader:
+    :return:
+    """
+    tracemalloc.start()
+    objs = [loader(get_card_json(idx)) for idx in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(objs) == count
+
+    return size
 
 
 class TestLalalaLib(object):
@@ -48,3 +101,106 @@ class TestLalalaLib(object):
         """
         text = "IRQ dropout"
         assert TrololoAction.load(None, {"data": {"text": text}}).get_text() == text
+
+    def test_nested_data_shares_class(self):
+        """
+        Test nested data does not create a class per object.
+
+        :return:
+        """
+        first, second = TrololoCard.load(None, get_card_json(1)), TrololoCard.load(None, get_card_json(2))
+        assert type(first.badges) is type(second.badges)
+        assert type(first.limits.attachments.perCard) is type(second.badges.attachmentsByType)
+        assert second.badges.comments == 2
+        assert first.limits.attachments.perCard.disableAt == 950
+
+    def test_card_memory(self):
+        """
+        Test loaded cards take less memory, than with the class per nested data.
+
+        :return:
+        """
+        class Card(object):
+            pass
+
+        compact = get_allocated(lambda data: TrololoCard.load(None, data))
+        dynamic = get_allocated(lambda data: load_dynamic(data, Card()))
+        assert compact * 3 < dynamic
+
+    def test_lazy_object(self):
+        """
+        Test lazily loaded object converts fields on the first access.
+
+        :return:
+        """
+        data = get_card_json(3)
+        card = TrololoCard.load(None, data, lazy=True)
+        assert card._raw is data
+        with pytest.raises(AttributeError):
+            TrololoCard.badges.__get__(card)  # Slot is not set yet
+        assert card.name == "Card 3"
+        assert card.badges.attachmentsByType.trello.board == 0
+        assert TrololoCard.badges.__get__(card) is card.badges
+        assert card.id_list == card.idList == "list"
+        assert card.limits.attachments.per_card.warn_at == 900
+        assert not hasattr(card, "actions")
+
+        data["name"] = "Changed"
+        assert card.name == "Card 3"
+
+    def test_lazy_client(self):
+        """
+        Test objects are lazy, if the client tells so.
+
+        :return:
+        """
+        client = MagicMock()
+        client.lazy = True
+        assert TrololoCard.load(client, get_card_json(1))._raw["id"] == "card1"
+        client.lazy = False
+        assert not hasattr(TrololoCard.load(client, get_card_json(1)), "_raw")
+
+    def test_eager_alias(self):
+        """
+        Test eagerly loaded object has snake_case aliases of the fields.
+
+        :return:
+        """
+        card = TrololoCard.load(None, get_card_json(1))
+        assert card.id_list == "list"
+        assert card.badges.attachments_by_type.trello.card == 0
+
+    def test_unknown_fields(self):
+        """
+        Test unknown fields are kept in the raw data, as there is no instance dictionary.
+
+        :return:
+        """
+        for lazy in [False, True]:
+            card = TrololoCard.load(None, dict(get_card_json(1), cardRole="board", cover={"idAttachment": None}),
+                                    lazy=lazy)
+            assert not hasattr(card, "__dict__")
+            assert card.cardRole == card.card_role == "board"
+            assert card.cover.id_attachment is None
+            assert "cardRole" in card._raw
+            with pytest.raises(AttributeError):
+                card.unknown = 1
+
+    def test_add_card_with_labels(self):
+        """
+        Test card is created with its labels and position in one request.
+
+        :return:
+        """
+        client = MagicMock()
+        client._request = MagicMock(return_value={"id": "c1", "name": "Card", "idLabels": ["a1", "a2"]})
+        t_list = TrololoList.load(client, {"id": "l1", "name": "List"}, lazy=False)
+        card = t_list.add_card("Card", "Text", labels=["a1", TrololoLabel.load(client, {"id": "a2"}, lazy=False)],
+                               pos="bottom", due="2020-01-31")
+
+        assert client._request.call_count == 1
+        query = client._request.call_args[1]["query"]
+        assert query["idLabels"] == "a1,a2"
+        assert query["pos"] == "bottom"
+        assert query["due"] == "2020-01-31"
+        assert card.id == "c1"
@@ -0,0 +1,77 @@
+# coding=utf-8
+"""
+Unit tests for the mirror of the boards.
+"""
+
+import pytest
+
+from trololo.mirror import TrololoMirror
+import trololo.exceptions
+
+class TestTrololoMirror(object):
+    """
+    Test mirror of the boards.
+    """
+    def test_full_pull(self, make_mirror):
+        """
+        Test the board is pulled completely on the first sync and read back as the tree.
+
+        :return:
+        """
+        mirror = make_mirror()
+        assert mirror.sync("b1") is None
+        board = mirror.get_board_tree("b1")
+
+        assert [t_list.name for t_list in board.get_lists()] == ["Todo", "Done"]
+        cards = board.get_lists()[0].get_cards()
+        assert [card.name for card in cards] == ["Second", "First"]
+        assert cards[1].get_actions()[0].get_text() == "hello"
+        assert board.get_labels()[0].color == "red"
+        assert mirror.get_board_id(TrololoMirror.K_CARD, "c1") == "b1"
+        assert mirror.get_age("b1") < 60
+
+    def test_incremental_sync(self, make_mirror):
+        """
+        Test actions since the cursor are applied, from the oldest ones.
+
+        :return:
+        """
+        mirror = make_mirror(actions=[
+            {"id": "5a5", "type": "commentCard", "date": "2019-01-02",
+             "data": {"text": "moved", "card": {"id": "c2"}}},
+            {"id": "5a4", "type": "updateCard", "data": {"card": {"id": "c2", "idList": "l2"},
+                                                        "listBefore": {"id": "l1"}, "listAfter": {"id": "l2"}}},
+            {"id": "5a3", "type": "addLabelToCard", "data": {"card": {"id": "c1"},
+                                                            "label": {"id": "a1", "name": "bug", "color": "red"}}},
+            {"id": "5a2", "type": "createCard", "data": {"card": {"id": "c3", "name": "Third"},
+                                                        "list": {"id": "l1"}}},
+        ])
+        mirror.pull("b1")
+        assert mirror.sync("b1") == 4
+
+        lists = mirror.get_lists("l1", "l2")
+        assert [card.name for card in lists[0].get_cards()] == ["Third", "First"]
+        assert [card.name for card in lists[1].get_cards()] == ["Second"]
+        assert lists[0].get_cards()[1].idLabels == ["a1"]
+        assert mirror.get_cards("c2")[0].get_actions()[0].get_text() == "moved"
+        assert mirror._client._request.call_args[0][1]["since"] == "5a0"
+
+        mirror._client._request.side_effect = lambda uri, query=None, method="GET", refresh=False: []
+        assert mirror.sync("b1") == 0
+        assert mirror._client._request.call_args[0][1]["since"] == "5a5"
+        assert mirror._client._request.call_args[1]["refresh"]
+
+    def test_delete_card(self, make_mirror):
+        """
+        Test deleted card is removed along with its comments.
+
+        :return:
+        """
+        mirror = make_mirror()
+        mirror.pull("b1")
+        assert mirror.apply_action("b1", {"id": "5a2", "type": "deleteCard", "data": {"card": {"id": "c1"}}})
+        assert not mirror.apply_action("b1", {"id": "5a3", "type": "updateCheckItem", "data": {}})
+
+        with pytest.raises(trololo.exceptions.UnknownResourceError):
+            mirror.get_cards("c1")
+        assert mirror.get_actions("c1") == [[]]
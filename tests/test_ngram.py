@@ -0,0 +1,129 @@
+# coding=utf-8
+"""
+Unit tests for the trigram index of the names.
+"""
+
+import os
+
+from trololo.ngram import TrololoNgramIndex, TrololoNgramStore
+
+
+def get_index():
+    """
+    Get index of a few lists.
+
+    :return:
+    """
+    return TrololoNgramIndex([("Sprint 42", {"l1"}), ("Sprint 42 review", {"l2"}), ("Sprint 4", {"l3"}),
+                              ("Release notes", {"l4"}), ("Backlog", {"l5"})])
+
+
+class TestTrololoNgramIndex(object):
+    """
+    Test trigram index.
+    """
+    def test_ranking(self):
+        """
+        Test exact name goes first, then the names, containing the text, then the similar ones.
+
+        :return:
+        """
+        assert [name for name, _, _ in get_index().find("sprint 42")] == ["Sprint 42", "Sprint 42 review", "Sprint 4"]
+        assert get_index().find("42 REVIEW")[0][:2] == ("Sprint 42 review", {"l2"})
+
+    def test_typos(self):
+        """
+        Test names are found with typos, unrelated names are not.
+
+        :return:
+        """
+        index = get_index()
+        assert index.find("sprnt 42")[0][0] == "Sprint 42"
+        assert index.find("relase  notes")[0][0] == "Release notes"
+        assert index.find("zzz") == []
+
+    def test_add(self):
+        """
+        Test IDs are merged into the known names.
+
+        :return:
+        """
+        index = get_index()
+        assert index.add("Backlog", "l5") is False
+        assert index.add("Backlog", "l6") is True
+        assert index.add("Icebox", "l7") is True
+        assert index.find("backlog", limit=1) == [("Backlog", {"l5", "l6"}, 2.0)]
+        assert index.find("icebox")[0][:2] == ("Icebox", {"l7"})
+        assert len(index) == 6
+
+    def test_remove(self):
+        """
+        Test names without IDs are not found.
+
+        :return:
+        """
+        index = get_index()
+        assert index.remove("Backlog", "l6") is False
+        assert index.remove("Backlog", "l5") is True
+        assert index.find("backlog") == []
+        assert ("Backlog", {"l5"}) not in list(index.items())
+
+
+class TestTrololoNgramStore(object):
+    """
+    Test trigram index on the disk.
+    """
+    def test_write_find(self, tmp_path):
+        """
+        Test names are found in the index file as in the memory, along with the changes of them.
+
+        :return:
+        """
+        path = str(tmp_path / "names.ngram")
+        TrololoNgramStore(path).write(get_index().items(), [(1, 2)])
+
+        store = TrololoNgramStore(path)
+        assert store.stamp == [(1, 2)]
+        assert store.find("sprint 42") == get_index().find("sprint 42")
+        assert store.find("relase  notes")[0][:2] == ("Release notes", {"l4"})
+        assert store.find("zzz") == []
+
+        assert store.add("Sprint 42", "l1") is False
+        assert store.add("Sprint 42", "l6") is True
+        assert store.add("Sprint 41", "l7") is True
+        assert store.remove("Sprint 4", "l3") is True
+        assert [candidate[:2] for candidate in store.find("sprint 4")] == [
+            ("Sprint 41", {"l7"}), ("Sprint 42", {"l1", "l6"}), ("Sprint 42 review", {"l2"})]
+        assert len(list(store.items())) == 5
+        assert TrololoNgramStore(str(tmp_path / "missing.ngram")).stamp is None
+
+    def test_journal(self, tmp_path):
+        """
+        Test changes are replayed from the journal, unless some of them are missing,
+        and merged into the index file over the size limit.
+
+        :return:
+        """
+        path = str(tmp_path / "names.ngram")
+        store = TrololoNgramStore(path)
+        store.write(get_index().items(), [1])
+        store.log([1], [2], {"Icebox": {"l6"}}, {"Backlog": {"l5"}})
+        size = os.path.getsize(path)
+
+        store = TrololoNgramStore(path)
+        assert store.stamp == [2]
+        assert store.find("icebox")[0][:2] == ("Icebox", {"l6"})
+        assert store.find("backlog") == []
+        TrololoNgramStore.append(path, [3], [4], {}, {})
+        assert TrololoNgramStore(path).stamp is None
+
+        store = TrololoNgramStore(path)
+        store.write(get_index().items(), [1])
+        store.JOURNAL_SIZE = 0
+        store.log([1], [2], {"Icebox": {"l6"}}, {})
+        assert os.path.getsize(path + TrololoNgramStore.JOURNAL_SUFFIX) == 0
+        assert os.path.getsize(path) > size
+
+        store = TrololoNgramStore(path)
+        assert store.stamp == [2]
+        assert store.find("icebox")[0][:2] == ("Icebox", {"l6"})
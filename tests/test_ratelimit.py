@@ -0,0 +1,111 @@
+# coding=utf-8
+"""
+Unit tests for the rate limiter.
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from trololo.client import TrololoClient
+from trololo.ratelimit import TrololoRateLimiter
+import trololo.exceptions
+
+
+class TestTrololoRateLimiter(object):
+    """
+    Test rate limiter.
+    """
+    def test_bucket_waits_when_empty(self):
+        """
+        Test requests over the rate are delayed.
+
+        :return:
+        """
+        limiter = TrololoRateLimiter(rate=2, interval=1)
+        with patch("time.sleep", MagicMock()) as sleep:
+            for _ in range(2):
+                limiter.acquire()
+            assert not sleep.called
+
+            limiter._tokens, limiter._updated = 0.5, 0
+            with patch("time.monotonic", MagicMock(side_effect=[0, 0.25])):
+                limiter.acquire()
+            assert sleep.call_args[0][0] == pytest.approx(0.25)
+        assert limiter.throttled == pytest.approx(0.25)
+
+    def test_remaining_headers(self):
+        """
+        Test bucket follows the remaining requests reported by Trello.
+
+        :return:
+        """
+        limiter = TrololoRateLimiter(rate=100)
+        limiter.update({"x-rate-limit-api-token-remaining": "3", "x-rate-limit-api-key-remaining": "250"})
+        assert limiter._tokens <= 3.1
+
+    @patch("time.sleep", MagicMock())
+    def test_retry_too_many_requests(self, make_response):
+        """
+        Test throttled request is retried with the delay from Retry-After header.
+
+        :return:
+        """
+        throttled = make_response(status_code=429, text="API_TOKEN_LIMIT_EXCEEDED")
+        throttled.headers = {"Retry-After": "2"}
+        passed = make_response({"id": "1", "name": "card"})
+        passed.headers = {}
+
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(side_effect=[throttled, passed])
+        assert client.get_cards("1")[0].name == "card"
+        assert client.throttled == 2
+
+    @patch("time.sleep", MagicMock())
+    def test_retry_stream(self, make_response):
+        """
+        Test discarded response of the retried stream is closed, releasing its connection.
+
+        :return:
+        """
+        failed = make_response(status_code=503, text="Service Unavailable")
+        failed.headers = {}
+        passed = make_response()
+        passed.headers = {}
+        passed.iter_content = MagicMock(return_value=iter([b'[{"id": "c1", "name": "card"}]']))
+
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(side_effect=[failed, passed])
+        assert [card["name"] for card in client._stream("lists/l1/cards")] == ["card"]
+        assert failed.close.called
+
+    @patch("time.sleep", MagicMock())
+    def test_retries_exhausted(self, make_response):
+        """
+        Test rate limit error is raised once retries are exhausted.
+
+        :return:
+        """
+        throttled = make_response(status_code=429, text="API_TOKEN_LIMIT_EXCEEDED")
+        throttled.headers = {}
+
+        client = TrololoClient("uid", "key", "token", limiter=TrololoRateLimiter(retries=2))
+        client._session.request = MagicMock(return_value=throttled)
+        with pytest.raises(trololo.exceptions.RateLimitError):
+            client.get_cards("1")
+        assert client._session.request.call_count == 3
+
+    @patch("time.sleep", MagicMock())
+    def test_no_retry_of_failed_write(self, make_response):
+        """
+        Test server failure of the write is not retried.
+
+        :return:
+        """
+        failed = make_response(status_code=502, text="Bad Gateway")
+        failed.headers = {}
+
+        client = TrololoClient("uid", "key", "token")
+        client._session.request = MagicMock(return_value=failed)
+        with pytest.raises(trololo.exceptions.UnknownResourceError):
+            client._request("cards", method="POST")
+        assert client._session.request.call_count == 1
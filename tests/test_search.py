@@ -0,0 +1,76 @@
+# coding=utf-8
+"""
+Unit tests for the search index.
+"""
+
+from trololo.lalala import TrololoCard, TrololoAction
+from trololo.search import TrololoSearchIndex
+
+
+def get_index(path):
+    """
+    Get index of a few cards and comments.
+
+    :param path:
+    :return:
+    """
+    index = TrololoSearchIndex(str(path / "search.db"))
+    index.add_card(TrololoCard.load(None, {"id": "c1", "name": "Release notes", "desc": "Write down the changes"}))
+    index.add_card(TrololoCard.load(None, {"id": "c2", "name": "Fix the crash", "desc": "It blocks the release"}))
+    index.add_action(TrololoAction.load(None, {"id": "a1", "data": {"text": "Crashes on start",
+                                                                     "card": {"id": "c2"}}}))
+    index.save()
+    return index
+
+
+class TestTrololoSearchIndex(object):
+    """
+    Test search index.
+    """
+    def test_ranking(self, tmp_path):
+        """
+        Test matches in the names are ranked first, the last word matches as a prefix.
+
+        :return:
+        """
+        hits = get_index(tmp_path).search("relea")
+        assert [hit[1] for hit in hits] == ["c1", "c2"]
+        assert hits[1][4] == "It blocks the [release]"
+
+    def test_comments(self, tmp_path):
+        """
+        Test comments are found with the names of their cards.
+
+        :return:
+        """
+        hits = get_index(tmp_path).search("crashes start")
+        assert hits == [(TrololoSearchIndex.K_ACTION, "a1", "c2", "Fix the crash", "[Crashes] on [start]")]
+
+    def test_incremental_update(self, tmp_path):
+        """
+        Test documents are updated in place, keeping the description, which has not been fetched.
+
+        :return:
+        """
+        index = get_index(tmp_path)
+        index.add_card(TrololoCard.load(None, {"id": "c1", "name": "Changelog"}))
+        index.remove("a1")
+        index.save()
+
+        index = TrololoSearchIndex(str(tmp_path / "search.db"))
+        assert [hit[1] for hit in index.search("changelog")] == ["c1"]
+        assert [hit[1] for hit in index.search("changes")] == ["c1"]
+        assert index.search("release notes") == []
+        assert index.search("start") == []
+        assert index.search("?!") == []
+
+    def test_remove_card(self, tmp_path):
+        """
+        Test comments are removed with their card.
+
+        :return:
+        """
+        index = get_index(tmp_path)
+        index.remove("c2")
+        assert [hit[1] for hit in index.search("crash")] == []
+        assert [hit[1] for hit in index.search("release")] == ["c1"]
@@ -0,0 +1,185 @@
+# coding=utf-8
+"""
+Unit tests for the webhook receiver.
+"""
+
+import hmac
+import json
+import base64
+import hashlib
+import urllib.error
+import urllib.request
+import pytest
+from unittest.mock import MagicMock, patch
+
+from trololo.idmapper import TrololoIdMapper
+from trololo.lalala import TrololoCard, TrololoAction
+from trololo.search import TrololoSearchIndex
+from trololo.webhook import TrololoWebhookReceiver
+import trololo.exceptions
+
+PAYLOADS = [
+    {"model": {"id": "b1"}, "action": {"id": "5a2", "type": "createCard", "data": {
+        "board": {"id": "b1", "name": "Board"}, "list": {"id": "l2", "name": "Done"},
+        "card": {"id": "c3", "name": "Pushed card"}}}},
+    {"model": {"id": "b1"}, "action": {"id": "5a3", "type": "commentCard", "data": {
+        "board": {"id": "b1", "name": "Board"}, "card": {"id": "c3", "name": "Pushed card"}, "text": "Pushed"}}},
+    {"model": {"id": "b1"}, "action": {"id": "5a4", "type": "deleteCard", "data": {
+        "board": {"id": "b1", "name": "Board"}, "list": {"id": "l1", "name": "Todo"}, "card": {"id": "c2"}}}},
+]
+
+
+def post(address, body, headers=None):
+    """
+    Post the body to the receiver, as Trello does.
+
+    :param address:
+    :param body: bytes
+    :param headers:
+    :return: status code
+    """
+    request = urllib.request.Request("http://{}:{}/".format(*address[:2]), data=body, headers=headers or {})
+    try:
+        return urllib.request.urlopen(request, timeout=5).status
+    except urllib.error.HTTPError as ex:
+        return ex.code
+
+
+class TestTrololoWebhookReceiver(object):
+    """
+    Test webhook receiver over the local server.
+    """
+    @patch("sys.stderr.write", MagicMock())
+    def test_recorded_payloads(self, make_mirror, mapper):
+        """
+        Test posted actions are applied to the mapper and to the mirror in a batch.
+
+        :return:
+        """
+        mapper.save = MagicMock()
+        mirror = make_mirror()
+        mirror.pull("b1")
+
+        receiver = TrololoWebhookReceiver(mapper, mirror=mirror, port=0, batch_size=len(PAYLOADS),
+                                          flush_interval=60)
+        receiver.start()
+        try:
+            head = urllib.request.Request("http://{}:{}/".format(*receiver.address[:2]), method="HEAD")
+            assert urllib.request.urlopen(head, timeout=5).status == 200
+            for payload in PAYLOADS:
+                assert post(receiver.address, json.dumps(payload).encode("utf-8")) == 200
+        finally:
+            receiver.stop()
+
+        assert receiver.applied == 3
+        assert mapper.save.call_count == 1
+        assert mapper.get_id_by_name("Pushed", TrololoIdMapper.S_CARD)[TrololoIdMapper.S_CARD] == {"c3"}
+        assert mapper.get_id_by_name("Pushed", TrololoIdMapper.S_ACTION)[TrololoIdMapper.S_ACTION] == {"5a3"}
+        assert [card.name for card in mirror.get_lists("l1")[0].get_cards()] == ["First"]
+        assert mirror.get_cards("c3")[0].get_actions()[0].get_text() == "Pushed"
+
+    @patch("sys.stderr.write", MagicMock())
+    def test_forget_names(self, tmp_path, mapper):
+        """
+        Test old names of the renamed objects and the deleted objects are removed from the mapper.
+
+        :return:
+        """
+        mapper.add_card(TrololoCard.load(None, {"id": "c1", "name": "Old card"}))
+        mapper.add_card(TrololoCard.load(None, {"id": "c2", "name": "Deleted card"}))
+        mapper.add_action(TrololoAction.load(None, {"id": "a1", "data": {"text": "Old comment"}}))
+        mapper.add_action(TrololoAction.load(None, {"id": "a2", "data": {"text": "Deleted comment"}}))
+        board = {"id": "b1", "name": "Board"}
+
+        receiver = TrololoWebhookReceiver(mapper, port=0)
+        for action in [
+                {"id": "5a1", "type": "updateCard", "data": {
+                    "board": board, "card": {"id": "c1", "name": "New card"}, "old": {"name": "Old card"}}},
+                {"id": "5a2", "type": "deleteCard", "data": {"board": board, "card": {"id": "c2"}}},
+                {"id": "5a3", "type": "updateComment", "data": {
+                    "board": board, "action": {"id": "a1", "text": "New comment"}, "old": {"text": "Old comment"}}},
+                {"id": "5a4", "type": "deleteComment", "data": {"board": board, "action": {"id": "a2"}}}]:
+            receiver.put({"model": board, "action": action})
+        receiver.flush()
+        receiver._server.server_close()
+
+        mapper = TrololoIdMapper(str(tmp_path))
+        assert mapper.get_name_by_id("c1", TrololoIdMapper.S_CARD) == "New card"
+        assert mapper.get_name_by_id("c2", TrololoIdMapper.S_CARD) is None
+        assert mapper.get_name_by_id("a1", TrololoIdMapper.S_ACTION) == "New comment"
+        assert mapper.get_name_by_id("a2", TrololoIdMapper.S_ACTION) is None
+        for text in ["Old card", "Deleted card", "Old comment", "Deleted comment"]:
+            with pytest.raises(trololo.exceptions.DataMapperError):
+                mapper.get_id_by_name(text)
+
+    @patch("sys.stderr.write", MagicMock())
+    def test_search_index(self, tmp_path, mapper):
+        """
+        Test the search index follows new, renamed and deleted cards and comments.
+
+        :return:
+        """
+        index = TrololoSearchIndex(str(tmp_path / "search.db"))
+        index.add_card(TrololoCard.load(None, {"id": "c1", "name": "Old card"}))
+        index.add_card(TrololoCard.load(None, {"id": "c2", "name": "Deleted card"}))
+        index.add_action(TrololoAction.load(None, {"id": "a1", "data": {"text": "Old comment", "card": {"id": "c1"}}}))
+        index.add_action(TrololoAction.load(None, {"id": "a2", "data": {"text": "Lost comment", "card": {"id": "c2"}}}))
+        index.add_action(TrololoAction.load(None, {"id": "a3", "data": {"text": "Deleted note", "card": {"id": "c1"}}}))
+        board = {"id": "b1", "name": "Board"}
+
+        receiver = TrololoWebhookReceiver(mapper, port=0, index=index)
+        for action in [
+                {"id": "5a1", "type": "updateCard", "data": {
+                    "board": board, "card": {"id": "c1", "name": "New card"}, "old": {"name": "Old card"}}},
+                {"id": "5a2", "type": "deleteCard", "data": {"board": board, "card": {"id": "c2"}}},
+                {"id": "5a3", "type": "updateComment", "data": {
+                    "board": board, "action": {"id": "a1", "text": "New comment"}, "old": {"text": "Old comment"}}},
+                {"id": "5a4", "type": "deleteComment", "data": {"board": board, "action": {"id": "a3"}}}]:
+            receiver.put({"model": board, "action": action})
+        receiver.put(PAYLOADS[1])
+        receiver.flush()
+        receiver._server.server_close()
+        index.close()
+
+        index = TrololoSearchIndex(str(tmp_path / "search.db"))
+        assert [hit[1:4] for hit in index.search("new")] == [("c1", "c1", "New card"), ("a1", "c1", "New card")]
+        assert [hit[1:4] for hit in index.search("pushed")] == [("c3", "c3", "Pushed card"),
+                                                                ("5a3", "c3", "Pushed card")]
+        for text in ["old", "deleted", "lost"]:
+            assert index.search(text) == []
+
+    def test_signature(self, tmp_path):
+        """
+        Test unsigned payloads are rejected, once the secret is known.
+
+        :return:
+        """
+        receiver = TrololoWebhookReceiver(MagicMock(), port=0, secret="secret", callback_url="https://example.com/")
+        receiver.start()
+        try:
+            body = json.dumps(PAYLOADS[0]).encode("utf-8")
+            signature = base64.b64encode(hmac.new(b"secret", body + b"https://example.com/",
+                                                  hashlib.sha1).digest()).decode("ascii")
+            assert post(receiver.address, body, {"X-Trello-Webhook": "forged"}) == 401
+            assert post(receiver.address, body, {"X-Trello-Webhook": signature}) == 200
+            assert post(receiver.address, b"{broken", {"X-Trello-Webhook": "forged"}) == 401
+        finally:
+            receiver.stop()
+        assert receiver.applied == 1
+
+    def test_malformed_payloads(self):
+        """
+        Test payloads, which are not JSON objects with the action, are refused.
+
+        :return:
+        """
+        receiver = TrololoWebhookReceiver(MagicMock(), port=0)
+        receiver.start()
+        try:
+            for body in [b"{broken", b"[1, 2]", b'"action"', b"null", b'{"model": {"id": "b1"}}',
+                         b'{"action": "createCard"}']:
+                assert post(receiver.address, body) == 400
+            assert post(receiver.address, json.dumps(PAYLOADS[0]).encode("utf-8")) == 200
+        finally:
+            receiver.stop()
+        assert receiver.applied == 1
@@ -2,36 +2,79 @@
 
 """
 CLI app.
+
+Only what every command needs is imported here. Modules of the
+particular commands and YAML parser are imported on demand, so
+Edward starts quickly from the scripts.
 """
 
 import argparse
+import marshal
 import sys
 import os
-import yaml
+import tempfile
+import time
 
 import trololo.exceptions
+from trololo.cache import TrololoCache
 from trololo.client import TrololoClient
-from trololo.idmapper import TrololoIdMapper
+from trololo.idmapper import TrololoIdMapper, get_mapper
+from trololo.lalala import TrololoList
+from trololo.ratelimit import TrololoRateLimiter
 
 
 class TrololoApp(object):
     """
     Trololo CLI application.
     """
-    def __init__(self):
+    VALUE_OPTIONS = ("--max-age",)
+    CONFIG_FILE = "edward.conf"
+    CONFIG_CACHE_FILE = ".edward.conf.cache"
+
+    def __init__(self, started=None):
+        """
+        Parse global options.
+
+        :param started: time.perf_counter() of the start, to report the time of the imports.
+        """
+        self._timings = {"start": time.perf_counter() if started is None else started, "init": time.perf_counter()}
         self.parser = argparse.ArgumentParser(description="Edward performs simple operations on Trello board.",
-                                              usage="""edward <command> [<args>]
+                                              usage="""edward [<options>] <command> [<args>]
 Available commands are:
     board    Operations with the boards on Trello.
     list     Operations with the lists of specific board.
     card     Operations with the cards of specific list on the board.
+    import   Import cards and comments from CSV or JSONL file.
+    sync     Mirror the boards locally.
+    search   Search the cards and comments, Edward has seen.
+    webhook  Receive changes of the boards from Trello.
 
 """)
-        self.parser.add_argument("command", help="Subcommand to run", choices=["board", "list", "card"])
-        self.cli_args = self.parser.parse_args(sys.argv[1:2])
+        self.parser.add_argument("command", help="Subcommand to run",
+                                 choices=["board", "list", "card", "import", "sync", "webhook", "search"])
+        self.parser.add_argument("--no-cache", help="do not use cache of the responses", action="store_true")
+        self.parser.add_argument("--refresh", help="revalidate every cached response", action="store_true")
+        self.parser.add_argument("--offline", help="read only from the boards, mirrored by 'sync'",
+                                 action="store_true")
+        self.parser.add_argument("--max-age", help="read from the mirror, syncing the boards, which are older "
+                                                   "than the given seconds", type=float, default=None)
+        self.parser.add_argument("--timings", help="report time of the imports, configuration and network "
+                                                   "on exit", action="store_true")
+
+        argv = sys.argv[1:]
+        cmd_idx = 0
+        while cmd_idx < len(argv) and argv[cmd_idx].startswith("-"):
+            cmd_idx += 2 if argv[cmd_idx] in self.VALUE_OPTIONS else 1
+        self.cli_args = self.parser.parse_args(argv[:cmd_idx + 1])
+        self.cmd_args = argv[cmd_idx + 1:]
         self.config = {}
         self._client = None
         self._datamapper = None
+        self._mirror = None
+        self._mirror_options = {}
+        self._webhook_options = {}
+        self._index = None
+        self._index_options = False
 
     def _say_error(self, msg):
         """
@@ -55,7 +98,7 @@ Available commands are:
             argdata = ""
 
         if " " in argdata:
-            obj_id = self._datamapper.take_from(self._datamapper.get_id_by_name(argdata), section)
+            obj_id = self._datamapper.take_from(self._datamapper.get_id_by_name(argdata, section), section)
             if obj_id:
                 out.append(obj_id)
         elif "," in argdata:
@@ -66,18 +109,126 @@ Available commands are:
         elif self._datamapper.is_id(argdata):
             out.append(argdata)
         elif argdata:
-            obj_id = self._datamapper.take_from(self._datamapper.get_id_by_name(argdata), section)
+            obj_id = self._datamapper.take_from(self._datamapper.get_id_by_name(argdata, section), section)
             if obj_id:
                 out.append(obj_id)
 
         return out
 
+    def _get_mirror(self):
+        """
+        Open the mirror of the boards on demand.
+
+        :return: TrololoMirror
+        """
+        from trololo.mirror import TrololoMirror
+
+        if self._mirror is None:
+            self._mirror = TrololoMirror(self._client, **self._mirror_options)
+
+        return self._mirror
+
+    def _get_reader(self, kind, ids):
+        """
+        Get the source of the objects: the mirror, once it is asked for
+        by "--offline" or "--max-age", otherwise the client. Stale boards
+        are synced first, unless offline.
+
+        :param kind: kind of the objects in the mirror
+        :param ids: IDs of the objects to read
+        :return: TrololoMirror or TrololoClient
+        """
+        if not self.cli_args.offline and self.cli_args.max_age is None:
+            return self._client
+
+        mirror = self._get_mirror()
+        for obj_id in ids:
+            board_id = mirror.get_board_id(kind, obj_id)
+            age = mirror.get_age(board_id) if board_id else None
+            if age is None:
+                if self.cli_args.offline:
+                    self._say_error("The {} {} is not mirrored. Run 'edward sync' first.".format(kind, obj_id))
+                return self._client
+            if not self.cli_args.offline and age > self.cli_args.max_age:
+                mirror.sync(board_id)
+
+        return mirror
+
+    def _get_index(self):
+        """
+        Open the search index on demand.
+
+        :return: TrololoSearchIndex or None, if it is disabled.
+        """
+        from trololo.search import TrololoSearchIndex
+
+        if self._index is None and self._index_options is not False:
+            self._index = TrololoSearchIndex(**self._index_options)
+
+        return self._index
+
+    def _add_card(self, card):
+        """
+        Collect name of the card and index it for the search.
+
+        :param card:
+        :return:
+        """
+        self._datamapper.add_card(card)
+        if self._get_index() is not None:
+            self._index.add_card(card)
+
+    def _add_action(self, action, card=None):
+        """
+        Collect text of the comment and index it for the search.
+
+        :param action:
+        :param card: card of the comment
+        :return:
+        """
+        self._datamapper.add_action(action)
+        if self._get_index() is not None:
+            self._index.add_action(action, card)
+
+    def _render(self, blocks):
+        """
+        Print blocks of the output lines as soon as they are produced,
+        so the first results show up before the last ones are fetched.
+        Once the reader of the output is gone (e.g. "| head"), fetching stops.
+
+        :param blocks: generator of the lists of lines
+        :return:
+        """
+        written = False
+        try:
+            for block in blocks:
+                sys.stdout.write(os.linesep.join(block) + os.linesep)
+                sys.stdout.flush()
+                written = True
+        except BrokenPipeError:
+            blocks.close()
+            # Python flushes stdout once more at exit, which would fail again
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            try:
+                os.dup2(devnull, sys.stdout.fileno())
+            except (AttributeError, ValueError, OSError):
+                pass
+            finally:
+                os.close(devnull)
+        finally:
+            self._datamapper.save(written)
+            if self._index is not None:
+                self._index.save()
+
     def board(self):
         """
         Operations with the boards.
 
         :return:
         """
+        from trololo.crawler import TrololoCrawler
+        from trololo.mirror import TrololoMirror
+
         def show_labels(args):
             """
             Show labels.
@@ -85,12 +236,15 @@ Available commands are:
             :param args:
             :return:
             """
-            out = []
-            boards = self._client.get_boards(*self._get_ids(args.labels, TrololoIdMapper.S_BOARD))
+            def get_labels(board_id):
+                return self._client.get_board_tree(board_id, lists=False, fields="name")
+
+            with TrololoCrawler(args.jobs) as crawler:
+                boards = crawler.map(get_labels, self._get_ids(args.labels, TrololoIdMapper.S_BOARD))
             for idx, board in enumerate(boards):
                 idx += 1
                 self._datamapper.add_board(board)
-                out.append("{}. {}".format(str(idx).zfill(len(str(len(boards)))), board.name)[:80])
+                out = ["{}. {}".format(str(idx).zfill(len(str(len(boards)))), board.name)[:80]]
                 labels = board.get_labels()
                 if labels:
                     out.append("    \\__")
@@ -98,8 +252,7 @@ Available commands are:
                     self._datamapper.add_label(label)
                     out.append('       "{}" ({})'.format(label.name, label.color))
                     out.append("       Id: {}".format(label.id))
-            self._datamapper.save(bool(out))
-            print(os.linesep.join(out))
+                yield out
 
         def show_boards(args):
             """
@@ -108,12 +261,12 @@ Available commands are:
             :param args:
             :return:
             """
-            out = []
-            boards = self._client.get_boards(*self._get_ids(args.display, TrololoIdMapper.S_BOARD))
+            boards = self._client.get_boards(*self._get_ids(args.display, TrololoIdMapper.S_BOARD), fields="name,desc",
+                                             lists="open" if args.format == "expand" else "none", list_fields="name")
             for idx, board in enumerate(boards):
                 idx += 1
                 self._datamapper.add_board(board)
-                out.append("{}. {}".format(str(idx).zfill(len(str(len(boards)))), board.name)[:80])
+                out = ["{}. {}".format(str(idx).zfill(len(str(len(boards)))), board.name)[:80]]
                 if board.desc:
                     out.append("    {}".format(board.desc)[:80])
                 out.append("    Id: {}".format(board.id))
@@ -126,8 +279,7 @@ Available commands are:
                         out.append('       "{}"'.format(t_list.name)[:80])
                         out.append("       Id: {}".format(t_list.id))
                 out.append("-" * 80)
-            self._datamapper.save(bool(out))
-            print(os.linesep.join(out))
+                yield out
 
         def show_board_map(args):
             """
@@ -136,33 +288,34 @@ Available commands are:
             :param args:
             :return:
             """
-            board_id = self._datamapper.take_from(self._datamapper.get_id_by_name(args.display), "boards")
-            out = []
+            board_id = self._datamapper.take_from(
+                self._datamapper.get_id_by_name(args.display, TrololoIdMapper.S_BOARD), TrololoIdMapper.S_BOARD)
             ofs = " " * 4
-            for board in self._client.get_boards(board_id):
-                self._datamapper.add_board(board)
-                out.extend(["{}".format(board.name), "=" * len(board.name)])
-                lists = board.get_lists()
-                if lists:
-                    out.append(" \\__")
-                for t_list in lists:
-                    self._datamapper.add_list(t_list)
-                    out.extend(["", "{}{}".format(ofs, t_list.name), "{}{}".format(ofs, "-" * len(t_list.name))])
-                    cards = t_list.get_cards()
-                    if cards:
-                        out.append(" {}\\__".format(ofs))
-                    for card in cards:
-                        self._datamapper.add_card(card)
-                        out.append("{}### {}".format(ofs * 2, card.name))
-                        actions = card.get_actions()
-                        if actions:
-                            out.append(" {}\\__".format(ofs * 2))
-                        for action in actions:
-                            self._datamapper.add_action(action)
-                            out.append("{}- {}".format(ofs * 3, action.get_text()))
-                out.append("")
-            self._datamapper.save(bool(out))
-            print(os.linesep.join(out))
+            board = self._get_reader(TrololoMirror.K_BOARD, [board_id]).get_board_tree(
+                board_id, labels=False, fields="name", card_fields="name", action_fields="data")
+            self._datamapper.add_board(board)
+            out = ["{}".format(board.name), "=" * len(board.name)]
+            lists = board.get_lists()
+            if lists:
+                out.append(" \\__")
+            yield out
+            for t_list in lists:
+                self._datamapper.add_list(t_list)
+                out = ["", "{}{}".format(ofs, t_list.name), "{}{}".format(ofs, "-" * len(t_list.name))]
+                cards = t_list.get_cards()
+                if cards:
+                    out.append(" {}\\__".format(ofs))
+                for card in cards:
+                    self._add_card(card)
+                    out.append("{}### {}".format(ofs * 2, card.name))
+                    actions = card.get_actions()
+                    if actions:
+                        out.append(" {}\\__".format(ofs * 2))
+                    for action in actions:
+                        self._add_action(action, card)
+                        out.append("{}- {}".format(ofs * 3, action.get_text()))
+                yield out
+            yield [""]
 
         parser = argparse.ArgumentParser(description="operations with the boards")
         parser.add_argument("-s", "--show", help="show available boards", action="store_true")
@@ -174,18 +327,20 @@ Available commands are:
                                                     "(if you feeling lucky). WARNING: this can be lengthy!")
         parser.add_argument("-l", "--labels", help="specify ID of a Trello board to list its labels")
         parser.add_argument("-a", "--add", help="create a board", action="store_true")
-        args = parser.parse_args(sys.argv[2:])
+        parser.add_argument("-j", "--jobs", help="number of parallel requests while fetching several boards",
+                            type=int, default=1)
+        args = parser.parse_args(self.cmd_args)
 
         if args.show and args.add:
             self._say_error("Should be either show boards or add one.")
         elif args.labels:
-            show_labels(args)
+            self._render(show_labels(args))
         elif args.show:
-            show_boards(args)
+            self._render(show_boards(args))
         elif args.add:
             raise NotImplementedError("Want to add boards? Edward would happily accept your PR on Trololo! :-P")
         elif args.display:
-            show_board_map(args)
+            self._render(show_board_map(args))
         else:
             parser.print_help()
 
@@ -195,6 +350,7 @@ Available commands are:
 
         :return:
         """
+        from trololo.mirror import TrololoMirror
 
         def show_cards(args):
             """
@@ -205,33 +361,29 @@ Available commands are:
             :param args:
             :return:
             """
-            out = []
-            for t_list in self._client.get_lists(*self._get_ids(args.show, TrololoIdMapper.S_LIST)):
+            list_ids = self._get_ids(args.show, TrololoIdMapper.S_LIST)
+            for t_list in self._get_reader(TrololoMirror.K_LIST, list_ids).get_lists(*list_ids, fields="name"):
                 self._datamapper.add_list(t_list)
-                out.extend([t_list.name, "=" * len(t_list.name)])
-                cards = t_list.get_cards()
-                if cards:
-                    out.append("    \\__")
-                    for idx, card in enumerate(cards):
-                        self._datamapper.add_card(card)
-                        idx += 1
-                        out.append('       {}. "{}"'.format(str(idx).zfill(2), card.name)[:80])
-                        out.append("       Id: {}".format(card.id))
-                out.append("")
-            self._datamapper.save(bool(out))
-            print(os.linesep.join(out))
+                yield [t_list.name, "=" * len(t_list.name)]
+                for idx, card in enumerate(t_list.iter_cards(fields="name", custom_fields=False)):
+                    self._add_card(card)
+                    idx += 1
+                    yield (["    \\__"] if idx == 1 else []) + [
+                        '       {}. "{}"'.format(str(idx).zfill(2), card.name)[:80],
+                        "       Id: {}".format(card.id)]
+                yield [""]
 
         parser = argparse.ArgumentParser(description="operations with the Trello lists")
         parser.add_argument("-s", "--show", help="specify Trello list ID to display cards in it")
         parser.add_argument("-f", "--format", help="Choose what format to display",
                             choices=["short", "expand"], default="short")
         parser.add_argument("-a", "--add", help="add a list to the board", action="store_true")
-        args = parser.parse_args(sys.argv[2:])
+        args = parser.parse_args(self.cmd_args)
 
         if args.show and args.add:
             self._say_error("Should be either display lists or add one.")
         elif args.show:
-            show_cards(args)
+            self._render(show_cards(args))
         elif args.add:
             raise NotImplementedError("Want to add lists to your boards? Sure thing! "
                                       "Edward would happily accept your PR on Trololo! :-P")
@@ -244,27 +396,24 @@ Available commands are:
 
         :return:
         """
+        from trololo.crawler import TrololoCrawler
+        from trololo.mirror import TrololoMirror
 
         def show_cards(args):
             """
             Display cards in list.
             :return:
             """
-            out = []
-            for idx, t_list in enumerate(self._client.get_lists(*self._get_ids(args.list, TrololoIdMapper.S_LIST))):
+            list_ids = self._get_ids(args.list, TrololoIdMapper.S_LIST)
+            for idx, t_list in enumerate(self._get_reader(TrololoMirror.K_LIST, list_ids).get_lists(*list_ids,
+                                                                                                   fields="name")):
                 idx += 1
                 self._datamapper.add_list(t_list)
-                out.append('{}. "{}"'.format(idx, t_list.name))
-                out.append("   Id: {}".format(t_list.id))
-                cards = t_list.get_cards()
-                if cards:
-                    out.append("    \\__")
-                for card in cards:
-                    self._datamapper.add_card(card)
-                    out.append('       "{}"'.format(card.name)[:80])
-                    out.append("       Id: {}".format(card.id))
-            self._datamapper.save(bool(out))
-            print(os.linesep.join(out))
+                yield ['{}. "{}"'.format(idx, t_list.name), "   Id: {}".format(t_list.id)]
+                for c_idx, card in enumerate(t_list.iter_cards(fields="name", custom_fields=False)):
+                    self._add_card(card)
+                    yield (["    \\__"] if not c_idx else []) + ['       "{}"'.format(card.name)[:80],
+                                                                  "       Id: {}".format(card.id)]
 
         def show_comments(args):
             """
@@ -273,22 +422,19 @@ Available commands are:
             :param args:
             :return:
             """
-            out = []
-            for idx, card in enumerate(self._client.get_cards(*self._get_ids(args.show, TrololoIdMapper.S_CARD))):
+            card_ids = self._get_ids(args.show, TrololoIdMapper.S_CARD)
+            reader = self._get_reader(TrololoMirror.K_CARD, card_ids)
+            for idx, card in enumerate(reader.get_cards(*card_ids, fields="name", custom_fields=False)):
                 idx += 1
-                self._datamapper.add_card(card)
-                out.append('{}  "{}"'.format(str(idx).zfill(2), card.name))
-                out.append("    Id: {}".format(card.id))
-                actions = card.get_actions()
-                if actions:
-                    out.append("    \\__")
-                for action in actions:
-                    self._datamapper.add_action(action)
-                    out.append('       "{}"'.format(action.get_text())[:80])
-                    out.append("       {}".format(action.date))
-                    out.append("       Id: {}".format(action.id))
-            self._datamapper.save(bool(out))
-            print(os.linesep.join(out))
+                self._add_card(card)
+                yield ['{}  "{}"'.format(str(idx).zfill(2), card.name), "    Id: {}".format(card.id)]
+                # Mirrored cards have all their comments nested
+                history = card.iter_history(fields="data,date") if reader is self._client else card.iter_actions()
+                for a_idx, action in enumerate(history):
+                    self._add_action(action, card)
+                    yield (["    \\__"] if not a_idx else []) + ['       "{}"'.format(action.get_text())[:80],
+                                                                  "       {}".format(action.date),
+                                                                  "       Id: {}".format(action.id)]
 
         def add_card(args):
             """
@@ -301,16 +447,25 @@ Available commands are:
                 self._say_error("Title of the card is missing")
             elif not args.description:
                 self._say_error("Description of the card is missing.\n  NOTE: It is not originally required by Trello.")
-            out = []
-            for t_list in self._client.get_lists(*self._get_ids(args.add, TrololoIdMapper.S_LIST)):
-                out.append('New card has been added to "{}'.format(t_list.name)[:79] + '"')
-                card = t_list.add_card(name=args.title, description=args.description)
-                self._datamapper.add_card(card)
-                if args.label:
-                    print("Adding labels")
-                    card.add_labels(*self._get_ids(args.label, TrololoIdMapper.S_LABEL))
-            self._datamapper.save(bool(out))
-            print(os.linesep.join(out))
+            # Lists, already known to the mapper, are not fetched just for their names
+            t_lists, unknown = [], []
+            for list_id in self._get_ids(args.add, TrololoIdMapper.S_LIST):
+                name = self._datamapper.get_name_by_id(list_id, TrololoIdMapper.S_LIST)
+                if name is None:
+                    unknown.append(list_id)
+                else:
+                    t_lists.append(TrololoList.load(self._client, {"id": list_id, "name": name}))
+            if unknown:
+                t_lists.extend(self._client.get_lists(*unknown, fields="name"))
+
+            labels = self._get_ids(args.label, TrololoIdMapper.S_LABEL)
+            with TrololoCrawler(args.jobs) as crawler:
+                cards = crawler.map(lambda t_list: t_list.add_card(name=args.title, description=args.description,
+                                                                   labels=labels), t_lists)
+            for t_list, card in zip(t_lists, cards):
+                self._datamapper.add_list(t_list)
+                self._add_card(card)
+                yield ['New card has been added to "{}'.format(t_list.name)[:79] + '"']
 
         def add_comment(args):
             """
@@ -319,16 +474,15 @@ Available commands are:
             :param args:
             :return:
             """
-            out = []
-            for card in self._client.get_cards(self._get_ids(args.card_id, TrololoIdMapper.S_CARD)):
-                self._datamapper.add_card(card)
+            for card in self._client.get_cards(*self._get_ids(args.card_id, TrololoIdMapper.S_CARD), fields="name",
+                                               custom_fields=False):
+                self._add_card(card)
                 new_comment = card.add_comment(args.comment)
-                self._datamapper.add_action(new_comment)
-                out.append("New comment has been added:")
+                self._add_action(new_comment, card)
+                out = ["New comment has been added:"]
                 out.append("=" * len(out[0]))
                 out.append("  {}".format(new_comment.get_text()))
-            self._datamapper.save(bool(out))
-            print(os.linesep.join(out))
+                yield out
 
         parser = argparse.ArgumentParser(description="operations with the cards in the Trello list",
                                          usage="edward card [-h] [-l] [-b] [-a] [-t]")
@@ -343,7 +497,9 @@ Available commands are:
                                                   "semi-colon. Example: 'my_label:red'")
         parser.add_argument("-e", "--title", help="title of the card.", default=None)
         parser.add_argument("-d", "--description", help="description/body of the card", default=None)
-        args = parser.parse_args(sys.argv[2:])
+        parser.add_argument("-j", "--jobs", help="number of parallel requests while adding a card to several lists",
+                            type=int, default=TrololoClient.POOL_SIZE)
+        args = parser.parse_args(self.cmd_args)
 
         cli_st = len([_ for _ in [args.list, args.show, args.add, args.comment] if _]) - 1
         if cli_st > 0:
@@ -354,13 +510,266 @@ Available commands are:
             sys.exit(1)
 
         if args.list:
-            show_cards(args)
+            self._render(show_cards(args))
         elif args.show:
-            show_comments(args)
+            self._render(show_comments(args))
         elif args.add:
-            add_card(args)
+            self._render(add_card(args))
         elif args.card_id and args.comment:
-            add_comment(args)
+            self._render(add_comment(args))
+
+    def import_(self):
+        """
+        Import cards and comments from the file.
+
+        :return:
+        """
+        from trololo.importer import TrololoImporter
+
+        def import_rows(args):
+            """
+            Import rows, printing result of every row.
+
+            :param args:
+            :return:
+            """
+            imported = failed = 0
+            for result in TrololoImporter(self._client, self._datamapper, jobs=args.jobs).run(args.file,
+                                                                                             restart=args.restart):
+                if result.error is not None:
+                    failed += 1
+                    yield ["{}. Failed: {}".format(result.line, result.error)[:80]]
+                    continue
+
+                imported += 1
+                if result.kind == "card":
+                    self._add_card(result.obj)
+                    yield ['{}. Card "{}'.format(result.line, result.obj.name)[:79] + '"',
+                           "    Id: {}".format(result.obj.id)]
+                else:
+                    self._add_action(result.obj)
+                    yield ["{}. Comment".format(result.line), "    Id: {}".format(result.obj.id)]
+            yield ["-" * 80, "Imported: {}, failed: {}".format(imported, failed)]
+            if failed:
+                yield ["Run the import again to retry the failed rows."]
+
+        parser = argparse.ArgumentParser(description="import cards and comments from the file",
+                                         usage="edward import [-h] [-j JOBS] [-r] file")
+        parser.add_argument("file", help="CSV file with the header or JSONL file. Cards are the rows with "
+                                         "'list', 'name', 'description', 'labels' and 'pos' fields, "
+                                         "comments are the rows with 'card' and 'comment' fields.")
+        parser.add_argument("-j", "--jobs", help="number of parallel requests", type=int, default=4)
+        parser.add_argument("-r", "--restart", help="import all the rows, ignoring progress of the previous import",
+                            action="store_true")
+        args = parser.parse_args(self.cmd_args)
+
+        if not os.path.exists(args.file):
+            self._say_error("File '{}' is not found.".format(args.file))
+        self._render(import_rows(args))
+
+    def sync(self):
+        """
+        Mirror the boards locally.
+
+        :return:
+        """
+        def sync_boards(args):
+            """
+            Sync the boards, collecting their names.
+
+            :param args:
+            :return:
+            """
+            mirror = self._get_mirror()
+            board_ids = self._get_ids(args.boards, TrololoIdMapper.S_BOARD) if args.boards else mirror.get_boards()
+            if not board_ids:
+                self._say_error("No boards are mirrored yet. Specify the boards to sync.")
+
+            for board_id in board_ids:
+                if args.full:
+                    mirror.pull(board_id)
+                    applied = None
+                else:
+                    applied = mirror.sync(board_id)
+                board = mirror.get_board_tree(board_id)
+                self._datamapper.add_board(board)
+                for label in board.get_labels():
+                    self._datamapper.add_label(label)
+                for t_list in board.get_lists():
+                    self._datamapper.add_list(t_list)
+                    for card in t_list.get_cards():
+                        self._add_card(card)
+                        for action in card.get_actions():
+                            self._add_action(action, card)
+                yield ['"{}"'.format(board.name)[:80], "    Id: {}".format(board.id),
+                       "    Pulled completely" if applied is None else "    Actions applied: {}".format(applied)]
+
+        parser = argparse.ArgumentParser(description="mirror the boards locally, so they can be read offline",
+                                         usage="edward sync [-h] [-f] [boards]")
+        parser.add_argument("boards", nargs="?", help="boards to mirror (comma-separated IDs or a name). "
+                                                      "By default, all the mirrored boards are synced.")
+        parser.add_argument("-f", "--full", help="pull the boards completely", action="store_true")
+        args = parser.parse_args(self.cmd_args)
+
+        self._render(sync_boards(args))
+
+    def webhook(self):
+        """
+        Receive changes of the boards from Trello.
+
+        :return:
+        """
+        from trololo.mirror import TrololoMirror
+        from trololo.webhook import TrololoWebhookReceiver
+
+        def serve(args):
+            """
+            Serve until interrupted, registering webhooks of the boards for the time of serving.
+
+            :param args:
+            :return:
+            """
+            options = dict(self._webhook_options)
+            url = options.pop("url", None)
+            url = args.url or url
+            board_ids = self._get_ids(args.boards, TrololoIdMapper.S_BOARD)
+            if board_ids and not url:
+                self._say_error("Public URL of the receiver is required to register the webhooks.")
+
+            mirror = None
+            if os.path.exists(self._mirror_options.get("path", TrololoMirror.MIRROR_FILE)):
+                mirror = self._get_mirror()
+            options.update({key: value for key, value in (("host", args.host), ("port", args.port))
+                            if value is not None})
+            receiver = TrololoWebhookReceiver(self._datamapper, mirror=mirror, callback_url=url,
+                                              index=self._get_index(), **options)
+            yield ["Listening on {}:{}".format(*receiver.address[:2])]
+
+            webhooks = []
+            try:
+                receiver.start()
+                for board_id in board_ids:
+                    webhooks.append(self._client.add_webhook(url, board_id))
+                    yield ["Registered webhook of the board {}".format(board_id)]
+                receiver.wait()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                receiver.stop()
+                for webhook in webhooks:
+                    self._client.delete_webhook(webhook["id"])
+
+            yield ["Actions applied: {}".format(receiver.applied)]
+
+        parser = argparse.ArgumentParser(description="receive changes of the boards from Trello and apply them "
+                                                     "to the collected names and to the mirror",
+                                         usage="edward webhook [-h] [-u URL] [-H HOST] [-p PORT] serve [boards]")
+        parser.add_argument("action", choices=["serve"], help="run the receiver")
+        parser.add_argument("boards", nargs="?", help="boards to register webhooks for (comma-separated IDs "
+                                                      "or a name). Webhooks are deleted, once the receiver stops.")
+        parser.add_argument("-u", "--url", help="public URL, Trello posts the changes to")
+        parser.add_argument("-H", "--host", help="address to listen on", default=None)
+        parser.add_argument("-p", "--port", help="port to listen on", type=int, default=None)
+        args = parser.parse_args(self.cmd_args)
+
+        self._render(serve(args))
+
+    def search(self):
+        """
+        Search the cards and comments.
+
+        :return:
+        """
+        from trololo.search import TrololoSearchIndex
+
+        def show_hits(args):
+            """
+            Show the best matches.
+
+            :param args:
+            :return:
+            """
+            index = self._get_index()
+            if index is None:
+                self._say_error('Search is disabled. Enable it with "search: true" in the configuration.')
+            hits = index.search(" ".join(args.terms), limit=args.number)
+            if not hits:
+                yield ["Nothing found."]
+            for idx, (kind, obj_id, card_id, name, snippet) in enumerate(hits):
+                out = ['{}. "{}"'.format(str(idx + 1).zfill(len(str(len(hits)))), name)[:80],
+                       "    Card Id: {}".format(card_id)]
+                if kind == TrololoSearchIndex.K_ACTION:
+                    out.append("    Comment Id: {}".format(obj_id))
+                if snippet:
+                    out.append("    {}".format(snippet)[:80])
+                yield out
+
+        parser = argparse.ArgumentParser(description="search the cards and comments, Edward has seen "
+                                                     "(browsed, synced or imported)",
+                                         usage="edward search [-h] [-n NUMBER] terms")
+        parser.add_argument("terms", nargs="+", help="words to find. The last one may be a beginning of the word.")
+        parser.add_argument("-n", "--number", help="number of the results", type=int, default=20)
+        args = parser.parse_args(self.cmd_args)
+
+        self._render(show_hits(args))
+
+    def _load_config(self, cfg_file):
+        """
+        Load configuration. Parsed configuration is cached and
+        the file is parsed again only once it has changed.
+
+        :param cfg_file:
+        :return:
+        """
+        try:
+            stat = os.stat(cfg_file)
+            stamp = [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            stamp = None
+
+        if stamp is not None:
+            try:
+                with open(self.CONFIG_CACHE_FILE, "rb") as cch:
+                    c_stamp, config = marshal.load(cch)
+                if c_stamp == stamp:
+                    return config
+            except (OSError, EOFError, ValueError, TypeError):
+                pass
+
+        import yaml
+
+        with open(cfg_file) as cfg_h:
+            config = yaml.safe_load(cfg_h)
+
+        if stamp is not None:
+            try:
+                data = marshal.dumps([stamp, config])
+            except ValueError:
+                # Configuration, which is not plain data, is parsed every time
+                data = None
+            if data is not None:
+                try:
+                    with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(self.CONFIG_CACHE_FILE)),
+                                                     prefix=".", delete=False) as cch:
+                        cch.write(data)
+                    os.replace(cch.name, self.CONFIG_CACHE_FILE)
+                except OSError as ex:
+                    sys.stderr.write("Error while caching configuration: {}\n".format(ex))
+
+        return config
+
+    def _report_timings(self):
+        """
+        Report time of the phases of the run.
+
+        :return:
+        """
+        now = time.perf_counter()
+        timings = self._timings
+        sys.stderr.write("Timings: import {:.3f}s, config {:.3f}s, network {:.3f}s in {} requests, "
+                         "command {:.3f}s, total {:.3f}s\n".format(
+                             timings["init"] - timings["start"], timings["config"], self._client.network,
+                             self._client.requests, now - timings["command"], now - timings["start"]))
 
     def run(self):
         """
@@ -368,21 +777,52 @@ Available commands are:
 
         :return:
         """
-        cfg_file = "edward.conf"
+        cfg_file = self.CONFIG_FILE
         if not os.path.exists(cfg_file):
             raise trololo.exceptions.CLIError(
                 "Configuration file '{}' is not found in the current directory.".format(cfg_file))
 
-        with open(cfg_file) as cfg_h:
-            self.config = yaml.load(cfg_h)
+        started = time.perf_counter()
+        self.config = self._load_config(cfg_file)
+        self._timings["config"] = time.perf_counter() - started
 
-        m_ref = self.__class__.__dict__.get(self.cli_args.command)
+        # Commands, named after the keywords, have an underscore
+        m_ref = self.__class__.__dict__.get(self.cli_args.command) or \
+            self.__class__.__dict__.get("{}_".format(self.cli_args.command))
         if m_ref is None:
             sys.stderr.write("Unknown command: {}\n\n".format(self.cli_args.command))
             self.parser.print_help()
             sys.exit(os.EX_USAGE)
 
-        self._client = TrololoClient(**self.config)
-        self._datamapper = TrololoIdMapper("")
-
-        m_ref(self)
+        config = dict(self.config)
+        cache = config.pop("cache", {})
+        if cache is not False and not self.cli_args.no_cache:
+            config["cache"] = TrololoCache(refresh=self.cli_args.refresh, **(cache or {}))
+        rate_limit = config.pop("rate_limit", {})
+        config["limiter"] = rate_limit is not False and TrololoRateLimiter(**(rate_limit or {}))
+
+        mapper = config.pop("mapper", "pickle")
+        self._mirror_options = config.pop("mirror", None) or {}
+        self._webhook_options = config.pop("webhook", None) or {}
+        # Search index is written by every command, so it is opt-in
+        self._index_options = config.pop("search", None) or False
+        if self._index_options is True:
+            self._index_options = {}
+        config.setdefault("lazy", True)
+
+        self._client = TrololoClient(**config)
+        self._datamapper = get_mapper("", mapper)
+
+        self._timings["command"] = time.perf_counter()
+        try:
+            m_ref(self)
+        finally:
+            if self._mirror is not None:
+                self._mirror.close()
+            if self._index is not None:
+                self._index.close()
+            self._client.close()
+            if self._client.throttled:
+                sys.stderr.write("Throttled by the rate limit for {:.2f} seconds.\n".format(self._client.throttled))
+            if self.cli_args.timings:
+                self._report_timings()
@@ -0,0 +1,204 @@
+# coding=utf-8
+"""
+On-disk cache of the Trello responses.
+"""
+
+import os
+import sys
+import time
+import pickle
+import hashlib
+import tempfile
+import threading
+import urllib.parse
+
+
+class TrololoCache(object):
+    """
+    Keeps GET responses on the disk for the time to live of the
+    resource, revalidates them by ETag afterwards and evicts least
+    recently used entries over the size limit.
+    """
+    CACHE_DIR = ".edward-cache"
+    EXPIRED_STAMP = "expired"
+    SIZE = 50  # Megabytes
+    TTL = {
+        "boards": 300,
+        "lists": 300,
+        "labels": 3600,
+        "cards": 60,
+        "actions": 30,
+    }
+    DEFAULT_TTL = 60
+    PRIVATE_PARAMS = ("key", "token")
+
+    def __init__(self, path=CACHE_DIR, size=SIZE, ttl=None, refresh=False):
+        """
+        Cache storage.
+
+        :param path: directory of the cache.
+        :param size: maximum size of the cache in megabytes.
+        :param ttl: time to live in seconds per resource, e.g. {"labels": 3600}.
+        :param refresh: revalidate every entry, regardless of its time to live.
+        """
+        self._path = path
+        self._max_size = int(size * 1024 * 1024)
+        self._ttl = dict(self.TTL, **(ttl or {}))
+        self._refresh = refresh
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(self._path, exist_ok=True)
+
+    def get_key(self, url, query=None):
+        """
+        Key of the request. Credentials are not the part of it.
+
+        :param url:
+        :param query:
+        :return:
+        """
+        params = sorted((key, str(value)) for key, value in (query or {}).items() if key not in self.PRIVATE_PARAMS)
+        return hashlib.sha1("{}?{}".format(url, urllib.parse.urlencode(params)).encode("utf-8")).hexdigest()
+
+    def get_ttl(self, uri, query=None):
+        """
+        Time to live of the resource. Batch lives as long as its shortest
+        resource, as well as the resource with the nested ones, e.g. the board
+        with its cards and comments.
+
+        :param uri: resource path, relative to the API root.
+        :param query:
+        :return:
+        """
+        query = query or {}
+        if uri.strip("/") == "batch" and query.get("urls"):
+            ttls = []
+            for route in query["urls"].split(","):
+                r_uri, _, r_query = route.partition("?")
+                ttls.append(self.get_ttl(r_uri, dict(urllib.parse.parse_qsl(r_query))))
+            return min(ttls)
+
+        path = uri.strip("/").split("/")
+        kinds = [path[-2] if len(path) > 1 and not len(path) % 2 else path[-1]]
+        kinds.extend(kind for kind in self.TTL if query.get(kind) not in (None, "none", "false", False))
+
+        return min(self._ttl.get(kind, self.DEFAULT_TTL) for kind in kinds)
+
+    def _get_expired_stamp(self):
+        """
+        Time since all the entries are considered expired.
+
+        :return:
+        """
+        try:
+            return os.path.getmtime(os.path.join(self._path, self.EXPIRED_STAMP))
+        except OSError:
+            return 0
+
+    def get(self, key):
+        """
+        Get cache entry.
+
+        :param key:
+        :return: entry dict with "body", "etag" and "fresh" keys, or None
+        """
+        path = os.path.join(self._path, key)
+        try:
+            with open(path, "rb") as cah:
+                entry = pickle.load(cah)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        entry["fresh"] = (not self._refresh and time.time() < entry["expires"]
+                          and entry["stored"] >= self._get_expired_stamp())
+        return entry
+
+    def put(self, key, body, etag, ttl):
+        """
+        Store cache entry.
+
+        :param key:
+        :param body: decoded response
+        :param etag: ETag of the response
+        :param ttl: time to live in seconds
+        :return:
+        """
+        now = time.time()
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self._path, prefix=".")
+            with os.fdopen(fd, "wb") as cah:
+                pickle.dump({"body": body, "etag": etag, "stored": now, "expires": now + ttl}, cah)
+            size = os.path.getsize(tmp_path)
+            entry_path = os.path.join(self._path, key)
+            try:
+                # Overwritten entry does not take the space anymore
+                size -= os.path.getsize(entry_path)
+            except OSError:
+                pass
+            os.replace(tmp_path, entry_path)
+        except OSError as ex:
+            sys.stderr.write("Error while caching response: {}\n".format(ex))
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._get_size()
+            else:
+                self._size += size
+            if self._size > self._max_size:
+                self._evict()
+
+    def expire(self):
+        """
+        Consider all the entries expired, so they are revalidated
+        on the next access. Used after the data has been changed.
+
+        :return:
+        """
+        with open(os.path.join(self._path, self.EXPIRED_STAMP), "w"):
+            pass
+
+    def _get_entries(self):
+        """
+        Get entries as (access time, size, path) tuples.
+
+        :return:
+        """
+        entries = []
+        for name in os.listdir(self._path):
+            path = os.path.join(self._path, name)
+            if name != self.EXPIRED_STAMP and not name.startswith("."):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        return entries
+
+    def _get_size(self):
+        """
+        Get total size of the entries.
+
+        :return:
+        """
+        return sum(size for _, size, _ in self._get_entries())
+
+    def _evict(self):
+        """
+        Remove least recently used entries down to 90% of the size limit.
+
+        :return:
+        """
+        self._size = 0
+        keep = True
+        for _, size, path in sorted(self._get_entries(), reverse=True):
+            keep = keep and self._size + size <= self._max_size * 0.9
+            if keep:
+                self._size += size
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
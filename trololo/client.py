@@ -6,10 +6,14 @@ Network client implementation.
 
 import sys
 import http
-import requests
+import time
+import functools
+import threading
 import urllib.parse
 
-from trololo.lalala import TrololoBoard, TrololoList, TrololoCard
+from trololo.lalala import TrololoBoard, TrololoList, TrololoCard, TrololoAction
+from trololo.ratelimit import TrololoRateLimiter
+from trololo.jsonstream import iter_array
 from trololo import exceptions
 
 
@@ -17,17 +21,168 @@ class Trololo(object):
     """
     Trololo client.
     """
-    def __init__(self, uid, key, token):
+    POOL_SIZE = 10
+    TIMEOUT = 30
+    BATCH_SIZE = 10
+    ACTIONS_LIMIT = 1000
+    PAGE_SIZE = 50
+    CHUNK_SIZE = 64 * 1024
+    RETRY_STATUSES = (
+        http.HTTPStatus.INTERNAL_SERVER_ERROR,
+        http.HTTPStatus.BAD_GATEWAY,
+        http.HTTPStatus.SERVICE_UNAVAILABLE,
+        http.HTTPStatus.GATEWAY_TIMEOUT,
+    )
+
+    def __init__(self, uid, key, token, pool_size=POOL_SIZE, timeout=TIMEOUT, cache=None, limiter=None,
+                 lazy=False):
+        """
+        Trello credentials and connection settings.
+
+        :param cache: TrololoCache for the GET responses, or None.
+        :param limiter: TrololoRateLimiter, None for the default one or False for none.
+        :param lazy: load fields of the objects on their first access.
+        """
+        self.lazy = lazy
         self._api_uid = uid
         self._api_key = key
         self._api_token = token
         self._api_root_url = "https://api.trello.com/1/"
+        self._timeout = tuple(timeout) if isinstance(timeout, list) else timeout
+        self._pool_size = pool_size
+        self.__session = None
+        self.__session_lock = threading.Lock()
+        self._cache = cache
+        self._limiter = TrololoRateLimiter() if limiter is None else limiter
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.network = 0.0
+
+    @property
+    def throttled(self):
+        """
+        Seconds spent waiting for the rate limit.
+
+        :return:
+        """
+        return self._limiter.throttled if self._limiter else 0.0
+
+    @property
+    def _session(self):
+        """
+        HTTP session, created on the first request. Commands, which do
+        not go online, do not pay for importing the HTTP stack. Parallel
+        requests share the one session.
+
+        :return:
+        """
+        if self.__session is None:
+            with self.__session_lock:
+                if self.__session is None:
+                    self.__session = self._get_session(self._pool_size)
+
+        return self.__session
+
+    @_session.setter
+    def _session(self, session):
+        self.__session = session
+
+    def _get_session(self, pool_size):
+        """
+        Create HTTP session with the keep-alive connection pool.
+
+        :param pool_size: maximum of the connections kept open to the host.
+        :return:
+        """
+        import requests
+        import requests.adapters
+
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "Content-Type": "application/json; charset=utf-8",
+            "Accept": "application/json"
+        })
+
+        return session
+
+    def close(self):
+        """
+        Release the connection pool. The next request opens a new one.
+
+        :return:
+        """
+        with self.__session_lock:
+            if self.__session is not None:
+                self.__session.close()
+                self.__session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _send(self, method, url, params, headers, stream=False):
+        """
+        Send request within the rate limit, retrying throttled requests
+        and server failures of GET requests.
+
+        :param stream: do not read the body of the response at once.
+        :return: response
+        """
+        attempt = 0
+        while True:
+            if self._limiter:
+                self._limiter.acquire()
+            session = self._session
+            # Time to the response: streamed body is read by the caller
+            started = time.perf_counter()
+            response = session.request(method, url, params=params, headers=headers, timeout=self._timeout,
+                                       stream=stream)
+            with self._stats_lock:
+                self.requests += 1
+                self.network += time.perf_counter() - started
+            if not self._limiter:
+                break
+
+            self._limiter.update(response.headers)
+            if (attempt >= self._limiter.retries
+                    or not (response.status_code == http.HTTPStatus.TOO_MANY_REQUESTS
+                            or method == "GET" and response.status_code in self.RETRY_STATUSES)):
+                break
+            # Streamed response holds the connection, until it is closed
+            response.close()
+            self._limiter.backoff(attempt, response.headers)
+            attempt += 1
+
+        return response
+
+    @staticmethod
+    def _check(response, url):
+        """
+        Raise an error, if the response is not OK.
+
+        :param response:
+        :param url:
+        :return:
+        """
+        if response.status_code == http.HTTPStatus.UNAUTHORIZED:
+            raise exceptions.UnauthorisedError("{} for {}".format(response.text, url))
+        elif response.status_code == http.HTTPStatus.TOO_MANY_REQUESTS:
+            raise exceptions.RateLimitError("{} at {}".format(response.text, url))
+        elif response.status_code != http.HTTPStatus.OK:
+            raise exceptions.UnknownResourceError("{} at {}".format(response.text, url))
 
-    def _request(self, uri, query=None, method="GET"):
+    def _request(self, uri, query=None, method="GET", refresh=False):
         """
         Generic request to the Trello.
+        GET responses are answered from the cache, if there is one.
 
         :param uri:
+        :param refresh: revalidate the cached response, regardless of its time to live.
         :return:
         """
         params = {
@@ -37,29 +192,119 @@ class Trololo(object):
 
         params.update(query or {})
 
-        headers = {
-            "Content-Type": "application/json; charset=utf-8",
-            "Accept": "application/json"
+        url = urllib.parse.urljoin(self._api_root_url, uri.lstrip("/"))
+        headers = {}
+        entry = None
+        if self._cache is not None and method == "GET":
+            cache_key = self._cache.get_key(url, params)
+            entry = self._cache.get(cache_key)
+            if entry is not None:
+                if entry["fresh"] and not refresh:
+                    return entry["body"]
+                if entry["etag"]:
+                    headers["If-None-Match"] = entry["etag"]
+
+        response = self._send(method, url, params, headers)
+
+        if entry is not None and response.status_code == http.HTTPStatus.NOT_MODIFIED:
+            obj = entry["body"]
+        else:
+            self._check(response, url)
+            try:
+                obj = response.json()
+            except Exception as ex:
+                sys.stderr.write("JSON error: {}\n".format(ex))
+                sys.stderr.write("\n--- response / trace ---\n")
+                sys.stderr.write(response.text)
+                sys.stderr.write("\n------------------------\n\n")
+
+                raise exceptions.RequestError("Oops... Looks like we're done at the moment. Look above.")
+
+        if self._cache is not None:
+            if method == "GET":
+                self._cache.put(cache_key, obj, response.headers.get("ETag"), self._cache.get_ttl(uri, query))
+            else:
+                self._cache.expire()
+
+        return obj
+
+    def _stream(self, uri, query=None):
+        """
+        GET JSON array from the Trello and decode it incrementally,
+        while it is being downloaded. Responses are not cached.
+
+        :param uri:
+        :param query:
+        :return: generator of the array elements
+        """
+        params = {
+            "key": self._api_key,
+            "token": self._api_token
         }
+        params.update(query or {})
+
         url = urllib.parse.urljoin(self._api_root_url, uri.lstrip("/"))
-        response = requests.request(method, url, params=params, headers=headers)
+        response = self._send("GET", url, params, {}, stream=True)
+        try:
+            self._check(response, url)
+            for obj in iter_array(response.iter_content(self.CHUNK_SIZE)):
+                yield obj
+        except ValueError as ex:
+            raise exceptions.RequestError("JSON error at {}: {}".format(url, ex))
+        finally:
+            response.close()
 
-        if response.status_code == http.HTTPStatus.UNAUTHORIZED:
-            raise exceptions.UnauthorisedError("{} for {}".format(response.text, url))
-        elif response.status_code != http.HTTPStatus.OK:
-            raise exceptions.UnknownResourceError("{} at {}".format(response.text, url))
+    def _pages(self, uri, query=None, limit=PAGE_SIZE, refresh=False):
+        """
+        Iterate over the actions page by page, from the newest ones.
+        Next page is fetched, while the current one is being consumed.
+
+        :param uri:
+        :param query:
+        :param limit: number of the actions per page
+        :param refresh: revalidate the cached pages, regardless of their time to live.
+        :return: generator of the actions
+        """
+        import concurrent.futures
 
+        query = dict(query or {}, limit=limit)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
         try:
-            obj = response.json()
-        except Exception as ex:
-            sys.stderr.write("JSON error: {}\n".format(ex))
-            sys.stderr.write("\n--- response / trace ---\n")
-            sys.stderr.write(response.text)
-            sys.stderr.write("\n------------------------\n\n")
+            page = executor.submit(self._request, uri, query, refresh=refresh)
+            while page is not None:
+                actions = page.result()
+                page = None
+                if len(actions) == limit:
+                    page = executor.submit(self._request, uri, dict(query, before=actions[-1]["id"]), refresh=refresh)
+                for action in actions:
+                    yield action
+        finally:
+            executor.shutdown(wait=False)
+
+    def _batch(self, uris, query=None):
+        """
+        Get several resources with as few requests as possible,
+        grouping them through the batch endpoint.
 
-            raise exceptions.RequestError("Oops... Looks like we're done at the moment. Look above.")
+        :param uris: list of resources to GET
+        :param query: query, common to every resource
+        :return: list of objects in the order of the URIs
+        """
+        route_query = "?{}".format(urllib.parse.urlencode(query)) if query else ""
+        out = []
+        for offset in range(0, len(uris), self.BATCH_SIZE):
+            chunk = uris[offset:offset + self.BATCH_SIZE]
+            if len(chunk) == 1:
+                out.append(self._request(chunk[0], query=query))
+                continue
 
-        return obj
+            routes = ["/{}{}".format(uri.lstrip("/"), route_query) for uri in chunk]
+            for uri, result in zip(chunk, self._request("batch", query={"urls": ",".join(routes)})):
+                if str(http.HTTPStatus.OK.value) not in result:
+                    raise exceptions.UnknownResourceError("{} at {}".format(result, uri))
+                out.append(result[str(http.HTTPStatus.OK.value)])
+
+        return out
 
 
 class TrololoClient(Trololo):
@@ -83,51 +328,313 @@ class TrololoClient(Trololo):
 
         return out
 
-    def get_boards(self, *ids):
+    def get_boards(self, *ids, fields="all", lists="open", list_fields="all"):
         """
-        List available boards.
+        List available boards. Boards, given by IDs, are fetched directly,
+        otherwise all the boards of the member are listed.
 
+        :param ids:
+        :param fields: comma-separated fields of the boards, e.g. "name,desc"
+        :param lists: which lists to include ("open", "all" or "none")
+        :param list_fields: comma-separated fields of the lists
         :return:
         """
         query = {
+            "fields": fields,
+            "lists": lists,
+        }
+        if lists != "none":
+            query["list_fields"] = list_fields
+
+        if ids:
+            return [TrololoBoard.load(self, board_json)
+                    for board_json in self._batch(["boards/{}".format(board_id) for board_id in ids], query=query)]
+
+        query.update({
             "filter": "all",
-            "fields": "all",
-            "lists": "open",
             "memberships": "none",
             "organization": "false",
             "organization_fields": "name,displayName",
-        }
+        })
+
+        return [TrololoBoard.load(self, board_json)
+                for board_json in self._request("members/{}/boards".format(self._api_uid), query=query) or []]
+
+    def get_board_tree(self, board_id, cards=True, actions=True, labels=True, fields="all", card_fields="all",
+                       action_fields="all", lists=True):
+        """
+        Get the board with its open lists, their cards, comments of
+        the cards and labels of the board, nested in one response.
+        Comments are paged from the board, if there are more of them
+        than fit in one response.
+
+        :param board_id:
+        :param cards: include cards of the lists
+        :param actions: include comments of the cards, along with the cards only
+        :param labels: include labels of the board
+        :param fields: comma-separated fields of the board
+        :param card_fields: comma-separated fields of the cards
+        :param action_fields: comma-separated fields of the comments
+        :param lists: include open lists of the board, cards are nested into them
+        :return: TrololoBoard
+        """
+        cards = cards and lists
+        query = {"fields": fields, "lists": "none"}
+        if lists:
+            query.update({"lists": "open", "list_fields": "name,closed,idBoard"})
+        if cards:
+            query["cards"] = "open"
+            if card_fields != "all":
+                # Cards are nested into their lists by the list ID
+                card_fields = ",".join(sorted(set(card_fields.split(",")) | {"idList"}))
+            query["card_fields"] = card_fields
+            if actions:
+                if action_fields != "all":
+                    # Comments are nested into their cards by the card in the data
+                    action_fields = ",".join(sorted(set(action_fields.split(",")) | {"data"}))
+                query.update({"actions": "commentCard", "actions_limit": self.ACTIONS_LIMIT,
+                              "action_fields": action_fields})
+        if labels:
+            query["labels"] = "all"
+
+        board_obj = self._request("boards/{}".format(board_id), query=query)
+        if cards:
+            b_actions = board_obj.pop("actions", [])
+            if actions and len(b_actions) == self.ACTIONS_LIMIT:
+                b_actions.extend(self._pages("boards/{}/actions".format(board_id),
+                                             query={"filter": "commentCard", "fields": action_fields,
+                                                    "before": b_actions[-1]["id"]},
+                                             limit=self.ACTIONS_LIMIT))
 
-        boards = []
-        for board_json in self._request("members/{}/boards".format(self._api_uid), query=query) or []:
-            board = TrololoBoard.load(self, board_json)
-            if ids and board.id in ids or not ids:
-                boards.append(board)
+            c_actions = {}
+            for action in b_actions:
+                c_actions.setdefault(action["data"]["card"]["id"], []).append(action)
+            l_cards = {}
+            for card in board_obj.pop("cards", []):
+                if actions:
+                    card["actions"] = c_actions.get(card["id"], [])
+                l_cards.setdefault(card["idList"], []).append(card)
+            for list_obj in board_obj["lists"]:
+                list_obj["cards"] = l_cards.get(list_obj["id"], [])
 
-        return boards
+        return TrololoBoard.load(self, board_obj)
 
-    def get_lists(self, *ids):
+    def get_lists(self, *ids, fields="name,closed,idBoard"):
         """
         Get lists by IDs.
 
         :param ids:
+        :param fields: comma-separated fields of the lists
         :return:
         """
-        lists = []
-        for list_id in ids:
-            lists.append(TrololoList.load(self, self._request("lists/{}".format(list_id),
-                                                              query={"fields": "name,closed,idBoard"})))
-        return lists
+        return [TrololoList.load(self, list_obj)
+                for list_obj in self._batch(["lists/{}".format(list_id) for list_id in ids],
+                                            query={"fields": fields})]
 
-    def get_cards(self, *ids):
+    def get_cards(self, *ids, fields="all", custom_fields=True):
         """
-        Get cards by list IDs.
+        Get cards by IDs.
 
         :param ids:
+        :param fields: comma-separated fields of the cards, e.g. "name,idList"
+        :param custom_fields: include custom field items of the cards
         :return:
         """
-        cards = []
-        for card_id in ids:
-            cards.append(TrololoCard.load(self, self._request("cards/{}".format(card_id),
-                                                              query={"filter": "open", "customFieldItems": "true"})))
-        return cards
+        query = {"filter": "open", "fields": fields}
+        if custom_fields:
+            query["customFieldItems"] = "true"
+
+        return [TrololoCard.load(self, card_obj)
+                for card_obj in self._batch(["cards/{}".format(card_id) for card_id in ids], query=query)]
+
+    def get_actions(self, *ids):
+        """
+        Get comments (actions) of the cards by card IDs.
+
+        :param ids:
+        :return: list of the action lists, in order of the card IDs
+        """
+        return [[TrololoAction.load(self, action) for action in actions]
+                for actions in self._batch(["cards/{}/actions".format(card_id) for card_id in ids])]
+
+    def add_webhook(self, callback_url, model_id, description="edward"):
+        """
+        Register webhook, which posts actions of the model (e.g. board) to the URL.
+        Trello checks the URL answers HEAD request before registering it.
+
+        :param callback_url:
+        :param model_id:
+        :param description:
+        :return: webhook dict
+        """
+        return self._request("webhooks", query={"callbackURL": callback_url, "idModel": model_id,
+                                                "description": description}, method="POST")
+
+    def delete_webhook(self, webhook_id):
+        """
+        Delete webhook.
+
+        :param webhook_id:
+        :return:
+        """
+        return self._request("webhooks/{}".format(webhook_id), method="DELETE")
+
+
+class AsyncTrololoClient(object):
+    """
+    Asyncio client. Asyncio is imported on the first call, so the
+    blocking client does not pay for it.
+
+    Every operation of TrololoClient and of the objects it returns is
+    available as a coroutine. Blocking HTTP calls are done in a worker
+    pool over the shared keep-alive session, so the event loop is never
+    stalled.
+    """
+    def __init__(self, uid, key, token, pool_size=Trololo.POOL_SIZE, timeout=Trololo.TIMEOUT, cache=None,
+                 limiter=None, lazy=False):
+        import concurrent.futures
+
+        self._client = TrololoClient(uid, key, token, pool_size=pool_size, timeout=timeout, cache=cache,
+                                     limiter=limiter, lazy=lazy)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=pool_size)
+
+    @property
+    def client(self):
+        """
+        Blocking client, which is bound to the loaded objects.
+
+        :return:
+        """
+        return self._client
+
+    async def _call(self, func, *args, **kwargs):
+        """
+        Run blocking call in the worker pool.
+
+        :param func:
+        :return:
+        """
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor,
+                                                                functools.partial(func, *args, **kwargs))
+
+    async def get_boards(self, *ids, **fields):
+        """
+        List available boards.
+
+        :param ids:
+        :param fields: projection of the fields, as TrololoClient.get_boards takes it
+        :return:
+        """
+        return await self._call(self._client.get_boards, *ids, **fields)
+
+    async def get_board_tree(self, board_id, cards=True, actions=True, labels=True, lists=True, **fields):
+        """
+        Get the board with its lists, cards, comments and labels.
+
+        :param board_id:
+        :param fields: projection of the fields, as TrololoClient.get_board_tree takes it
+        :return:
+        """
+        return await self._call(self._client.get_board_tree, board_id, cards=cards, actions=actions, labels=labels,
+                                lists=lists, **fields)
+
+    async def get_lists(self, *ids, **fields):
+        """
+        Get lists by IDs. All of them are fetched in one call, so they are grouped into batch requests.
+
+        :param ids:
+        :param fields: projection of the fields, as TrololoClient.get_lists takes it
+        :return:
+        """
+        return await self._call(self._client.get_lists, *ids, **fields)
+
+    async def get_cards(self, *ids, **fields):
+        """
+        Get cards by IDs. All of them are fetched in one call, so they are grouped into batch requests.
+
+        :param ids:
+        :param fields: projection of the fields, as TrololoClient.get_cards takes it
+        :return:
+        """
+        return await self._call(self._client.get_cards, *ids, **fields)
+
+    async def get_labels(self, board):
+        """
+        Get labels of the board.
+
+        :param board: TrololoBoard
+        :return:
+        """
+        return await self._call(board.get_labels)
+
+    async def get_list_cards(self, t_list, **fields):
+        """
+        Get cards in the list.
+
+        :param t_list: TrololoList
+        :param fields: projection of the fields, as TrololoList.get_cards takes it
+        :return:
+        """
+        return await self._call(t_list.get_cards, **fields)
+
+    async def add_card(self, t_list, name, description, labels=None, pos="top", **fields):
+        """
+        Add a card to the list.
+
+        :param t_list: TrololoList
+        :param name:
+        :param description:
+        :param labels: label IDs or TrololoLabel objects
+        :param pos: position of the card
+        :param fields: other fields of the card
+        :return:
+        """
+        return await self._call(t_list.add_card, name, description, labels=labels, pos=pos, **fields)
+
+    async def get_actions(self, card):
+        """
+        List comments (actions) of the card.
+
+        :param card: TrololoCard
+        :return:
+        """
+        return await self._call(card.get_actions)
+
+    async def add_comment(self, card, text):
+        """
+        Add a comment to the card.
+
+        :param card: TrololoCard
+        :param text:
+        :return:
+        """
+        return await self._call(card.add_comment, text)
+
+    async def add_labels(self, card, *labels):
+        """
+        Add labels to the card.
+
+        :param card: TrololoCard
+        :param labels:
+        :return:
+        """
+        return await self._call(card.add_labels, *labels)
+
+    async def close(self):
+        """
+        Stop workers and release the connection pool.
+
+        :return:
+        """
+        import asyncio
+
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
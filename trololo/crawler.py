@@ -0,0 +1,86 @@
+# coding=utf-8
+"""
+Bounded-concurrency fetcher for the Trello objects.
+"""
+
+import collections
+import concurrent.futures
+
+
+class TrololoCrawler(object):
+    """
+    Runs independent fetches in parallel, keeping the order of the results.
+    """
+    def __init__(self, jobs=1):
+        """
+        Number of the concurrent jobs.
+
+        :param jobs:
+        """
+        self._jobs = max(1, int(jobs or 1))
+        self._executor = None
+        if self._jobs > 1:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._jobs)
+
+    def map(self, func, items):
+        """
+        Call func on every item and return results in the order of items.
+
+        :param func:
+        :param items:
+        :return: list of results
+        """
+        if self._executor is None:
+            return [func(item) for item in items]
+
+        return list(self._executor.map(func, items))
+
+    def imap(self, func, items):
+        """
+        Call func on every item of the iterable and yield results in the
+        order of items. Items are taken only as the workers get free, so
+        no more than two calls per job are in flight at a time. If taking
+        the next item fails, results of the calls in flight are yielded
+        before the error is raised.
+
+        :param func:
+        :param items: iterable, which is possibly infinite
+        :return: generator of the results
+        """
+        if self._executor is None:
+            for item in items:
+                yield func(item)
+            return
+
+        pending = collections.deque()
+        items = iter(items)
+        while True:
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            except Exception:
+                while pending:
+                    yield pending.popleft().result()
+                raise
+            pending.append(self._executor.submit(func, item))
+            if len(pending) >= self._jobs * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        """
+        Stop workers.
+
+        :return:
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
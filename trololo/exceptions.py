@@ -15,6 +15,12 @@ class UnknownResourceError(Exception):
     """
 
 
+class RateLimitError(Exception):
+    """
+    Too many requests
+    """
+
+
 class RequestError(Exception):
     """
     Trello request error
@@ -3,14 +3,95 @@ A very simple helper to operate Trello data by strings,
 instead of remembering those cumbersome IDs.
 """
 
+import bisect
+import fcntl
 import pickle
 import os
 import sys
+import tempfile
+import threading
 
 import trololo.exceptions
 from trololo.lalala import TrololoBoard, TrololoAction, TrololoLabel, TrololoCard, TrololoList
 
 
+def open_journal(path, mode="ab"):
+    """
+    Open the journal for writing, locked exclusively, so the readers
+    do not take the record being written for a broken one.
+    Lock is released, once the file is closed.
+
+    :param path:
+    :param mode:
+    :return: file object
+    """
+    jnh = open(path, mode)
+    try:
+        fcntl.flock(jnh, fcntl.LOCK_EX)
+    except Exception:
+        jnh.close()
+        raise
+
+    return jnh
+
+
+def cut_journal(path):
+    """
+    Cut off incomplete record of an interrupted save. Nothing is done,
+    while the journal is being written: the record is not interrupted then.
+
+    :param path:
+    :return:
+    """
+    with open(path, "r+b") as jnh:
+        try:
+            fcntl.flock(jnh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+
+        offset = 0
+        try:
+            while True:
+                pickle.load(jnh)
+                offset = jnh.tell()
+        except Exception:
+            pass
+        if os.fstat(jnh.fileno()).st_size > offset:
+            sys.stderr.write("Incomplete journal of the mapper, cut at {} bytes.\n".format(offset))
+            jnh.truncate(offset)
+
+
+def iter_journal(path):
+    """
+    Read records of the journal. Incomplete record at the end is skipped,
+    as it might be still written by another process, and cut off only
+    if it is left by an interrupted save.
+
+    :param path:
+    :return: generator of {section: {name: IDs}} dicts of the new pairs.
+             Removed pairs are kept the same way under "removed" key.
+    """
+    try:
+        jnh = open(path, "rb")
+    except OSError:
+        return
+
+    with jnh:
+        offset = 0
+        while True:
+            try:
+                delta = pickle.load(jnh)
+            except Exception:
+                break
+
+            offset = jnh.tell()
+            yield delta
+        incomplete = os.fstat(jnh.fileno()).st_size > offset
+
+    if incomplete:
+        cut_journal(path)
+
+
 class TrololoIdMapper(object):
     """
     Keeps on the disk what we already know.
@@ -23,6 +104,12 @@ class TrololoIdMapper(object):
     S_LABEL = "labels"
     S_ACTION = "actions"
     S_ID = "id"
+    SECTIONS = (S_BOARD, S_LIST, S_CARD, S_LABEL, S_ACTION, S_ID)
+    REMOVED = "removed"
+    JOURNAL_SUFFIX = ".journal"
+    JOURNAL_SIZE = 4 * 1024 * 1024
+    NGRAM_SUFFIX = ".ngram"
+    FUZZY_MARGIN = 0.1
 
     def __init__(self, path):
         """
@@ -30,17 +117,279 @@ class TrololoIdMapper(object):
 
         :param path:
         """
-        self.__datamap = {
-            self.S_BOARD: {},
-            self.S_LIST: {},
-            self.S_CARD: {},
-            self.S_LABEL: {},
-            self.S_ACTION: {},
-            self.S_ID: {},
-        }
+        self.__datamap = {section: {} for section in self.SECTIONS}
+        self.__dirty = {}
+        self.__removed = {}
+        self.__index = {}
+        self.__names = {}
+        self.__ngrams = {}
         self.__path = os.path.join(path, self.DATA_MAPPER_FILE)
+        self.__journal_path = self.__path + self.JOURNAL_SUFFIX
+        # Shared with the storages: separate locks, taken in different orders, would deadlock
+        self._lock = threading.RLock()
+        self.__compactor = None
         self.load()
 
+    def _add(self, section: str, name: str, obj_id: str) -> None:
+        """
+        Add name/ID pair to the section.
+
+        :param section:
+        :param name:
+        :param obj_id:
+        :return:
+        """
+        with self._lock:
+            ids = self.__datamap[section].get(name)
+            if ids is None:
+                ids = self.__datamap[section][name] = set()
+                if section in self.__index:
+                    bisect.insort(self.__index[section], name)
+            if section in self.__names:
+                self.__names[section][obj_id] = name
+            if obj_id not in ids:
+                ids.add(obj_id)
+                self._log_change(self.__dirty, self.__removed, section, name, obj_id)
+            self._add_ngram(section, name, obj_id)
+
+    def _remove(self, section: str, name: str, obj_id: str) -> None:
+        """
+        Remove name/ID pair from the section.
+
+        :param section:
+        :param name:
+        :param obj_id:
+        :return:
+        """
+        with self._lock:
+            ids = self.__datamap.get(section, {}).get(name)
+            if not ids or obj_id not in ids:
+                return
+            ids.discard(obj_id)
+            if not ids:
+                del self.__datamap[section][name]
+                index = self.__index.get(section)
+                if index is not None:
+                    idx = bisect.bisect_left(index, name)
+                    if idx < len(index) and index[idx] == name:
+                        del index[idx]
+            if self.__names.get(section, {}).get(obj_id) == name:
+                del self.__names[section][obj_id]
+            self._log_change(self.__removed, self.__dirty, section, name, obj_id)
+            self._remove_ngram(section, name, obj_id)
+
+    @staticmethod
+    def _log_change(log: dict, undo: dict, section: str, name: str, obj_id: str) -> None:
+        """
+        Log change of the name/ID pair until it is saved. Unsaved
+        opposite change of the same pair is dropped from its log instead.
+
+        :param log: {section: {name: IDs}} dict of the changes
+        :param undo: {section: {name: IDs}} dict of the opposite changes
+        :param section:
+        :param name:
+        :param obj_id:
+        :return:
+        """
+        ids = undo.get(section, {}).get(name)
+        if ids and obj_id in ids:
+            ids.discard(obj_id)
+            if not ids:
+                del undo[section][name]
+                if not undo[section]:
+                    del undo[section]
+        else:
+            log.setdefault(section, {}).setdefault(name, set()).add(obj_id)
+
+    def _add_ngram(self, section: str, name: str, obj_id: str) -> None:
+        """
+        Add name/ID pair to the trigram index of the section, once it is built.
+
+        :param section:
+        :param name:
+        :param obj_id:
+        :return:
+        """
+        with self._lock:
+            if section in self.__ngrams:
+                self.__ngrams[section].add(name, obj_id)
+
+    def _remove_ngram(self, section: str, name: str, obj_id: str) -> None:
+        """
+        Remove name/ID pair from the trigram index of the section, once it is built.
+
+        :param section:
+        :param name:
+        :param obj_id:
+        :return:
+        """
+        with self._lock:
+            if section in self.__ngrams:
+                self.__ngrams[section].remove(name, obj_id)
+
+    def _find(self, section: str, text: str):
+        """
+        Find names in the section, starting with the text.
+
+        :param section:
+        :param text:
+        :return: list of (name, IDs) tuples
+        """
+        out = []
+        with self._lock:
+            index = self.__index.get(section)
+            if index is None:
+                index = self.__index[section] = sorted(self.__datamap[section])
+            for idx in range(bisect.bisect_left(index, text), len(index)):
+                if not index[idx].startswith(text):
+                    break
+                out.append((index[idx], set(self.__datamap[section][index[idx]])))
+
+        return out
+
+    def _get_name(self, section: str, obj_id: str):
+        """
+        Get name of the ID in the section.
+
+        :param section:
+        :param obj_id:
+        :return: name or None
+        """
+        with self._lock:
+            names = self.__names.get(section)
+            if names is None:
+                names = self.__names[section] = {n_id: name for name, ids in self.__datamap.get(section, {}).items()
+                                                 for n_id in ids}
+            return names.get(obj_id)
+
+    def _items(self):
+        """
+        Get all name/ID pairs.
+
+        :return: list of (section, name, ID) tuples
+        """
+        with self._lock:
+            return [(section, name, obj_id) for section, names in self.__datamap.items()
+                    for name, ids in names.items() for obj_id in ids]
+
+    def _names(self, section: str):
+        """
+        Get all names of the section.
+
+        :param section:
+        :return: list of (name, IDs) tuples
+        """
+        with self._lock:
+            return [(name, set(ids)) for name, ids in self.__datamap.get(section, {}).items()]
+
+    def _new_names(self, section: str):
+        """
+        Get names of the section, which are not saved yet.
+
+        :param section:
+        :return: list of (name, IDs) tuples
+        """
+        with self._lock:
+            return [(name, set(ids)) for name, ids in self.__dirty.get(section, {}).items()]
+
+    def _removed_names(self, section: str):
+        """
+        Get names of the section, removed since the last save.
+
+        :param section:
+        :return: list of (name, IDs) tuples
+        """
+        with self._lock:
+            return [(name, set(ids)) for name, ids in self.__removed.get(section, {}).items()]
+
+    def _storage_paths(self):
+        """
+        Get paths of the storage files.
+
+        :return: list of paths
+        """
+        return [self.__path, self.__journal_path]
+
+    def _get_stamp(self):
+        """
+        Get version of the storage files.
+
+        :return: list of (mtime, size) tuples, None for the missing files
+        """
+        stamp = []
+        for path in self._storage_paths():
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append(None)
+
+        return stamp
+
+    def __get_ngram_path(self, section: str) -> str:
+        """
+        Get path to the trigram index of the section.
+
+        :param section:
+        :return:
+        """
+        return "{}.{}{}".format(self.__path, section, self.NGRAM_SUFFIX)
+
+    def _get_ngrams(self, section: str):
+        """
+        Get trigram index of the section. Index is kept next to the storage
+        and built again only if it has missed the changes of the storage.
+        It is loaded only by the lookups, which need it.
+
+        :param section:
+        :return: TrololoNgramStore
+        """
+        with self._lock:
+            index = self.__ngrams.get(section)
+            if index is None:
+                from trololo.ngram import TrololoNgramStore
+
+                index = TrololoNgramStore(self.__get_ngram_path(section))
+                stamp = self._get_stamp()
+                if index.stamp != stamp:
+                    try:
+                        index.write(self._names(section), stamp)
+                    except OSError as ex:
+                        sys.stderr.write("Error while saving name index: {}\n".format(ex))
+                        index.clear()
+                        index.update(self._names(section))
+                else:
+                    index.update(self._new_names(section))
+                    for name, ids in self._removed_names(section):
+                        index.remove(name, *ids)
+                self.__ngrams[section] = index
+
+            return index
+
+    def _log_ngrams(self, since, added: dict, removed: dict) -> None:
+        """
+        Append saved changes to the trigram indexes, so they are not built again.
+
+        :param since: version of the storage files before the changes
+        :param added: {section: {name: IDs}} dict
+        :param removed: {section: {name: IDs}} dict
+        :return:
+        """
+        with self._lock:
+            stamp = self._get_stamp()
+            for section in self.SECTIONS:
+                changes = added.get(section, {}), removed.get(section, {})
+                path = self.__get_ngram_path(section)
+                try:
+                    if section in self.__ngrams:
+                        self.__ngrams[section].log(since, stamp, *changes)
+                    elif os.path.exists(path):
+                        from trololo.ngram import TrololoNgramStore
+
+                        TrololoNgramStore.append(path, since, stamp, *changes)
+                except OSError as ex:
+                    sys.stderr.write("Error while saving name index: {}\n".format(ex))
+
     def add_board(self, board: TrololoBoard) -> None:
         """
         Add board
@@ -48,7 +397,7 @@ class TrololoIdMapper(object):
         :param board:
         :return:
         """
-        self.__datamap[self.S_BOARD].setdefault(board.name, set()).add(board.id)
+        self._add(self.S_BOARD, board.name, board.id)
 
     def add_list(self, t_list: TrololoList) -> None:
         """
@@ -57,7 +406,7 @@ class TrololoIdMapper(object):
         :param t_list:
         :return:
         """
-        self.__datamap[self.S_LIST].setdefault(t_list.name, set()).add(t_list.id)
+        self._add(self.S_LIST, t_list.name, t_list.id)
 
     def add_card(self, card: TrololoCard) -> None:
         """
@@ -66,7 +415,7 @@ class TrololoIdMapper(object):
         :param card:
         :return:
         """
-        self.__datamap[self.S_CARD].setdefault(card.name, set()).add(card.id)
+        self._add(self.S_CARD, card.name, card.id)
 
     def add_label(self, label: TrololoLabel) -> None:
         """
@@ -75,7 +424,7 @@ class TrololoIdMapper(object):
         :param label:
         :return:
         """
-        self.__datamap[self.S_LABEL].setdefault(label.name, set()).add(label.id)
+        self._add(self.S_LABEL, label.name, label.id)
 
     def add_action(self, action: TrololoAction) -> None:
         """
@@ -84,7 +433,22 @@ class TrololoIdMapper(object):
         :param action:
         :return:
         """
-        self.__datamap[self.S_ACTION].setdefault(action.get_text(), set()).add(action.id)
+        self._add(self.S_ACTION, action.get_text(), action.id)
+
+    def remove(self, section: str, obj_id: str, name: str = None) -> None:
+        """
+        Forget the object, e.g. once it is deleted. To rename the object,
+        forget its old name and add it again.
+
+        :param section:
+        :param obj_id:
+        :param name: name to forget. Current name of the ID by default.
+        :return:
+        """
+        if name is None:
+            name = self._get_name(section, obj_id)
+        if name is not None:
+            self._remove(section, name, obj_id)
 
     @staticmethod
     def is_id(text):
@@ -102,41 +466,95 @@ class TrololoIdMapper(object):
 
         return _id
 
-    def get_id_by_name(self, text):
+    def find_names(self, text, section, limit=10):
+        """
+        Find names in the section, containing the text or looking alike.
+
+        :param text:
+        :param section:
+        :param limit: maximum number of the candidates.
+        :return: list of (name, IDs, score) tuples, from the best matches.
+        """
+        with self._lock:
+            return self._get_ngrams(section).find(text, limit=limit)
+
+    def __get_fuzzy_ids(self, text, section):
+        """
+        Take IDs of the best candidate, if it is clearly better than the rest.
+
+        :param text:
+        :param section:
+        :return: IDs
+        """
+        candidates = self.find_names(text, section, limit=5)
+        if not candidates:
+            raise trololo.exceptions.DataMapperError("No corresponding ID has been found. "
+                                                     "Please either browse the board to collect more data about it "
+                                                     "or use plain IDs instead.")
+
+        name, ids, score = candidates[0]
+        if len(ids) == 1 and (len(candidates) == 1 or score - candidates[1][2] >= self.FUZZY_MARGIN):
+            if name != text:
+                sys.stderr.write('Taking "{}" for "{}"\n'.format(name, text))
+            return ids
+
+        raise trololo.exceptions.DataMapperError("More than one ID references to the same text. "
+                                                 "Please use just plain IDs. Did you mean: {}".format(
+                                                     ", ".join('"{}"'.format(c_name) for c_name, _, _ in candidates)))
+
+    def get_id_by_name(self, text, section=None, fuzzy=True):
         """
         Lookup data mapper for the text occurrences and find
         out what kind of IDs possibly can be there. Search
-        works only from starting with or entire string.
-
-        This is not super-optimal solution, but does the job.
+        works from starting with or entire string. Within the section,
+        names containing the text or looking alike are taken as well,
+        if no name starts with the text.
 
         :param text:
+        :param section: look only in this section, otherwise in all of them.
+        :param fuzzy: take names, containing the text or looking alike.
         :return:
         """
 
         found = False
-        ret = dict(zip(list(self.__datamap.keys()), [set() for _ in range(len(self.__datamap))]))
+        ret = {sct: set() for sct in self.SECTIONS}
         if not self.is_id(text):
-            for section in self.__datamap:
-                for txt, ids in self.__datamap[section].items():
-                    if txt.startswith(text):
-                        ret[section].update(ids)
-                        if len(ret[section]) > 1:
-                            # Nope, try just IDs instead.
-                            raise trololo.exceptions.DataMapperError("More than one ID references to the same text. "
-                                                                     "Please use just plain IDs.")
-                        found = True
+            for sct in [section] if section else self.SECTIONS:
+                names = self._find(sct, text)
+                for _, ids in names:
+                    ret[sct].update(ids)
+                    if len(ret[sct]) > 1:
+                        # Nope, try just IDs instead. The closest names are the shortest ones.
+                        closest = sorted((name for name, _ in names), key=lambda name: (len(name), name))
+                        raise trololo.exceptions.DataMapperError("More than one ID references to the same text. "
+                                                                 "Please use just plain IDs. Did you mean: {}".format(
+                                                                     ", ".join('"{}"'.format(name)
+                                                                               for name in closest[:5])))
+                    found = True
         else:
             ret["id"].add(text)
             found = True
 
         if not found:
+            if section and fuzzy:
+                ret[section] = self.__get_fuzzy_ids(text, section)
+                return ret
             raise trololo.exceptions.DataMapperError("No corresponding ID has been found. "
                                                      "Please either browse the board to collect more data about it "
                                                      "or use plain IDs instead.")
 
         return ret
 
+    def get_name_by_id(self, obj_id, section):
+        """
+        Lookup data mapper for the name of the ID.
+
+        :param obj_id:
+        :param section:
+        :return: name or None, if the ID is not known yet.
+        """
+        return self._get_name(section, obj_id)
+
     def take_from(self, search_result: dict, section: str) -> dict:
         """
         Finds an ID from the search result by section.
@@ -149,26 +567,615 @@ class TrololoIdMapper(object):
 
     def save(self, action=True):
         """
-        Save data map to the disk.
+        Append new and removed name/ID pairs to the journal of the data map.
+        Journal is compacted into the data map in the background,
+        once it grows over the size limit.
 
-        :param skip: Helper to avoid check every time if there is something to save.
+        :param action: Helper to avoid check every time if there is something to save.
         :return:
         """
-        if action:
+        if action and (self.__dirty or self.__removed):
+            with self._lock:
+                since = self._get_stamp()
+                added, removed = self.__dirty, self.__removed
+                delta = dict(added)
+                if removed:
+                    delta[self.REMOVED] = removed
+                try:
+                    with open_journal(self.__journal_path) as jnh:
+                        pickle.dump(delta, jnh)
+                except Exception as ex:
+                    raise trololo.exceptions.DataMapperError("Error while saving data map: {}".format(ex))
+                self.__dirty = {}
+                self.__removed = {}
+                self._log_ngrams(since, added, removed)
+
             try:
-                with open(self.__path, "wb") as dmh:
+                size = os.path.getsize(self.__journal_path)
+            except OSError:
+                size = 0
+            if size > self.JOURNAL_SIZE and (self.__compactor is None or not self.__compactor.is_alive()):
+                self.__compactor = threading.Thread(target=self.compact)
+                self.__compactor.start()
+
+    def compact(self):
+        """
+        Write entire data map to the disk and empty the journal.
+        Data map is replaced atomically, so it is never truncated.
+
+        :return:
+        """
+        try:
+            with self._lock:
+                since = self._get_stamp()
+                with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(self.__path)),
+                                                 prefix=".", delete=False) as dmh:
                     pickle.dump(self.__datamap, dmh)
+                os.replace(dmh.name, self.__path)
+                with open_journal(self.__journal_path) as jnh:
+                    jnh.truncate(0)
+                self._log_ngrams(since, {}, {})
+        except Exception as ex:
+            sys.stderr.write("Error while compacting data map: {}\n".format(ex))
+
+    def load(self):
+        """
+        Load data map from the disk and replay its journal.
+
+        :return:
+        """
+        with self._lock:
+            try:
+                with open(self.__path, "rb") as dmh:
+                    self.__datamap = pickle.load(dmh)
+            except FileNotFoundError as ex:
+                # Not compacted yet: the journal has it all
+                if not os.path.exists(self.__journal_path):
+                    sys.stderr.write("Error while loading mapper: {}\n".format(ex))
             except Exception as ex:
-                raise trololo.exceptions.DataMapperError("Error while saving data map: {}".format(ex))
+                sys.stderr.write("Error while loading mapper: {}\n".format(ex))
+            self.__index = {}
+            self.__names = {}
+            for index in self.__ngrams.values():
+                index.close()
+            self.__ngrams = {}
+            self.__replay()
+
+    def __replay(self):
+        """
+        Apply journal records to the data map.
+
+        :return:
+        """
+        for delta in iter_journal(self.__journal_path):
+            for section, names in delta.items():
+                if section != self.REMOVED:
+                    for name, ids in names.items():
+                        self.__datamap.setdefault(section, {}).setdefault(name, set()).update(ids)
+            for section, names in delta.get(self.REMOVED, {}).items():
+                for name, ids in names.items():
+                    known = self.__datamap.get(section, {}).get(name)
+                    if known is not None:
+                        known.difference_update(ids)
+                        if not known:
+                            del self.__datamap[section][name]
+
+
+class TrololoSqliteIdMapper(TrololoIdMapper):
+    """
+    Keeps what we already know in SQLite database. Names are read
+    on demand by the index and only new names are written on save.
+    """
+
+    DATA_MAPPER_FILE = "edward.db"
+    PREFIX_END = "\U0010ffff"
+
+    def __init__(self, path):
+        """
+        Path to the mapper storage.
+
+        :param path:
+        """
+        self.__db_path = os.path.join(path, self.DATA_MAPPER_FILE)
+        self.__root = path
+        self.__pending = set()
+        self.__removed = set()
+        self.__conn = None
+        super(TrololoSqliteIdMapper, self).__init__(path)
+
+    def _add(self, section: str, name: str, obj_id: str) -> None:
+        """
+        Add name/ID pair to the section, until it is saved.
+
+        :param section:
+        :param name:
+        :param obj_id:
+        :return:
+        """
+        with self._lock:
+            self.__removed.discard((section, name, obj_id))
+            self.__pending.add((section, name, obj_id))
+        self._add_ngram(section, name, obj_id)
+
+    def _remove(self, section: str, name: str, obj_id: str) -> None:
+        """
+        Remove name/ID pair from the section, until it is saved.
+
+        :param section:
+        :param name:
+        :param obj_id:
+        :return:
+        """
+        with self._lock:
+            self.__pending.discard((section, name, obj_id))
+            self.__removed.add((section, name, obj_id))
+        self._remove_ngram(section, name, obj_id)
+
+    def _find(self, section: str, text: str):
+        """
+        Find names in the section, starting with the text.
+
+        :param section:
+        :param text:
+        :return: list of (name, IDs) tuples
+        """
+        found = {}
+        with self._lock:
+            for name, obj_id in self.__conn.execute("SELECT name, id FROM names WHERE section = ? "
+                                                    "AND name >= ? AND name < ?",
+                                                    (section, text, text + self.PREFIX_END)):
+                if (section, name, obj_id) not in self.__removed:
+                    found.setdefault(name, set()).add(obj_id)
+            for p_section, name, obj_id in self.__pending:
+                if p_section == section and name.startswith(text):
+                    found.setdefault(name, set()).add(obj_id)
+
+        return sorted(found.items())
+
+    def _get_name(self, section: str, obj_id: str):
+        """
+        Get name of the ID in the section.
+
+        :param section:
+        :param obj_id:
+        :return: name or None
+        """
+        with self._lock:
+            for p_section, name, p_id in self.__pending:
+                if p_section == section and p_id == obj_id:
+                    return name
+            for name, in self.__conn.execute("SELECT name FROM names WHERE section = ? AND id = ?",
+                                             (section, obj_id)):
+                if (section, name, obj_id) not in self.__removed:
+                    return name
+
+        return None
+
+    def _names(self, section: str):
+        """
+        Get all names of the section.
+
+        :param section:
+        :return: list of (name, IDs) tuples
+        """
+        names = {}
+        with self._lock:
+            for name, obj_id in self.__conn.execute("SELECT name, id FROM names WHERE section = ?", (section,)):
+                if (section, name, obj_id) not in self.__removed:
+                    names.setdefault(name, set()).add(obj_id)
+        for name, ids in self._new_names(section):
+            names.setdefault(name, set()).update(ids)
+
+        return list(names.items())
+
+    def _new_names(self, section: str):
+        """
+        Get names of the section, which are not saved yet.
+
+        :param section:
+        :return: list of (name, IDs) tuples
+        """
+        names = {}
+        with self._lock:
+            for p_section, name, obj_id in self.__pending:
+                if p_section == section:
+                    names.setdefault(name, set()).add(obj_id)
+
+        return list(names.items())
+
+    def _removed_names(self, section: str):
+        """
+        Get names of the section, removed since the last save.
+
+        :param section:
+        :return: list of (name, IDs) tuples
+        """
+        names = {}
+        with self._lock:
+            for r_section, name, obj_id in self.__removed:
+                if r_section == section:
+                    names.setdefault(name, set()).add(obj_id)
+
+        return list(names.items())
+
+    def _storage_paths(self):
+        """
+        Get paths of the storage files.
+
+        :return: list of paths
+        """
+        return [self.__db_path]
+
+    def save(self, action=True):
+        """
+        Write new name/ID pairs to the database and delete the removed ones.
+
+        :param action: Helper to avoid check every time if there is something to save.
+        :return:
+        """
+        if action and (self.__pending or self.__removed):
+            with self._lock:
+                since = self._get_stamp()
+                try:
+                    with self.__conn:
+                        self.__conn.executemany("DELETE FROM names WHERE section = ? AND name = ? AND id = ?",
+                                                self.__removed)
+                        self.__conn.executemany("INSERT OR IGNORE INTO names (section, name, id) VALUES (?, ?, ?)",
+                                                self.__pending)
+                except Exception as ex:
+                    raise trololo.exceptions.DataMapperError("Error while saving data map: {}".format(ex))
+                added, removed = {}, {}
+                for changes, pairs in ((added, self.__pending), (removed, self.__removed)):
+                    for section, name, obj_id in pairs:
+                        changes.setdefault(section, {}).setdefault(name, set()).add(obj_id)
+                    pairs.clear()
+                self._log_ngrams(since, added, removed)
 
     def load(self):
         """
-        Load data map from the disk.
+        Open the database and import the pickled data map once.
 
         :return:
         """
+        import sqlite3
+
         try:
-            with open(self.__path, "rb") as dmh:
-                self.__datamap = pickle.load(dmh)
-        except Exception as ex:
-            sys.stderr.write("Error while loading mapper: {}\n".format(ex))
+            self.__conn = sqlite3.connect(self.__db_path, check_same_thread=False)
+            with self.__conn:
+                self.__conn.execute("CREATE TABLE IF NOT EXISTS names (section TEXT, name TEXT, id TEXT, "
+                                    "PRIMARY KEY (section, name, id)) WITHOUT ROWID")
+                self.__conn.execute("CREATE INDEX IF NOT EXISTS names_id ON names (section, id)")
+                self.__conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        except sqlite3.Error as ex:
+            raise trololo.exceptions.DataMapperError("Error while opening data map: {}".format(ex))
+
+        if self.__conn.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone() is None:
+            self.__migrate()
+
+    def __migrate(self):
+        """
+        Import pickled data map.
+
+        :return:
+        """
+        pickle_path = os.path.join(self.__root, TrololoIdMapper.DATA_MAPPER_FILE)
+        items = []
+        if os.path.exists(pickle_path) or os.path.exists(pickle_path + self.JOURNAL_SUFFIX):
+            items = TrololoIdMapper(self.__root)._items()
+
+        with self.__conn:
+            self.__conn.executemany("INSERT OR IGNORE INTO names (section, name, id) VALUES (?, ?, ?)", items)
+            self.__conn.execute("INSERT INTO meta (key, value) VALUES ('migrated', ?)", (pickle_path,))
+
+
+class TrololoMmapIdMapper(TrololoIdMapper):
+    """
+    Keeps what we already know in the memory-mapped index. Startup
+    does not depend on the size of the index: only the pages of the
+    looked up names are read. Changes are appended to the journal
+    on save and merged into the index, once the journal grows big.
+    """
+
+    DATA_MAPPER_FILE = "edward.idx"
+
+    def __init__(self, path):
+        """
+        Path to the mapper storage.
+
+        :param path:
+        """
+        self.__idx_path = os.path.join(path, self.DATA_MAPPER_FILE)
+        self.__journal_path = self.__idx_path + self.JOURNAL_SUFFIX
+        self.__root = path
+        self.__index = None
+        self.__delta = {}
+        self.__removed = {}
+        self.__pending = {}
+        self.__pending_removed = {}
+        self.__names = {}
+        super(TrololoMmapIdMapper, self).__init__(path)
+
+    def __change(self, section: str, name: str, obj_id: str, add: bool) -> bool:
+        """
+        Apply added or removed name/ID pair on top of the index.
+        New pairs are kept in the delta, removed pairs of the index are masked.
+
+        :param section:
+        :param name:
+        :param obj_id:
+        :param add: True to add the pair, False to remove it.
+        :return: True, if the pair has changed.
+        """
+        delta = self.__delta.setdefault(section, {})
+        removed = self.__removed.setdefault(section, {})
+        if add:
+            if obj_id in removed.get(name, ()):
+                removed[name].discard(obj_id)
+            elif obj_id in delta.get(name, ()) or obj_id in self.__index.get(section, name):
+                return False
+            else:
+                delta.setdefault(name, set()).add(obj_id)
+        elif obj_id in delta.get(name, ()):
+            delta[name].discard(obj_id)
+            if not delta[name]:
+                del delta[name]
+        elif obj_id in self.__index.get(section, name) and obj_id not in removed.get(name, ()):
+            removed.setdefault(name, set()).add(obj_id)
+        else:
+            return False
+
+        return True
+
+    def _add(self, section: str, name: str, obj_id: str) -> None:
+        """
+        Add name/ID pair to the section, until it is saved.
+
+        :param section:
+        :param name:
+        :param obj_id:
+        :return:
+        """
+        with self._lock:
+            if not self.__change(section, name, obj_id, True):
+                return
+            self._log_change(self.__pending, self.__pending_removed, section, name, obj_id)
+            if section in self.__names:
+                self.__names[section][obj_id] = name
+        self._add_ngram(section, name, obj_id)
+
+    def _remove(self, section: str, name: str, obj_id: str) -> None:
+        """
+        Remove name/ID pair from the section, until it is saved.
+
+        :param section:
+        :param name:
+        :param obj_id:
+        :return:
+        """
+        with self._lock:
+            if not self.__change(section, name, obj_id, False):
+                return
+            self._log_change(self.__pending_removed, self.__pending, section, name, obj_id)
+            if self.__names.get(section, {}).get(obj_id) == name:
+                del self.__names[section][obj_id]
+        self._remove_ngram(section, name, obj_id)
+
+    def __get_ids(self, section, name, ids):
+        """
+        Get IDs of the name in the index, which are not removed.
+
+        :param section:
+        :param name:
+        :param ids: IDs of the name in the index
+        :return: set of IDs
+        """
+        return ids.difference(self.__removed.get(section, {}).get(name, ()))
+
+    def _find(self, section: str, text: str):
+        """
+        Find names in the section, starting with the text.
+
+        :param section:
+        :param text:
+        :return: list of (name, IDs) tuples
+        """
+        with self._lock:
+            found = {name: self.__get_ids(section, name, ids) for name, ids in self.__index.find(section, text)}
+            for name, ids in self.__delta.get(section, {}).items():
+                if name.startswith(text):
+                    found.setdefault(name, set()).update(ids)
+
+        return sorted((name, ids) for name, ids in found.items() if ids)
+
+    def _get_name(self, section: str, obj_id: str):
+        """
+        Get name of the ID in the section. Names of the section
+        are read from the index on the first lookup.
+
+        :param section:
+        :param obj_id:
+        :return: name or None
+        """
+        with self._lock:
+            names = self.__names.get(section)
+            if names is None:
+                names = self.__names[section] = {}
+                for name, ids in self.__get_section(section).items():
+                    names.update(dict.fromkeys(ids, name))
+            return names.get(obj_id)
+
+    def _items(self):
+        """
+        Get all name/ID pairs.
+
+        :return: list of (section, name, ID) tuples
+        """
+        with self._lock:
+            return [(section, name, obj_id) for section, names in self.__get_datamap().items()
+                    for name, ids in names.items() for obj_id in ids]
+
+    def _names(self, section: str):
+        """
+        Get all names of the section.
+
+        :param section:
+        :return: list of (name, IDs) tuples
+        """
+        with self._lock:
+            return list(self.__get_section(section).items())
+
+    def _new_names(self, section: str):
+        """
+        Get names of the section, which are not saved yet.
+
+        :param section:
+        :return: list of (name, IDs) tuples
+        """
+        with self._lock:
+            return [(name, set(ids)) for name, ids in self.__pending.get(section, {}).items()]
+
+    def _removed_names(self, section: str):
+        """
+        Get names of the section, removed since the last save.
+
+        :param section:
+        :return: list of (name, IDs) tuples
+        """
+        with self._lock:
+            return [(name, set(ids)) for name, ids in self.__pending_removed.get(section, {}).items()]
+
+    def _storage_paths(self):
+        """
+        Get paths of the storage files.
+
+        :return: list of paths
+        """
+        return [self.__idx_path, self.__journal_path]
+
+    def __get_section(self, section):
+        """
+        Read the entire section of the index along with the changes.
+
+        :param section:
+        :return: {name: IDs} dict
+        """
+        names = {}
+        for name, ids in self.__index.items(section):
+            ids = self.__get_ids(section, name, ids)
+            if ids:
+                names[name] = ids
+        for name, ids in self.__delta.get(section, {}).items():
+            names.setdefault(name, set()).update(ids)
+
+        return names
+
+    def __get_datamap(self):
+        """
+        Read the entire index along with the changes.
+
+        :return: {section: {name: IDs}} dict
+        """
+        return {section: self.__get_section(section) for section in self.SECTIONS}
+
+    def save(self, action=True):
+        """
+        Append new and removed name/ID pairs to the journal of the index.
+        Journal is merged into the index, once it grows over the size limit.
+
+        :param action: Helper to avoid check every time if there is something to save.
+        :return:
+        """
+        if action and (self.__pending or self.__pending_removed):
+            try:
+                with self._lock:
+                    since = self._get_stamp()
+                    added, removed = self.__pending, self.__pending_removed
+                    delta = dict(added)
+                    if removed:
+                        delta[self.REMOVED] = removed
+                    with open_journal(self.__journal_path) as jnh:
+                        pickle.dump(delta, jnh)
+                    self.__pending = {}
+                    self.__pending_removed = {}
+                    self._log_ngrams(since, added, removed)
+                    if os.path.getsize(self.__journal_path) > self.JOURNAL_SIZE:
+                        self.compact()
+            except Exception as ex:
+                raise trololo.exceptions.DataMapperError("Error while saving data map: {}".format(ex))
+
+    def compact(self):
+        """
+        Merge the journal into the index and empty it.
+        Index is replaced atomically, so it is never truncated.
+
+        :return:
+        """
+        from trololo.mapindex import TrololoMapIndex
+
+        with self._lock:
+            since = self._get_stamp()
+            datamap = self.__get_datamap()
+            self.__index.close()
+            TrololoMapIndex.write(self.__idx_path, datamap)
+            self.__index = TrololoMapIndex(self.__idx_path)
+            with open_journal(self.__journal_path) as jnh:
+                jnh.truncate(0)
+            self.__delta = {}
+            self.__removed = {}
+            self._log_ngrams(since, {}, {})
+
+    def load(self):
+        """
+        Map the index, building it from the pickled data map once.
+
+        :return:
+        """
+        from trololo.mapindex import TrololoMapIndex
+
+        with self._lock:
+            if not os.path.exists(self.__idx_path):
+                pickle_path = os.path.join(self.__root, TrololoIdMapper.DATA_MAPPER_FILE)
+                datamap = {}
+                if os.path.exists(pickle_path) or os.path.exists(pickle_path + self.JOURNAL_SUFFIX):
+                    for section, name, obj_id in TrololoIdMapper(self.__root)._items():
+                        datamap.setdefault(section, {}).setdefault(name, set()).add(obj_id)
+                try:
+                    TrololoMapIndex.write(self.__idx_path, datamap)
+                except OSError as ex:
+                    raise trololo.exceptions.DataMapperError("Error while creating data map: {}".format(ex))
+
+            if self.__index is not None:
+                self.__index.close()
+            self.__index = TrololoMapIndex(self.__idx_path)
+            self.__names = {}
+            self.__delta = {}
+            self.__removed = {}
+            for delta in iter_journal(self.__journal_path):
+                removed = delta.pop(self.REMOVED, {})
+                for add, changes in ((True, delta), (False, removed)):
+                    for section, names in changes.items():
+                        for name, ids in names.items():
+                            for obj_id in ids:
+                                self.__change(section, name, obj_id, add)
+
+
+MAPPERS = {
+    "pickle": TrololoIdMapper,
+    "sqlite": TrololoSqliteIdMapper,
+    "mmap": TrololoMmapIdMapper,
+}
+
+
+def get_mapper(path, storage="pickle"):
+    """
+    Get ID mapper with the given storage.
+
+    :param path: path to the mapper storage.
+    :param storage: name of the storage.
+    :return:
+    """
+    if storage not in MAPPERS:
+        raise trololo.exceptions.DataMapperError("Unknown mapper storage '{}'. Choose one of: {}".format(
+            storage, ", ".join(sorted(MAPPERS))))
+
+    return MAPPERS[storage](path)
@@ -0,0 +1,204 @@
+# coding=utf-8
+"""
+Bulk import of the cards and comments from CSV or JSONL files.
+
+Every row is either a card or a comment:
+
+    card:     list, name, description, labels (comma-separated), pos
+    comment:  card, comment
+
+Lists, labels and cards are referred by IDs or by names, known to the mapper.
+"""
+
+import os
+import csv
+import json
+import threading
+import collections
+
+import trololo.exceptions
+from trololo.crawler import TrololoCrawler
+from trololo.idmapper import TrololoIdMapper
+from trololo.lalala import TrololoList, TrololoCard
+
+TrololoImportResult = collections.namedtuple("TrololoImportResult", ["line", "kind", "obj", "error"])
+
+
+def iter_rows(path):
+    """
+    Read rows of the file one by one. Format is chosen by the extension:
+    ".csv" for CSV with the header, otherwise JSON object per line.
+    Lines of JSONL are parsed by parse_row, so a broken line fails only its row.
+
+    :param path:
+    :return: generator of the row dicts (CSV) or of the lines (JSONL)
+    """
+    with open(path, newline="") as imh:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(imh):
+                yield dict(row)
+        else:
+            for line in imh:
+                line = line.strip()
+                if line:
+                    yield line
+
+
+def parse_row(row):
+    """
+    Get row dict of the row, read by iter_rows.
+
+    :param row: row dict or JSON line
+    :return: row dict
+    """
+    if isinstance(row, str):
+        row = json.loads(row)
+        if not isinstance(row, dict):
+            raise trololo.exceptions.CLIError("Row should be a JSON object")
+
+    return row
+
+
+class TrololoImporter(object):
+    """
+    Imports rows through the bounded concurrent pipeline. Names are
+    resolved once per import, by the start of the name only. Cards of
+    the same list are written one after another, so they keep the order
+    of the rows. Numbers of the imported rows are kept in the progress
+    file, so an interrupted import continues where it stopped.
+    """
+    PROGRESS_SUFFIX = ".progress"
+
+    def __init__(self, client, mapper, jobs=4):
+        """
+        Client, mapper to resolve the names and number of the concurrent writes.
+
+        :param client: TrololoClient
+        :param mapper: TrololoIdMapper
+        :param jobs:
+        """
+        self._client = client
+        self._mapper = mapper
+        self._jobs = jobs
+        self._ids = {}
+        self._written = {}
+
+    def _resolve(self, text, section):
+        """
+        Get ID by the ID or by the name. Names, which only look alike,
+        are not taken: the row fails instead.
+
+        :param text:
+        :param section:
+        :return:
+        """
+        text = (text or "").strip()
+        if not text:
+            raise trololo.exceptions.CLIError("Missing {} of the row".format(section.rstrip("s")))
+        if self._mapper.is_id(text):
+            return text
+
+        key = (section, text)
+        if key not in self._ids:
+            self._ids[key] = self._mapper.take_from(self._mapper.get_id_by_name(text, section, fuzzy=False),
+                                                   section)
+
+        return self._ids[key]
+
+    def _prepare(self, row):
+        """
+        Resolve names of the row. Done in the reading thread, so the
+        mapper is not accessed concurrently.
+
+        :param row:
+        :return: (kind, function which writes the row to Trello) tuple
+        """
+        if row.get("comment"):
+            card = TrololoCard.load(self._client, {"id": self._resolve(row.get("card"), TrololoIdMapper.S_CARD)})
+            return "comment", lambda: card.add_comment(row["comment"])
+
+        if not row.get("name"):
+            raise trololo.exceptions.CLIError("Row should have either a name of the card or a comment")
+        t_list = TrololoList.load(self._client, {"id": self._resolve(row.get("list"), TrololoIdMapper.S_LIST)})
+        labels = row.get("labels") or []
+        if isinstance(labels, str):
+            labels = self._client.get_arg_list(labels)
+        labels = [self._resolve(label, TrololoIdMapper.S_LABEL) for label in labels]
+
+        # Every card waits for the previous one of the list, otherwise they are added in any order
+        previous = self._written.get(t_list.id)
+        written = self._written[t_list.id] = threading.Event()
+
+        def add_card():
+            if previous is not None:
+                previous.wait()
+            try:
+                return t_list.add_card(row["name"], row.get("description") or "", labels=labels,
+                                       pos=row.get("pos") or "bottom")
+            finally:
+                written.set()
+
+        return "card", add_card
+
+    @staticmethod
+    def _write(task):
+        """
+        Write the row, keeping the error as its result.
+
+        :param task: (line, kind, write function or error) tuple
+        :return: TrololoImportResult
+        """
+        line, kind, write = task
+        if isinstance(write, Exception):
+            return TrololoImportResult(line, kind, None, write)
+        try:
+            return TrololoImportResult(line, kind, write(), None)
+        except Exception as ex:
+            return TrololoImportResult(line, kind, None, ex)
+
+    def _tasks(self, path, done):
+        """
+        Prepare rows of the file, which are not imported yet.
+
+        :param path:
+        :param done: numbers of the imported rows
+        :return: generator of (line, kind, write function or error) tuples
+        """
+        for line, row in enumerate(iter_rows(path), 1):
+            if line in done:
+                continue
+            try:
+                kind, write = self._prepare(parse_row(row))
+            except Exception as ex:
+                kind, write = "row", ex
+            yield line, kind, write
+
+    def run(self, path, restart=False):
+        """
+        Import the file, yielding result of every row in order of the rows.
+        Progress file is removed once every row has been imported. If the
+        file cannot be read further, the rows in flight are still written
+        to the progress file before the error is raised.
+
+        :param path: path to the CSV or JSONL file.
+        :param restart: ignore progress of the previous import.
+        :return: generator of TrololoImportResult
+        """
+        progress_path = path + self.PROGRESS_SUFFIX
+        done = set()
+        if not restart and os.path.exists(progress_path):
+            with open(progress_path) as prh:
+                done = {int(line) for line in prh if line.strip().isdigit()}
+
+        failed = False
+        with open(progress_path, "w" if restart else "a") as prh, TrololoCrawler(self._jobs) as crawler:
+            for result in crawler.imap(self._write, self._tasks(path, done)):
+                if result.error is None:
+                    prh.write("{}\n".format(result.line))
+                    prh.flush()
+                else:
+                    failed = True
+                yield result
+
+        if not failed:
+            os.remove(progress_path)
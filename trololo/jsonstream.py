@@ -0,0 +1,83 @@
+# coding=utf-8
+"""
+Incremental decoding of the JSON arrays.
+"""
+
+import json
+import codecs
+
+DELIMITERS = (" ", "\t", "\r", "\n", ",", "]")
+
+
+class _Buffer(object):
+    """
+    Text buffer over the byte chunks.
+    """
+
+    def __init__(self, chunks, encoding):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self.text = ""
+        self.eof = False
+
+    def read(self, pos):
+        """
+        Drop the text before the position and append the next chunk.
+
+        :param pos:
+        :return:
+        """
+        chunk = next(self._chunks, None)
+        self.eof = chunk is None
+        self.text = self.text[pos:] + self._decoder.decode(chunk or b"", final=self.eof)
+
+
+def iter_array(chunks, encoding="utf-8"):
+    """
+    Decode JSON array from the byte chunks, yielding its elements
+    one by one as soon as they are complete. Only the current element
+    is kept in the memory.
+
+    :param chunks: iterable of bytes
+    :param encoding: encoding of the bytes
+    :return: generator of the array elements
+    """
+    decoder = json.JSONDecoder()
+    buf = _Buffer(chunks, encoding)
+    pos = 0
+    started = False
+
+    while True:
+        while pos < len(buf.text) and buf.text[pos] in " \t\r\n":
+            pos += 1
+
+        if pos == len(buf.text):
+            if buf.eof:
+                raise ValueError("Unexpected end of the JSON array")
+            buf.read(pos)
+            pos = 0
+        elif not started:
+            if buf.text[pos] != "[":
+                raise ValueError("JSON array expected, got '{}'".format(buf.text[pos:pos + 20]))
+            started = True
+            pos += 1
+        elif buf.text[pos] == "]":
+            return
+        elif buf.text[pos] == ",":
+            pos += 1
+        else:
+            try:
+                obj, end = decoder.raw_decode(buf.text, pos)
+            except ValueError:
+                obj, end = None, None
+
+            if end is None or (not isinstance(obj, (dict, list)) and not buf.eof
+                               and buf.text[end:end + 1] not in DELIMITERS):
+                # Element is not complete yet, e.g. number "12" of "12.5"
+                if buf.eof:
+                    raise ValueError("Broken JSON array at '{}'".format(buf.text[pos:pos + 20]))
+                buf.read(pos)
+                pos = 0
+            else:
+                pos = end
+                yield obj
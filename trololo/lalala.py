@@ -6,64 +6,208 @@ Lalala package contains main objects of Trello to work with.
 import re
 
 
-class TrololoObject(object):
+class TrololoFields(object):
     """
-    Interface for the Trololo objects.
+    Access to the fields of the Trello data. Lazily loaded objects keep
+    the decoded JSON and convert a field on its first access. Fields are
+    also accessible by their snake_case aliases, e.g. "id_list" for "idList".
     """
+    __slots__ = ()
+
     _re_gr = re.compile(r"(.)([A-Z][a-z]+)")
     _re_sb = re.compile(r"([a-z0-9])([A-Z])")
+    _uncameled = {}
 
-    def __init__(self, client, **kwargs):
-        self._client = client
-        self.__to_obj(kwargs)
+    def _uncamel(self, name):
+        """
+        Convert "thisThing" to "this_thing".
 
-    def __to_obj(self, data, obj=None):
+        :param name:
+        :return:
         """
-        JSON to object.
+        return self._re_sb.sub(r'\1_\2', self._re_gr.sub(r"\1_\2", name)).lower()
 
-        :param data:
-        :param obj:
+    def _get_alias(self, key):
+        """
+        Get snake_case alias of the field, caching it for all the objects.
+
+        :param key:
         :return:
         """
-        if obj is None:
-            obj = self
-        for key, value in data.items():
-            if isinstance(value, dict):
-                setattr(obj, key, type(key, (), {}))
-                self.__to_obj(value, getattr(obj, key))
-            else:
-                setattr(obj, key, value)
+        alias = self._uncameled.get(key)
+        if alias is None:
+            alias = self._uncameled[key] = self._uncamel(key)
 
-    def _uncamel(self, name):
+        return alias
+
+    @classmethod
+    def _get_accessors(cls):
         """
-        Convert "thisThing" to "this_thing".
+        Get per-class map of the accessed attributes to the keys of the data.
 
-        :param name:
         :return:
         """
-        return self._re_sb.sub(r'\1_\2', self._re_gr.sub(r"\1_\2", name)).lower()
+        accessors = cls.__dict__.get("_accessors")
+        if accessors is None:
+            accessors = {}
+            setattr(cls, "_accessors", accessors)
+
+        return accessors
+
+    @staticmethod
+    def _to_value(value, lazy):
+        """
+        Convert JSON value to the field value.
+
+        :param value:
+        :param lazy:
+        :return:
+        """
+        return TrololoData.load(value, lazy=lazy) if isinstance(value, dict) else value
+
+    def _get_keys(self):
+        """
+        Get names of the known fields.
+
+        :return:
+        """
+        keys = []
+        for cls in type(self).__mro__:
+            keys.extend(slot for slot in cls.__dict__.get("__slots__", ()) if not slot.startswith("_"))
+
+        return keys
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name == "_raw":
+            raise AttributeError(name)
+
+        try:
+            raw = self._raw
+        except AttributeError:
+            raw = None
+
+        if raw is not None:
+            accessors = self._get_accessors()
+            key = accessors.get(name)
+            if key is None or key not in raw:
+                key = name if name in raw else next((r_key for r_key in raw if self._get_alias(r_key) == name), None)
+                if key is not None:
+                    accessors[name] = key
+
+            if key is not None:
+                if key != name:
+                    try:
+                        return object.__getattribute__(self, key)
+                    except AttributeError:
+                        pass
+                value = self._to_value(raw[key], lazy=True)
+                try:
+                    setattr(self, key, value)
+                except AttributeError:
+                    pass  # Unknown field of the object stays in the raw data
+
+                return value
+
+        for key in self._get_keys():
+            if key != name and self._get_alias(key) == name and hasattr(self, key):
+                return getattr(self, key)
+
+        raise AttributeError(name)
+
+
+class TrololoData(TrololoFields):
+    """
+    Nested data of the Trololo objects, e.g. "badges" or "prefs".
+    """
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, self._to_value(value, lazy=False))
+
+    def _get_keys(self):
+        """
+        Get names of the fields.
+
+        :return:
+        """
+        return [key for key in self.__dict__ if key != "_raw"]
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, ", ".join("{}={!r}".format(*item)
+                                                                   for item in self.__dict__.items()
+                                                                   if item[0] != "_raw"))
 
     @classmethod
-    def load(cls, client, data):
+    def load(cls, data, lazy=False):
+        """
+        Create an instance from the JSON data.
+
+        :param data:
+        :param lazy: convert fields on the first access.
+        :return:
+        """
+        if not lazy:
+            return cls(**data)
+
+        obj = cls()
+        obj._raw = data
+        return obj
+
+
+class TrololoObject(TrololoFields):
+    """
+    Interface for the Trololo objects.
+
+    Known fields of the objects are kept in slots. The rest of them
+    are kept in the raw data, which lazily loaded objects have anyway,
+    so there is no instance dictionary per object.
+    """
+    __slots__ = ("_client", "_raw", "id", "name")
+
+    def __init__(self, client, **kwargs):
+        self._client = client
+        unknown = {}
+        for key, value in kwargs.items():
+            value = self._to_value(value, lazy=False)
+            try:
+                setattr(self, key, value)
+            except AttributeError:
+                unknown[key] = value
+        if unknown:
+            self._raw = unknown
+
+    @classmethod
+    def load(cls, client, data, lazy=None):
         """
         Create an instance from self.
 
         :param data:
+        :param lazy: convert fields on the first access. By default, as the client tells.
         :return:
         """
-        return cls(client, **data)
+        if lazy is None:
+            lazy = getattr(client, "lazy", False)
+        if not lazy:
+            return cls(client, **data)
+
+        obj = cls.__new__(cls)
+        obj._client = client
+        obj._raw = data
+        return obj
 
 
 class TrololoLabel(TrololoObject):
     """
     Trello label on the board.
     """
+    __slots__ = ("color", "idBoard", "uses")
 
 
 class TrololoAction(TrololoObject):
     """
     Trello comment (action).
     """
+    __slots__ = ("data", "date", "type", "idMemberCreator", "memberCreator", "appCreator", "limits")
 
     def get_text(self):
         """
@@ -78,19 +222,56 @@ class TrololoCard(TrololoObject):
     """
     Trello card on the trello list of the board.
     """
+    __slots__ = ("desc", "closed", "idList", "idBoard", "idLabels", "labels", "idMembers", "badges", "pos", "due",
+                 "url", "shortUrl", "dateLastActivity", "customFieldItems", "limits", "actions")
 
     def get_actions(self):
         """
         List comments (actions) of the cards.
+        Actions, already nested in the card data, are used as is.
 
         :return:
         """
         actions = []
-        for action in self._client._request("cards/{}/actions".format(self.id)):
+        for action in self.actions if hasattr(self, "actions") else self._client._request(
+                "cards/{}/actions".format(self.id)):
             actions.append(TrololoAction.load(self._client, action))
 
         return actions
 
+    def iter_actions(self):
+        """
+        Iterate over comments (actions) of the card,
+        decoding them one by one from the response stream.
+
+        :return: generator of TrololoAction
+        """
+        for action in self.actions if hasattr(self, "actions") else self._client._stream(
+                "cards/{}/actions".format(self.id)):
+            yield TrololoAction.load(self._client, action)
+
+    def iter_history(self, action_filter="commentCard", since=None, before=None, page_size=None, fields="all"):
+        """
+        Iterate over the entire history of the card, from the newest
+        actions, page by page. Stop iterating to stop fetching.
+
+        :param action_filter: comma-separated types of the actions, e.g. "commentCard,updateCard:idList"
+        :param since: take actions since this date or action ID.
+        :param before: take actions before this date or action ID.
+        :param page_size: number of the actions per request.
+        :param fields: comma-separated fields of the actions, e.g. "data,date"
+        :return: generator of TrololoAction
+        """
+        query = {"filter": action_filter, "fields": fields}
+        if since:
+            query["since"] = since
+        if before:
+            query["before"] = before
+
+        for action in self._client._pages("cards/{}/actions".format(self.id), query=query,
+                                          limit=page_size or self._client.PAGE_SIZE):
+            yield TrololoAction.load(self._client, action)
+
     def add_comment(self, text):
         """
         Add a comment to this card.
@@ -101,55 +282,94 @@ class TrololoCard(TrololoObject):
         return TrololoAction.load(self._client, self._client._request("cards/{}/actions/comments".format(self.id),
                                                                       query={"text": text}, method="POST"))
 
-    def add_labels(self, *labels):
+    @staticmethod
+    def _get_label_ids(labels):
         """
-        Add labels to this card.
-        A labels is an array of key/value (text/color) dicts or TrololoLabel objects.
+        Get IDs of the labels.
 
-        :param labels:
-        :return:
+        :param labels: label IDs or TrololoLabel objects
+        :return: list of IDs
         """
         id_labels = []
         for label in labels:
-            if isinstance(labels, TrololoLabel):
+            if isinstance(label, TrololoLabel):
                 id_labels.append(label.id)
             elif isinstance(label, str):
                 id_labels.append(label)
 
-        return TrololoLabel.load(self._client, self._client._request("cards/{}".format(self.id),
-                                                                     query={"idLabels": ",".join(id_labels)},
-                                                                     method="PUT"))
+        return id_labels
+
+    def add_labels(self, *labels):
+        """
+        Add labels to this card.
+        A labels is an array of key/value (text/color) dicts or TrololoLabel objects.
+
+        :param labels:
+        :return:
+        """
+        return TrololoLabel.load(self._client, self._client._request(
+            "cards/{}".format(self.id), query={"idLabels": ",".join(self._get_label_ids(labels))}, method="PUT"))
 
 
 class TrololoList(TrololoObject):
     """
     Trello list on the trello Board.
     """
+    __slots__ = ("closed", "idBoard", "pos", "subscribed", "softLimit", "limits", "cards")
 
-    def get_cards(self):
+    def get_cards(self, fields="all", custom_fields=True):
         """
         Get cards in the list.
+        Cards, already nested in the list data, are used as is.
 
+        :param fields: comma-separated fields of the cards, e.g. "name,idList"
+        :param custom_fields: include custom field items of the cards
         :return:
         """
         query = {
             "filter": "open",
-            "customFieldItems": "true"
+            "fields": fields,
         }
+        if custom_fields:
+            query["customFieldItems"] = "true"
 
         cards = []
-        for card in self._client._request("lists/{}/cards".format(self.id), query=query):
+        for card in self.cards if hasattr(self, "cards") else self._client._request(
+                "lists/{}/cards".format(self.id), query=query):
             cards.append(TrololoCard.load(self._client, card))
 
         return cards
 
-    def add_card(self, name, description):
+    def iter_cards(self, fields="all", custom_fields=True):
+        """
+        Iterate over cards in the list,
+        decoding them one by one from the response stream.
+
+        :param fields: comma-separated fields of the cards, e.g. "name,idList"
+        :param custom_fields: include custom field items of the cards
+        :return: generator of TrololoCard
         """
-        Add a card to this list.
+        query = {
+            "filter": "open",
+            "fields": fields,
+        }
+        if custom_fields:
+            query["customFieldItems"] = "true"
 
-        :param title:
+        for card in self.cards if hasattr(self, "cards") else self._client._stream(
+                "lists/{}/cards".format(self.id), query=query):
+            yield TrololoCard.load(self._client, card)
+
+    def add_card(self, name, description, labels=None, pos="top", **fields):
+        """
+        Add a card to this list in one request, along with its labels
+        and other fields.
+
+        :param name:
         :param description:
-        :param labels:
+        :param labels: label IDs or TrololoLabel objects
+        :param pos: position of the card: "top", "bottom" or a number
+        :param fields: other fields of the card, e.g. due="2020-01-31" or idMembers="..."
         :return:
         """
         query = {
@@ -157,8 +377,11 @@ class TrololoList(TrololoObject):
             "keepFromSource": "all",
             "name": name,
             "desc": description,
-            "pos": "top",
+            "pos": pos,
         }
+        if labels:
+            query["idLabels"] = ",".join(TrololoCard._get_label_ids(labels))
+        query.update(fields)
 
         return TrololoCard.load(self._client, self._client._request("cards", query=query, method="POST"))
 
@@ -167,6 +390,8 @@ class TrololoBoard(TrololoObject):
     """
     Trello Board.
     """
+    __slots__ = ("desc", "closed", "url", "shortUrl", "prefs", "labelNames", "idOrganization", "limits", "lists",
+                 "labels")
 
     def get_lists(self):
         """
@@ -184,11 +409,13 @@ class TrololoBoard(TrololoObject):
     def get_labels(self):
         """
         Get labels.
+        Labels, already nested in the board data, are used as is.
 
         :return:
         """
         labels = []
-        for b_obj in self._client._request("boards/{}/labels".format(self.id)):
+        for b_obj in self.labels if hasattr(self, "labels") else self._client._request(
+                "boards/{}/labels".format(self.id)):
             labels.append(TrololoLabel.load(self._client, b_obj))
 
         return labels
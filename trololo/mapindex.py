@@ -0,0 +1,195 @@
+# coding=utf-8
+"""
+Compact on-disk index of the names, which is memory-mapped and
+read on demand.
+
+File layout (little-endian):
+
+    header:   magic, version, number of sections
+    sections: name (16 bytes), offset of the name table, number of names
+    tables:   per section, offsets of the records, sorted by name
+    records:  name length, name, IDs length, comma-separated IDs
+"""
+
+import os
+import mmap
+import struct
+import tempfile
+
+import trololo.exceptions
+
+
+class TrololoMapIndex(object):
+    """
+    Reader and writer of the name index.
+    """
+    MAGIC = b"EDIX"
+    VERSION = 1
+    F_HEADER = struct.Struct("<4sII")
+    F_SECTION = struct.Struct("<16sQI")
+    F_OFFSET = struct.Struct("<Q")
+    F_LENGTH = struct.Struct("<I")
+
+    def __init__(self, path):
+        """
+        Open index file. Only the section headers are read.
+
+        :param path:
+        """
+        self._sections = {}
+        self._map = None
+        with open(path, "rb") as idh:
+            if os.fstat(idh.fileno()).st_size:
+                self._map = mmap.mmap(idh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map is None:
+            return
+
+        magic, version, count = self.F_HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise trololo.exceptions.DataMapperError("Unknown format of the index {}".format(path))
+
+        for idx in range(count):
+            name, offset, size = self.F_SECTION.unpack_from(self._map, self.F_HEADER.size + idx * self.F_SECTION.size)
+            self._sections[name.rstrip(b"\0").decode("utf-8")] = (offset, size)
+
+    def close(self):
+        """
+        Unmap the file.
+
+        :return:
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _get_name(self, offset):
+        """
+        Read the name of the record.
+
+        :param offset: offset of the record
+        :return: name as bytes
+        """
+        length, = self.F_LENGTH.unpack_from(self._map, offset)
+        offset += self.F_LENGTH.size
+        return self._map[offset:offset + length]
+
+    def _get_record(self, offset):
+        """
+        Read the record.
+
+        :param offset: offset of the record
+        :return: (name, IDs) tuple
+        """
+        name = self._get_name(offset)
+        offset += self.F_LENGTH.size + len(name)
+        length, = self.F_LENGTH.unpack_from(self._map, offset)
+        offset += self.F_LENGTH.size
+
+        return name.decode("utf-8"), set(self._map[offset:offset + length].decode("utf-8").split(","))
+
+    def _get_offset(self, section, idx):
+        """
+        Get offset of the record by its position in the section.
+
+        :param section:
+        :param idx:
+        :return:
+        """
+        return self.F_OFFSET.unpack_from(self._map, self._sections[section][0] + idx * self.F_OFFSET.size)[0]
+
+    def _bisect(self, section, name):
+        """
+        Find position of the first name in the section, which is not less than the given one.
+
+        :param section:
+        :param name: name as bytes
+        :return:
+        """
+        low, high = 0, self._sections[section][1]
+        while low < high:
+            mid = (low + high) // 2
+            if self._get_name(self._get_offset(section, mid)) < name:
+                low = mid + 1
+            else:
+                high = mid
+
+        return low
+
+    def get(self, section, name):
+        """
+        Get IDs of the name.
+
+        :param section:
+        :param name:
+        :return: set of IDs, empty if there is no such name
+        """
+        if section in self._sections:
+            idx = self._bisect(section, name.encode("utf-8"))
+            if idx < self._sections[section][1]:
+                r_name, ids = self._get_record(self._get_offset(section, idx))
+                if r_name == name:
+                    return ids
+
+        return set()
+
+    def find(self, section, text):
+        """
+        Find names in the section, starting with the text.
+
+        :param section:
+        :param text:
+        :return: list of (name, IDs) tuples, sorted by name
+        """
+        if section not in self._sections:
+            return []
+
+        prefix = text.encode("utf-8")
+        out = []
+        for idx in range(self._bisect(section, prefix), self._sections[section][1]):
+            offset = self._get_offset(section, idx)
+            if not self._get_name(offset).startswith(prefix):
+                break
+            out.append(self._get_record(offset))
+
+        return out
+
+    def items(self, section):
+        """
+        Get all the names of the section.
+
+        :param section:
+        :return: generator of (name, IDs) tuples, sorted by name
+        """
+        for idx in range(self._sections.get(section, (0, 0))[1]):
+            yield self._get_record(self._get_offset(section, idx))
+
+    @classmethod
+    def write(cls, path, datamap):
+        """
+        Write index file atomically.
+
+        :param path:
+        :param datamap: {section: {name: IDs}} dict
+        :return:
+        """
+        sections = [(section, sorted((name.encode("utf-8"), ",".join(sorted(ids)).encode("utf-8"))
+                                     for name, ids in names.items() if ids))
+                    for section, names in datamap.items()]
+
+        offset = cls.F_HEADER.size + cls.F_SECTION.size * len(sections)
+        header = [cls.F_HEADER.pack(cls.MAGIC, cls.VERSION, len(sections))]
+        for section, records in sections:
+            header.append(cls.F_SECTION.pack(section.encode("utf-8"), offset, len(records)))
+            offset += cls.F_OFFSET.size * len(records)
+
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), prefix=".", delete=False) as idh:
+            idh.write(b"".join(header))
+            for _, records in sections:
+                for name, ids in records:
+                    idh.write(cls.F_OFFSET.pack(offset))
+                    offset += cls.F_LENGTH.size * 2 + len(name) + len(ids)
+            for _, records in sections:
+                for name, ids in records:
+                    idh.write(cls.F_LENGTH.pack(len(name)) + name + cls.F_LENGTH.pack(len(ids)) + ids)
+        os.replace(idh.name, path)
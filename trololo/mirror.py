@@ -0,0 +1,390 @@
+# coding=utf-8
+"""
+Local replica of the Trello boards in SQLite.
+
+The board is pulled completely once, then it is kept up to date by
+the actions of the board since the last synchronised one.
+"""
+
+import json
+import time
+import sqlite3
+import threading
+
+import trololo.exceptions
+from trololo.lalala import TrololoBoard, TrololoList, TrololoCard, TrololoAction
+
+
+class TrololoMirror(object):
+    """
+    Mirror of the boards with their lists, cards, labels and comments.
+    Reads are answered with the same objects, as the client returns.
+    """
+    MIRROR_FILE = ".edward-mirror.db"
+    K_BOARD = "board"
+    K_LIST = "list"
+    K_CARD = "card"
+    K_LABEL = "label"
+    K_ACTION = "action"
+
+    def __init__(self, client, path=MIRROR_FILE):
+        """
+        Client to sync and to bind the objects to, and path to the database.
+
+        :param client: TrololoClient
+        :param path:
+        """
+        self._client = client
+        self._lock = threading.RLock()
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute("CREATE TABLE IF NOT EXISTS objects (kind TEXT, id TEXT, board TEXT, parent TEXT, "
+                                   "pos REAL, data TEXT, PRIMARY KEY (kind, id)) WITHOUT ROWID")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS objects_parent ON objects (kind, parent)")
+                self._conn.execute("CREATE TABLE IF NOT EXISTS boards (id TEXT PRIMARY KEY, cursor TEXT, synced REAL)")
+        except sqlite3.Error as ex:
+            raise trololo.exceptions.DataMapperError("Error while opening mirror: {}".format(ex))
+
+    def close(self):
+        """
+        Close the database.
+
+        :return:
+        """
+        self._conn.close()
+
+    def _get(self, kind, obj_id):
+        """
+        Get object data.
+
+        :param kind:
+        :param obj_id:
+        :return: dict or None
+        """
+        row = self._conn.execute("SELECT data FROM objects WHERE kind = ? AND id = ?", (kind, obj_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, kind, obj, board_id, parent=None):
+        """
+        Store object data.
+
+        :param kind:
+        :param obj: dict
+        :param board_id:
+        :param parent: ID of the list of the card or of the card of the comment.
+        :return:
+        """
+        pos = obj.get("pos")
+        self._conn.execute("INSERT OR REPLACE INTO objects (kind, id, board, parent, pos, data) "
+                           "VALUES (?, ?, ?, ?, ?, ?)",
+                           (kind, obj["id"], board_id, parent, pos if isinstance(pos, (int, float)) else None,
+                            json.dumps(obj)))
+
+    def _merge(self, kind, obj, board_id, parent=None):
+        """
+        Update fields of the object, creating it if it is not there.
+
+        :param kind:
+        :param obj: dict with the changed fields
+        :param board_id:
+        :param parent: by default, the list of the card.
+        :return: merged data
+        """
+        data = self._get(kind, obj["id"]) or {}
+        data.update(obj)
+        self._put(kind, data, board_id, data.get("idList") if parent is None else parent)
+        return data
+
+    def _delete(self, kind, obj_id):
+        """
+        Delete object.
+
+        :param kind:
+        :param obj_id:
+        :return:
+        """
+        self._conn.execute("DELETE FROM objects WHERE kind = ? AND id = ?", (kind, obj_id))
+
+    def _children(self, kind, parent, order="pos"):
+        """
+        Get open objects of the parent.
+
+        :param kind:
+        :param parent:
+        :param order:
+        :return: list of dicts
+        """
+        return [obj for obj in (json.loads(row[0]) for row in self._conn.execute(
+            "SELECT data FROM objects WHERE kind = ? AND parent = ? ORDER BY {}".format(order), (kind, parent)))
+                if not obj.get("closed")]
+
+    def get_board_id(self, kind, obj_id):
+        """
+        Get board of the mirrored object.
+
+        :param kind:
+        :param obj_id:
+        :return: board ID or None, if the object is not mirrored.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT board FROM objects WHERE kind = ? AND id = ?", (kind, obj_id)).fetchone()
+        return row[0] if row else None
+
+    def get_age(self, board_id):
+        """
+        Get seconds since the last sync of the board.
+
+        :param board_id:
+        :return: seconds or None, if the board is not mirrored.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT synced FROM boards WHERE id = ?", (board_id,)).fetchone()
+        return time.time() - row[0] if row else None
+
+    def get_boards(self):
+        """
+        Get IDs of the mirrored boards.
+
+        :return:
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT id FROM boards ORDER BY id")]
+
+    def sync(self, board_id):
+        """
+        Pull the board completely on the first sync, apply actions
+        since the last synchronised one afterwards.
+
+        :param board_id:
+        :return: number of the applied actions, or None after the full pull.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT cursor FROM boards WHERE id = ?", (board_id,)).fetchone()
+        if row is None:
+            self.pull(board_id)
+            return None
+
+        cursor = row[0]
+        query = {"filter": "all"}
+        if cursor:
+            query["since"] = cursor
+        actions = list(self._client._pages("boards/{}/actions".format(board_id), query=query,
+                                           limit=self._client.ACTIONS_LIMIT, refresh=True))
+        with self._lock, self._conn:
+            for action in reversed(actions):
+                self._apply(board_id, action)
+            self._conn.execute("UPDATE boards SET cursor = ?, synced = ? WHERE id = ?",
+                               (actions[0]["id"] if actions else cursor, time.time(), board_id))
+
+        return len(actions)
+
+    def pull(self, board_id):
+        """
+        Replace the mirrored board with the complete one.
+
+        :param board_id:
+        :return:
+        """
+        # Cursor is taken first: actions during the pull are applied once more on the next sync
+        newest = self._client._request("boards/{}/actions".format(board_id), query={"filter": "all", "limit": 1},
+                                       refresh=True)
+        board = self._client._request("boards/{}".format(board_id), query={
+            "fields": "all", "lists": "open", "cards": "open", "labels": "all",
+            "actions": "commentCard", "actions_limit": self._client.ACTIONS_LIMIT}, refresh=True)
+        actions = board.pop("actions", [])
+        if len(actions) == self._client.ACTIONS_LIMIT:
+            actions.extend(self._client._pages("boards/{}/actions".format(board_id),
+                                               query={"filter": "commentCard", "before": actions[-1]["id"]},
+                                               limit=self._client.ACTIONS_LIMIT, refresh=True))
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM objects WHERE board = ?", (board_id,))
+            for t_list in board.pop("lists", []):
+                self._put(self.K_LIST, t_list, board_id, board_id)
+            for card in board.pop("cards", []):
+                self._put(self.K_CARD, card, board_id, card["idList"])
+            for label in board.pop("labels", []):
+                self._put(self.K_LABEL, label, board_id, board_id)
+            for action in actions:
+                self._put(self.K_ACTION, action, board_id, action["data"]["card"]["id"])
+            self._put(self.K_BOARD, board, board_id)
+            self._conn.execute("INSERT OR REPLACE INTO boards (id, cursor, synced) VALUES (?, ?, ?)",
+                               (board_id, newest[0]["id"] if newest else None, time.time()))
+
+    def apply_action(self, board_id, action):
+        """
+        Apply the action of the board to the mirror.
+
+        :param board_id:
+        :param action: action as Trello returns it.
+        :return: True, if the action has changed the mirror.
+        """
+        with self._lock, self._conn:
+            return self._apply(board_id, action)
+
+    def apply_actions(self, actions):
+        """
+        Apply actions of the mirrored boards in one transaction.
+        Actions of the boards, which are not mirrored, are skipped.
+
+        :param actions: list of (board ID, action) tuples, from the oldest ones.
+        :return: number of the applied actions
+        """
+        applied = 0
+        with self._lock, self._conn:
+            boards = set(self.get_boards())
+            for board_id, action in actions:
+                if board_id in boards and self._apply(board_id, action):
+                    applied += 1
+
+        return applied
+
+    def _apply(self, board_id, action):
+        """
+        Apply the action, which type is known.
+
+        :param board_id:
+        :param action:
+        :return:
+        """
+        a_type, data = action.get("type"), action.get("data", {})
+        card, t_list, label = data.get("card"), data.get("list"), data.get("label")
+
+        if a_type in ("createCard", "copyCard", "moveCardToBoard", "convertToCardFromCheckItem"):
+            card = dict(card, idBoard=board_id)
+            if t_list:
+                card["idList"] = t_list["id"]
+            self._merge(self.K_CARD, card, board_id)
+        elif a_type == "updateCard":
+            card = dict(card)
+            if data.get("listAfter"):
+                card["idList"] = data["listAfter"]["id"]
+            self._merge(self.K_CARD, card, board_id)
+        elif a_type in ("deleteCard", "moveCardFromBoard"):
+            self._delete(self.K_CARD, card["id"])
+            self._conn.execute("DELETE FROM objects WHERE kind = ? AND parent = ?", (self.K_ACTION, card["id"]))
+        elif a_type in ("createList", "updateList", "moveListToBoard"):
+            self._merge(self.K_LIST, dict(t_list, idBoard=board_id), board_id, board_id)
+        elif a_type == "moveListFromBoard":
+            self._delete(self.K_LIST, t_list["id"])
+        elif a_type in ("createLabel", "updateLabel"):
+            self._merge(self.K_LABEL, dict(label, idBoard=board_id), board_id, board_id)
+        elif a_type == "deleteLabel":
+            self._delete(self.K_LABEL, label["id"])
+        elif a_type in ("addLabelToCard", "removeLabelFromCard"):
+            c_data = self._get(self.K_CARD, card["id"])
+            if c_data is None:
+                return False
+            id_labels = [l_id for l_id in c_data.get("idLabels") or [] if l_id != label["id"]]
+            if a_type == "addLabelToCard":
+                id_labels.append(label["id"])
+                self._merge(self.K_LABEL, dict(label, idBoard=board_id), board_id, board_id)
+            self._merge(self.K_CARD, {"id": card["id"], "idLabels": id_labels}, board_id)
+        elif a_type == "commentCard":
+            self._put(self.K_ACTION, action, board_id, card["id"])
+        elif a_type in ("updateComment", "deleteComment"):
+            comment = self._get(self.K_ACTION, data["action"]["id"])
+            if comment is None:
+                return False
+            if a_type == "deleteComment":
+                self._delete(self.K_ACTION, comment["id"])
+            else:
+                comment["data"]["text"] = data["action"]["text"]
+                self._put(self.K_ACTION, comment, board_id, comment["data"]["card"]["id"])
+        elif a_type == "updateBoard":
+            self._merge(self.K_BOARD, data["board"], board_id)
+        else:
+            return False
+
+        return True
+
+    def _get_list(self, list_id):
+        """
+        Get list data with its cards.
+
+        :param list_id:
+        :return:
+        """
+        t_list = self._get(self.K_LIST, list_id)
+        if t_list is None:
+            raise trololo.exceptions.UnknownResourceError("List {} is not mirrored".format(list_id))
+        t_list["cards"] = self._children(self.K_CARD, list_id)
+
+        return t_list
+
+    def _get_card(self, card_id):
+        """
+        Get card data with its comments, from the newest ones.
+
+        :param card_id:
+        :return:
+        """
+        card = self._get(self.K_CARD, card_id)
+        if card is None:
+            raise trololo.exceptions.UnknownResourceError("Card {} is not mirrored".format(card_id))
+        card["actions"] = self._children(self.K_ACTION, card_id, order="id DESC")
+
+        return card
+
+    def get_board_tree(self, board_id, cards=True, actions=True, labels=True, lists=True, **fields):
+        """
+        Get the board with its open lists, their cards, comments of
+        the cards and labels of the board, as TrololoClient does.
+
+        :param board_id:
+        :param cards: include cards of the lists
+        :param actions: include comments of the cards
+        :param labels: include labels of the board
+        :param lists: include open lists of the board
+        :param fields: ignored, all the fields are there.
+        :return: TrololoBoard
+        """
+        with self._lock:
+            board = self._get(self.K_BOARD, board_id)
+            if board is None:
+                raise trololo.exceptions.UnknownResourceError("Board {} is not mirrored".format(board_id))
+            board["lists"] = self._children(self.K_LIST, board_id) if lists else []
+            if cards:
+                for t_list in board["lists"]:
+                    t_list["cards"] = self._children(self.K_CARD, t_list["id"])
+                    if actions:
+                        for card in t_list["cards"]:
+                            card["actions"] = self._children(self.K_ACTION, card["id"], order="id DESC")
+            if labels:
+                board["labels"] = self._children(self.K_LABEL, board_id)
+
+        return TrololoBoard.load(self._client, board)
+
+    def get_lists(self, *ids, **fields):
+        """
+        Get lists by IDs, along with their cards.
+
+        :param ids:
+        :param fields: ignored, all the fields are there.
+        :return:
+        """
+        with self._lock:
+            return [TrololoList.load(self._client, self._get_list(list_id)) for list_id in ids]
+
+    def get_cards(self, *ids, **fields):
+        """
+        Get cards by IDs, along with their comments.
+
+        :param ids:
+        :param fields: ignored, all the fields are there.
+        :return:
+        """
+        with self._lock:
+            return [TrololoCard.load(self._client, self._get_card(card_id)) for card_id in ids]
+
+    def get_actions(self, *ids):
+        """
+        Get comments of the cards by card IDs.
+
+        :param ids:
+        :return: list of the action lists, in order of the card IDs
+        """
+        with self._lock:
+            return [[TrololoAction.load(self._client, action)
+                     for action in self._children(self.K_ACTION, card_id, order="id DESC")] for card_id in ids]
@@ -0,0 +1,689 @@
+# coding=utf-8
+"""
+Trigram index of the names for the substring and typo-tolerant lookup.
+
+Index file is memory-mapped and read on demand. Layout (little-endian):
+
+    header:   magic, version, number of names, number of trigrams, stamp length
+    stamp:    pickled version of the indexed source
+    trigrams: trigram (12 bytes), offset of its postings, number of postings, sorted by trigram
+    sizes:    per name, number of its trigrams
+    offsets:  per name, offset of its record
+    postings: per trigram, positions of the names
+    records:  name length, name, IDs length, comma-separated IDs, sorted by name
+
+Changes of the names are appended to the journal of the file and
+merged into it, once the journal grows big.
+"""
+
+import os
+import sys
+import mmap
+import array
+import heapq
+import pickle
+import struct
+import tempfile
+import collections
+
+import trololo.exceptions
+
+
+class TrololoNgramIndex(object):
+    """
+    Index of the names by their trigrams. Names are compared case-insensitively.
+    Candidates are the names, which share enough trigrams with the text,
+    ranked by their similarity: exact names first, then the names,
+    containing the text, then the names, looking alike.
+    """
+    N = 3
+    THRESHOLD = 0.3
+
+    def __init__(self, items=()):
+        """
+        Names to index.
+
+        :param items: iterable of (name, IDs) tuples
+        """
+        self._names = []
+        self._ids = []
+        self._sizes = array.array("I")
+        self._positions = {}
+        self._postings = {}
+        self.update(items)
+
+    @classmethod
+    def _normalise(cls, text):
+        """
+        Normalise the text for the comparison.
+
+        :param text:
+        :return:
+        """
+        return " ".join(text.lower().split())
+
+    @classmethod
+    def _get_grams(cls, key):
+        """
+        Get trigrams of the normalised text. The text is padded, so the
+        short texts and the beginnings of the names are matched too.
+
+        :param key:
+        :return: set of trigrams
+        """
+        padded = " {} ".format(key)
+        return {padded[idx:idx + cls.N] for idx in range(max(1, len(padded) - cls.N + 1))}
+
+    @classmethod
+    def _score(cls, key, size, common, name_size, name=None):
+        """
+        Score similarity of the name to the text.
+
+        :param key: normalised text
+        :param size: number of trigrams of the text
+        :param common: number of trigrams, shared by the text and the name
+        :param name_size: number of trigrams of the name
+        :param name: name, if it may contain the text
+        :return: score
+        """
+        name_key = cls._normalise(name) if name is not None else ""
+        if key in name_key:
+            return 2.0 if name_key == key else 1.0 + len(key) / len(name_key)
+
+        return 2.0 * common / (size + name_size)
+
+    def add(self, name, *ids):
+        """
+        Add IDs of the name.
+
+        :param name:
+        :param ids:
+        :return: True, if the index has changed.
+        """
+        pos = self._positions.get(name)
+        if pos is None:
+            pos = self._positions[name] = len(self._names)
+            key = self._normalise(name)
+            grams = self._get_grams(key)
+            self._names.append(name)
+            self._ids.append(" ".join(sorted(set(ids))))
+            self._sizes.append(len(grams))
+            postings = self._postings
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array.array("I")
+                posting.append(pos)
+            return True
+
+        if ids == (self._ids[pos],):
+            return False
+
+        known = set(self._ids[pos].split())
+        if not known.issuperset(ids):
+            self._ids[pos] = " ".join(sorted(known.union(ids)))
+            return True
+
+        return False
+
+    def remove(self, name, *ids):
+        """
+        Remove IDs of the name. Name without IDs is not found anymore.
+
+        :param name:
+        :param ids:
+        :return: True, if the index has changed.
+        """
+        pos = self._positions.get(name)
+        if pos is None:
+            return False
+
+        known = set(self._ids[pos].split())
+        if known.isdisjoint(ids):
+            return False
+        self._ids[pos] = " ".join(sorted(known.difference(ids)))
+
+        return True
+
+    def update(self, items):
+        """
+        Add names, which are not there yet.
+
+        :param items: iterable of (name, IDs) tuples
+        :return: True, if the index has changed.
+        """
+        changed = False
+        for name, ids in items:
+            changed = self.add(name, *ids) or changed
+
+        return changed
+
+    def items(self):
+        """
+        Get all the names with IDs.
+
+        :return: generator of (name, IDs) tuples
+        """
+        for name, ids in zip(self._names, self._ids):
+            if ids:
+                yield name, set(ids.split())
+
+    def __len__(self):
+        return len(self._names)
+
+    def find(self, text, limit=10, threshold=THRESHOLD):
+        """
+        Find names, similar to the text.
+
+        :param text:
+        :param limit: maximum number of the candidates.
+        :param threshold: minimal similarity of the names, which look alike.
+        :return: list of (name, IDs, score) tuples, from the best matches.
+                 Score is 2 for the exact name, more than 1 for the name, containing
+                 the text, and between the threshold and 1 for the similar name.
+        """
+        key = self._normalise(text)
+        grams = self._get_grams(key)
+        counts = collections.Counter()
+        for gram in grams:
+            counts.update(self._postings.get(gram, ()))
+
+        size, names, sizes, ids = len(grams), self._names, self._sizes, self._ids
+        candidates = []
+        for pos, common in counts.items():
+            if not ids[pos]:
+                continue
+            # Only the padded ends of the text can be missing in the name, which contains it
+            score = self._score(key, size, common, sizes[pos], names[pos] if common >= size - 2 else None)
+            if score >= threshold:
+                candidates.append((score, pos))
+
+        out = []
+        for score, pos in sorted(candidates, key=lambda candidate: (-candidate[0], self._names[candidate[1]]))[:limit]:
+            out.append((self._names[pos], set(self._ids[pos].split()), score))
+
+        return out
+
+
+class TrololoNgramFile(object):
+    """
+    Reader and writer of the trigram index file.
+    """
+    MAGIC = b"EDNG"
+    VERSION = 1
+    GRAM_SIZE = 12
+    F_HEADER = struct.Struct("<4sIIII")
+    F_GRAM = struct.Struct("<{}sQI".format(GRAM_SIZE))
+    F_OFFSET = struct.Struct("<Q")
+    F_LENGTH = struct.Struct("<I")
+
+    def __init__(self, path):
+        """
+        Open index file. Only the header is read.
+
+        :param path:
+        """
+        self.stamp = None
+        self._map = None
+        self._count = self._grams = 0
+        self._sizes = None
+        with open(path, "rb") as ngh:
+            if os.fstat(ngh.fileno()).st_size:
+                self._map = mmap.mmap(ngh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map is None:
+            return
+
+        magic, version, self._count, self._grams, length = self.F_HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.close()
+            raise trololo.exceptions.DataMapperError("Unknown format of the name index {}".format(path))
+
+        self.stamp = pickle.loads(self._map[self.F_HEADER.size:self.F_HEADER.size + length])
+        self._grams_offset = self.F_HEADER.size + length
+        self._sizes_offset = self._grams_offset + self._grams * self.F_GRAM.size
+        self._offsets_offset = self._sizes_offset + self._count * self.F_LENGTH.size
+
+    def close(self):
+        """
+        Unmap the file.
+
+        :return:
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _get_array(data):
+        """
+        Get array of the little-endian numbers.
+
+        :param data: bytes
+        :return: array
+        """
+        numbers = array.array("I")
+        numbers.frombytes(data)
+        if sys.byteorder == "big":
+            numbers.byteswap()
+
+        return numbers
+
+    def _get_offset(self, pos):
+        """
+        Get offset of the record by the position of the name.
+
+        :param pos:
+        :return:
+        """
+        return self.F_OFFSET.unpack_from(self._map, self._offsets_offset + pos * self.F_OFFSET.size)[0]
+
+    def _get_name(self, offset):
+        """
+        Read the name of the record.
+
+        :param offset: offset of the record
+        :return: name as bytes
+        """
+        length, = self.F_LENGTH.unpack_from(self._map, offset)
+        offset += self.F_LENGTH.size
+        return self._map[offset:offset + length]
+
+    def get_name(self, pos):
+        """
+        Get name by its position.
+
+        :param pos:
+        :return:
+        """
+        return self._get_name(self._get_offset(pos)).decode("utf-8")
+
+    def get_ids(self, pos):
+        """
+        Get IDs of the name by its position.
+
+        :param pos:
+        :return: set of IDs
+        """
+        offset = self._get_offset(pos)
+        offset += self.F_LENGTH.size + len(self._get_name(offset))
+        length, = self.F_LENGTH.unpack_from(self._map, offset)
+        offset += self.F_LENGTH.size
+
+        return set(self._map[offset:offset + length].decode("utf-8").split(","))
+
+    def get_position(self, name):
+        """
+        Get position of the name.
+
+        :param name:
+        :return: position or None, if there is no such name
+        """
+        name = name.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._get_name(self._get_offset(mid)) < name:
+                low = mid + 1
+            else:
+                high = mid
+
+        return low if low < self._count and self._get_name(self._get_offset(low)) == name else None
+
+    def get_posting(self, gram):
+        """
+        Get positions of the names, having the trigram.
+
+        :param gram:
+        :return: array of positions
+        """
+        gram = gram.encode("utf-8").ljust(self.GRAM_SIZE, b"\0")
+        low, high = 0, self._grams
+        while low < high:
+            mid = (low + high) // 2
+            if self.F_GRAM.unpack_from(self._map, self._grams_offset + mid * self.F_GRAM.size)[0] < gram:
+                low = mid + 1
+            else:
+                high = mid
+
+        if low < self._grams:
+            r_gram, offset, count = self.F_GRAM.unpack_from(self._map, self._grams_offset + low * self.F_GRAM.size)
+            if r_gram == gram:
+                return self._get_array(self._map[offset:offset + count * self.F_LENGTH.size])
+
+        return ()
+
+    def get_sizes(self):
+        """
+        Get numbers of the trigrams of the names. These are read once.
+
+        :return: array of sizes
+        """
+        if self._sizes is None:
+            self._sizes = self._get_array(self._map[self._sizes_offset:self._offsets_offset] if self._count else b"")
+
+        return self._sizes
+
+    def items(self):
+        """
+        Get all the names with IDs.
+
+        :return: generator of (position, name, IDs) tuples, sorted by name
+        """
+        for pos in range(self._count):
+            yield pos, self.get_name(pos), self.get_ids(pos)
+
+    @classmethod
+    def write(cls, path, items, stamp):
+        """
+        Write index file atomically.
+
+        :param path:
+        :param items: iterable of (name, IDs) tuples
+        :param stamp: version of the indexed source
+        :return:
+        """
+        records = sorted((name.encode("utf-8"), ",".join(sorted(ids)).encode("utf-8"), name)
+                         for name, ids in items if ids)
+        sizes = array.array("I")
+        postings = collections.defaultdict(list)
+        for pos, (_, _, name) in enumerate(records):
+            grams = TrololoNgramIndex._get_grams(TrololoNgramIndex._normalise(name))
+            sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(pos)
+        grams = sorted((gram.encode("utf-8"), array.array("I", posting)) for gram, posting in postings.items())
+        postings.clear()
+        if sys.byteorder == "big":
+            sizes.byteswap()
+            for _, posting in grams:
+                posting.byteswap()
+
+        stamp = pickle.dumps(stamp)
+        offset = (cls.F_HEADER.size + len(stamp) + cls.F_GRAM.size * len(grams) +
+                  (cls.F_LENGTH.size + cls.F_OFFSET.size) * len(records))
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), prefix=".", delete=False) as ngh:
+            ngh.write(cls.F_HEADER.pack(cls.MAGIC, cls.VERSION, len(records), len(grams), len(stamp)) + stamp)
+            for gram, posting in grams:
+                ngh.write(cls.F_GRAM.pack(gram, offset, len(posting)))
+                offset += cls.F_LENGTH.size * len(posting)
+            ngh.write(sizes.tobytes())
+            for name, ids, _ in records:
+                ngh.write(cls.F_OFFSET.pack(offset))
+                offset += cls.F_LENGTH.size * 2 + len(name) + len(ids)
+            for _, posting in grams:
+                ngh.write(posting.tobytes())
+            for name, ids, _ in records:
+                ngh.write(cls.F_LENGTH.pack(len(name)) + name + cls.F_LENGTH.pack(len(ids)) + ids)
+        os.replace(ngh.name, path)
+
+
+class TrololoNgramStore(TrololoNgramIndex):
+    """
+    Trigram index, kept on the disk. Names of the index file are read
+    on demand, changes of them are kept in the memory and appended to
+    the journal of the file.
+
+    Stamp is an opaque version of the indexed source. Every record of
+    the journal brings the index from one version of the source to the
+    next one, so the index is out of date (stamp is None), once a
+    change of the source is missing.
+    """
+    JOURNAL_SUFFIX = ".journal"
+    JOURNAL_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, path):
+        """
+        Path to the index file.
+
+        :param path:
+        """
+        super(TrololoNgramStore, self).__init__()
+        self.stamp = None
+        self._path = path
+        self._file = None
+        self._changed = {}
+        self.load()
+
+    def load(self):
+        """
+        Open the index file and replay its journal.
+
+        :return:
+        """
+        self.clear()
+        try:
+            self._file = TrololoNgramFile(self._path)
+        except (OSError, EOFError, struct.error, pickle.UnpicklingError, trololo.exceptions.DataMapperError):
+            return
+        self.stamp = self._file.stamp
+
+        try:
+            with open(self._path + self.JOURNAL_SUFFIX, "rb") as jnh:
+                while True:
+                    self.__apply(pickle.load(jnh))
+        except (EOFError, FileNotFoundError):
+            pass
+        except Exception:
+            self.stamp = None
+
+        if self.stamp is not None and self.__get_journal_size() > self.JOURNAL_SIZE:
+            try:
+                self.compact()
+            except OSError as ex:
+                sys.stderr.write("Error while compacting name index: {}\n".format(ex))
+
+    def close(self):
+        """
+        Unmap the index file.
+
+        :return:
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def clear(self):
+        """
+        Forget all the names.
+
+        :return:
+        """
+        self.close()
+        TrololoNgramIndex.__init__(self)
+        self._changed = {}
+        self.stamp = None
+
+    def __apply(self, record):
+        """
+        Apply the record of the journal.
+
+        :param record: dict with the stamps and the added and removed {name: IDs} dicts
+        :return:
+        """
+        if record["since"] != self.stamp:
+            raise ValueError("Changes of the names are missing")
+        for name, ids in record["added"].items():
+            self.add(name, *ids)
+        for name, ids in record["removed"].items():
+            self.remove(name, *ids)
+        self.stamp = record["stamp"]
+
+    def __get_journal_size(self):
+        """
+        Get size of the journal.
+
+        :return:
+        """
+        try:
+            return os.path.getsize(self._path + self.JOURNAL_SUFFIX)
+        except OSError:
+            return 0
+
+    def __get_position(self, name):
+        """
+        Get position of the name in the index file.
+
+        :param name:
+        :return: position or None, if the name is not there
+        """
+        if self._file is None or name in self._positions:
+            return None
+
+        return self._file.get_position(name)
+
+    def add(self, name, *ids):
+        """
+        Add IDs of the name.
+
+        :param name:
+        :param ids:
+        :return: True, if the index has changed.
+        """
+        pos = self.__get_position(name)
+        if pos is None:
+            return super(TrololoNgramStore, self).add(name, *ids)
+
+        known = self._changed.get(pos)
+        if known is None:
+            known = self._file.get_ids(pos)
+        if known.issuperset(ids):
+            return False
+        self._changed[pos] = known.union(ids)
+
+        return True
+
+    def remove(self, name, *ids):
+        """
+        Remove IDs of the name. Name without IDs is not found anymore.
+
+        :param name:
+        :param ids:
+        :return: True, if the index has changed.
+        """
+        pos = self.__get_position(name)
+        if pos is None:
+            return super(TrololoNgramStore, self).remove(name, *ids)
+
+        known = self._changed.get(pos)
+        if known is None:
+            known = self._file.get_ids(pos)
+        if known.isdisjoint(ids):
+            return False
+        self._changed[pos] = known.difference(ids)
+
+        return True
+
+    def items(self):
+        """
+        Get all the names with IDs.
+
+        :return: generator of (name, IDs) tuples
+        """
+        if self._file is not None:
+            for pos, name, ids in self._file.items():
+                ids = self._changed.get(pos, ids)
+                if ids:
+                    yield name, ids
+        for name, ids in super(TrololoNgramStore, self).items():
+            yield name, ids
+
+    def __len__(self):
+        return super(TrololoNgramStore, self).__len__() + (len(self._file) if self._file is not None else 0)
+
+    def find(self, text, limit=10, threshold=TrololoNgramIndex.THRESHOLD):
+        """
+        Find names, similar to the text. Only the postings of the trigrams
+        of the text and the best candidates are read from the index file.
+
+        :param text:
+        :param limit: maximum number of the candidates.
+        :param threshold: minimal similarity of the names, which look alike.
+        :return: list of (name, IDs, score) tuples, from the best matches.
+        """
+        candidates = [(score, name, ids) for name, ids, score in
+                      super(TrololoNgramStore, self).find(text, limit=limit, threshold=threshold)]
+        if self._file is not None:
+            key = self._normalise(text)
+            grams = self._get_grams(key)
+            counts = collections.Counter()
+            for gram in grams:
+                counts.update(self._file.get_posting(gram))
+
+            size, sizes, scored = len(grams), self._file.get_sizes(), []
+            for pos, common in counts.items():
+                if self._changed.get(pos, True):
+                    score = self._score(key, size, common, sizes[pos],
+                                        self._file.get_name(pos) if common >= size - 2 else None)
+                    if score >= threshold:
+                        scored.append((score, pos))
+
+            # Names are read only for the best candidates and for their ties
+            best = heapq.nlargest(limit, scored)
+            for score, pos in scored if best else ():
+                if score >= best[-1][0]:
+                    candidates.append((score, self._file.get_name(pos),
+                                       self._changed.get(pos) or self._file.get_ids(pos)))
+
+        return [(name, set(ids), score) for score, name, ids in
+                sorted(candidates, key=lambda candidate: (-candidate[0], candidate[1]))[:limit]]
+
+    def write(self, items, stamp):
+        """
+        Write the index file from scratch and empty its journal.
+
+        :param items: iterable of (name, IDs) tuples
+        :param stamp: version of the indexed source
+        :return:
+        """
+        TrololoNgramFile.write(self._path, items, stamp)
+        with open(self._path + self.JOURNAL_SUFFIX, "wb"):
+            pass
+        self.load()
+
+    def compact(self):
+        """
+        Merge the journal into the index file.
+
+        :return:
+        """
+        self.write(list(self.items()), self.stamp)
+
+    def log(self, since, stamp, added, removed):
+        """
+        Apply changes of the source and append them to the journal.
+        Journal is merged into the index file, once it grows over the size limit.
+
+        :param since: version of the source before the changes
+        :param stamp: version of the source after the changes
+        :param added: {name: IDs} dict
+        :param removed: {name: IDs} dict
+        :return:
+        """
+        if since == self.stamp:
+            self.__apply({"since": since, "stamp": stamp, "added": added, "removed": removed})
+        else:
+            self.stamp = None
+        self.append(self._path, since, stamp, added, removed)
+
+        if self.stamp is not None and self.__get_journal_size() > self.JOURNAL_SIZE:
+            self.compact()
+
+    @classmethod
+    def append(cls, path, since, stamp, added, removed):
+        """
+        Append changes of the source to the journal of the index file, if there is one.
+
+        :param path: path to the index file
+        :param since: version of the source before the changes
+        :param stamp: version of the source after the changes
+        :param added: {name: IDs} dict
+        :param removed: {name: IDs} dict
+        :return:
+        """
+        if os.path.exists(path):
+            with open(path + cls.JOURNAL_SUFFIX, "ab") as jnh:
+                pickle.dump({"since": since, "stamp": stamp, "added": added, "removed": removed}, jnh)
@@ -0,0 +1,113 @@
+# coding=utf-8
+"""
+Client-side rate limiting of the Trello requests.
+"""
+
+import time
+import random
+import threading
+
+
+class TrololoRateLimiter(object):
+    """
+    Token bucket, tuned to the Trello limit of requests per token,
+    which follows the rate-limit headers of the responses and
+    backs off the throttled or failed requests.
+    """
+    RATE = 100  # Requests per interval per token
+    INTERVAL = 10  # Seconds
+    RETRIES = 5
+    BACKOFF = 0.5  # Seconds
+    MAX_BACKOFF = 30  # Seconds
+    H_PREFIX = "x-rate-limit-api-"
+
+    def __init__(self, rate=RATE, interval=INTERVAL, retries=RETRIES, backoff=BACKOFF):
+        """
+        Limits of the bucket.
+
+        :param rate: requests per interval.
+        :param interval: interval in seconds.
+        :param retries: how many times to retry throttled or failed request.
+        :param backoff: initial delay of the retry in seconds.
+        """
+        self.retries = retries
+        self.throttled = 0.0
+        self._capacity = float(rate)
+        self._tokens = float(rate)
+        self._fill_rate = float(rate) / interval
+        self._backoff = backoff
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _fill(self):
+        """
+        Refill the bucket for the time passed.
+
+        :return:
+        """
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._fill_rate)
+        self._updated = now
+
+    def _sleep(self, delay):
+        """
+        Wait and account the throttle time.
+
+        :param delay: seconds
+        :return:
+        """
+        with self._lock:
+            self.throttled += delay
+        time.sleep(delay)
+
+    def acquire(self):
+        """
+        Take one request from the bucket, waiting if it is empty.
+
+        :return:
+        """
+        while True:
+            with self._lock:
+                self._fill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self._fill_rate
+            self._sleep(delay)
+
+    def update(self, headers):
+        """
+        Adjust the bucket to the remaining requests, reported by Trello.
+
+        :param headers: response headers
+        :return:
+        """
+        remaining = []
+        for h_name, h_value in headers.items():
+            h_name = h_name.lower()
+            if h_name.startswith(self.H_PREFIX) and h_name.endswith("-remaining"):
+                try:
+                    remaining.append(int(h_value))
+                except (TypeError, ValueError):
+                    pass
+
+        if remaining:
+            with self._lock:
+                self._fill()
+                self._tokens = min(self._tokens, float(min(remaining)))
+
+    def backoff(self, attempt, headers):
+        """
+        Wait before the next attempt: as long as Trello asks for,
+        otherwise with jittered exponential delay.
+
+        :param attempt: number of the failed attempt, starting from 0.
+        :param headers: response headers
+        :return:
+        """
+        try:
+            delay = float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            delay = min(self.MAX_BACKOFF, self._backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+        self._sleep(delay)
@@ -0,0 +1,170 @@
+# coding=utf-8
+"""
+Local full-text index of the cards and comments.
+
+Names and descriptions of the cards and texts of the comments are
+indexed, as Edward fetches them. Search is ranked by BM25, names of
+the cards weigh more than the rest.
+"""
+
+import re
+import sqlite3
+import threading
+
+import trololo.exceptions
+
+
+class TrololoSearchIndex(object):
+    """
+    Inverted index in SQLite FTS5. Documents are updated in place, so
+    the index grows only with the new cards and comments.
+    """
+    INDEX_FILE = ".edward-search.db"
+    K_CARD = "card"
+    K_ACTION = "action"
+    NAME_WEIGHT = 10.0
+    _re_term = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self, path=INDEX_FILE):
+        """
+        Path to the index.
+
+        :param path:
+        """
+        self._lock = threading.RLock()
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute("CREATE TABLE IF NOT EXISTS docs (rowid INTEGER PRIMARY KEY, id TEXT UNIQUE, "
+                                   "kind TEXT, card TEXT, name TEXT, body TEXT)")
+                self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS terms USING fts5(name, body, content='docs', "
+                                   "content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')")
+                self._conn.execute("CREATE TRIGGER IF NOT EXISTS docs_insert AFTER INSERT ON docs BEGIN "
+                                   "INSERT INTO terms (rowid, name, body) VALUES (new.rowid, new.name, new.body); "
+                                   "END")
+                self._conn.execute("CREATE TRIGGER IF NOT EXISTS docs_delete AFTER DELETE ON docs BEGIN "
+                                   "INSERT INTO terms (terms, rowid, name, body) "
+                                   "VALUES ('delete', old.rowid, old.name, old.body); END")
+                self._conn.execute("CREATE TRIGGER IF NOT EXISTS docs_update AFTER UPDATE ON docs BEGIN "
+                                   "INSERT INTO terms (terms, rowid, name, body) "
+                                   "VALUES ('delete', old.rowid, old.name, old.body); "
+                                   "INSERT INTO terms (rowid, name, body) VALUES (new.rowid, new.name, new.body); "
+                                   "END")
+        except sqlite3.Error as ex:
+            raise trololo.exceptions.DataMapperError("Error while opening search index: {}".format(ex))
+
+    def close(self):
+        """
+        Close the index.
+
+        :return:
+        """
+        self._conn.close()
+
+    def _put(self, obj_id, kind, card_id, name, body):
+        """
+        Add or update the document. Unchanged documents are not touched.
+
+        :param obj_id:
+        :param kind:
+        :param card_id:
+        :param name: None to keep the current one.
+        :param body: None to keep the current one.
+        :return:
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT card, name, body FROM docs WHERE id = ?", (obj_id,)).fetchone()
+            if row is None:
+                self._conn.execute("INSERT INTO docs (id, kind, card, name, body) VALUES (?, ?, ?, ?, ?)",
+                                   (obj_id, kind, card_id, name or "", body or ""))
+            else:
+                doc = (card_id or row[0], row[1] if name is None else name, row[2] if body is None else body)
+                if doc != tuple(row):
+                    self._conn.execute("UPDATE docs SET card = ?, name = ?, body = ? WHERE id = ?", doc + (obj_id,))
+
+    def add_card(self, card):
+        """
+        Index name and description of the card.
+        Description is kept, if the card has been fetched without it.
+
+        :param card: TrololoCard
+        :return:
+        """
+        self._put(card.id, self.K_CARD, card.id, card.name, getattr(card, "desc", None))
+
+    def add_action(self, action, card=None):
+        """
+        Index text of the comment.
+
+        :param action: TrololoAction
+        :param card: TrololoCard of the comment, if the action does not tell it.
+        :return:
+        """
+        try:
+            text = action.get_text()
+        except AttributeError:
+            return
+
+        card_id = card.id if card is not None else None
+        if card_id is None:
+            try:
+                card_id = action.data.card.id
+            except AttributeError:
+                pass
+        self._put(action.id, self.K_ACTION, card_id, None, text)
+
+    def remove(self, obj_id):
+        """
+        Remove the document. Comments of the card are removed with it.
+
+        :param obj_id: ID of the card or of the comment
+        :return:
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM docs WHERE id = ? OR card = ?", (obj_id, obj_id))
+
+    def save(self):
+        """
+        Write the changes to the disk.
+
+        :return:
+        """
+        try:
+            with self._lock:
+                self._conn.commit()
+        except sqlite3.Error as ex:
+            raise trololo.exceptions.DataMapperError("Error while saving search index: {}".format(ex))
+
+    def get_query(self, text):
+        """
+        Convert the text to the query: all the words should be found,
+        the last one as a prefix.
+
+        :param text:
+        :return: FTS5 query or None, if there are no words.
+        """
+        terms = ['"{}"'.format(term) for term in self._re_term.findall(text)]
+        if not terms:
+            return None
+        terms[-1] += "*"
+
+        return " ".join(terms)
+
+    def search(self, text, limit=20):
+        """
+        Find cards and comments.
+
+        :param text:
+        :param limit:
+        :return: list of (kind, ID, card ID, name of the card, snippet) tuples, from the best matches.
+        """
+        query = self.get_query(text)
+        if query is None:
+            return []
+
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute(
+                "SELECT docs.kind, docs.id, docs.card, COALESCE(cards.name, docs.name), "
+                "snippet(terms, 1, '[', ']', '...', 8) FROM terms JOIN docs ON docs.rowid = terms.rowid "
+                "LEFT JOIN docs AS cards ON cards.id = docs.card WHERE terms MATCH ? "
+                "ORDER BY bm25(terms, ?, 1.0) LIMIT ?", (query, self.NAME_WEIGHT, limit))]
@@ -0,0 +1,276 @@
+# coding=utf-8
+"""
+Local receiver of the Trello webhooks.
+
+Trello posts every action of the watched model (e.g. a board) to the
+registered callback URL. Actions are applied to the mapper and to the
+mirror of the boards in batches: new names are added to the mapper and
+to the search index, the old names of the renamed objects and the
+deleted objects are removed.
+"""
+
+import hmac
+import json
+import sys
+import base64
+import hashlib
+import threading
+import http.server
+import socketserver
+
+from trololo.lalala import TrololoBoard, TrololoList, TrololoCard, TrololoLabel, TrololoAction
+
+
+class _TrololoWebhookHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handler of the webhook requests.
+    """
+    def do_HEAD(self):
+        """
+        Trello checks the callback URL is alive, before registering it.
+
+        :return:
+        """
+        self.send_response(200)
+        self.end_headers()
+
+    def do_POST(self):
+        """
+        Accept the payload of the action. Payload, which is not
+        a JSON object with the action, is refused.
+
+        :return:
+        """
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self.server.receiver.verify(body, self.headers.get("X-Trello-Webhook")):
+            self.send_response(401)
+        else:
+            try:
+                payload = json.loads(body.decode("utf-8"))
+            except ValueError:
+                payload = None
+            if isinstance(payload, dict) and isinstance(payload.get("action"), dict):
+                self.server.receiver.put(payload)
+                self.send_response(200)
+            else:
+                self.send_response(400)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        """
+        Keep the output for the results.
+
+        :return:
+        """
+
+
+class _TrololoHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    HTTP server, handling requests in threads.
+    """
+    daemon_threads = True
+
+
+class TrololoWebhookReceiver(object):
+    """
+    Receives actions from the webhooks and applies them in batches:
+    once there are enough of them or once the flush interval passes.
+    """
+    BATCH_SIZE = 50
+    FLUSH_INTERVAL = 5.0
+
+    def __init__(self, mapper, mirror=None, host="127.0.0.1", port=8080, secret=None, callback_url=None,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, index=None):
+        """
+        Mapper, mirror and search index to update, address to listen on and
+        the secret of the application with the callback URL to verify payloads.
+
+        :param mapper: TrololoIdMapper
+        :param mirror: TrololoMirror, optional
+        :param host:
+        :param port: 0 to pick any free port
+        :param secret: application secret of Trello. Payloads are not verified without it.
+        :param callback_url: URL, registered for the webhook
+        :param batch_size:
+        :param flush_interval: seconds
+        :param index: TrololoSearchIndex, optional
+        """
+        self._mapper = mapper
+        self._mirror = mirror
+        self._index = index
+        self._secret = secret
+        self._callback_url = callback_url
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flusher = None
+        self._server = _TrololoHTTPServer((host, port), _TrololoWebhookHandler)
+        self._server.receiver = self
+        self.applied = 0
+
+    @property
+    def address(self):
+        """
+        Host and port, the server listens on.
+
+        :return:
+        """
+        return self._server.server_address
+
+    def verify(self, body, signature):
+        """
+        Verify the payload is signed by Trello.
+
+        :param body: bytes
+        :param signature: value of X-Trello-Webhook header
+        :return:
+        """
+        if not self._secret:
+            return True
+
+        digest = hmac.new(self._secret.encode("utf-8"), body + (self._callback_url or "").encode("utf-8"),
+                          hashlib.sha1).digest()
+        return hmac.compare_digest(base64.b64encode(digest).decode("ascii"), signature or "")
+
+    def put(self, payload):
+        """
+        Queue the action of the payload.
+
+        :param payload: webhook payload with "action" and "model"
+        :return:
+        """
+        action = payload.get("action")
+        if not action:
+            return
+
+        with self._lock:
+            self._pending.append(action)
+            full = len(self._pending) >= self._batch_size
+        if full:
+            self.flush()
+
+    def _add_names(self, action):
+        """
+        Collect names of the objects in the action.
+
+        :param action:
+        :return:
+        """
+        data = action.get("data", {})
+        for key, cls, add in (("board", TrololoBoard, self._mapper.add_board),
+                              ("list", TrololoList, self._mapper.add_list),
+                              ("card", TrololoCard, self._mapper.add_card),
+                              ("label", TrololoLabel, self._mapper.add_label)):
+            obj = data.get(key)
+            if obj and obj.get("id") and obj.get("name"):
+                add(cls.load(None, obj))
+                if self._index is not None and key == "card":
+                    self._index.add_card(TrololoCard.load(None, obj))
+        if action.get("type") == "commentCard" and data.get("text"):
+            self._mapper.add_action(TrololoAction.load(None, action))
+            if self._index is not None:
+                self._index.add_action(TrololoAction.load(None, action))
+
+    def _forget_names(self, action):
+        """
+        Forget the old names of the renamed objects and the deleted objects in the action.
+
+        :param action:
+        :return:
+        """
+        a_type, data = action.get("type"), action.get("data", {})
+        mapper, old = self._mapper, data.get("old") or {}
+        for key, section in (("board", mapper.S_BOARD), ("list", mapper.S_LIST), ("card", mapper.S_CARD),
+                             ("label", mapper.S_LABEL)):
+            obj = data.get(key) or {}
+            if not obj.get("id"):
+                continue
+            if a_type == "update" + key.title() and old.get("name") and old["name"] != obj.get("name"):
+                mapper.remove(section, obj["id"], old["name"])
+            elif a_type == "delete" + key.title():
+                mapper.remove(section, obj["id"])
+                if self._index is not None and key == "card":
+                    self._index.remove(obj["id"])
+
+        comment = data.get("action") or {}
+        if a_type in ("updateComment", "deleteComment") and comment.get("id"):
+            mapper.remove(mapper.S_ACTION, comment["id"], old.get("text"))
+            if a_type == "updateComment" and comment.get("text"):
+                action = TrololoAction.load(None, {"id": comment["id"],
+                                                   "data": {"text": comment["text"], "card": data.get("card")}})
+                mapper.add_action(action)
+                if self._index is not None:
+                    self._index.add_action(action)
+            elif self._index is not None:
+                self._index.remove(comment["id"])
+
+    def flush(self):
+        """
+        Apply pending actions and save the mapper and the search index.
+
+        :return: number of the actions
+        """
+        with self._flush_lock:
+            with self._lock:
+                actions, self._pending = self._pending, []
+            if not actions:
+                return 0
+
+            for action in actions:
+                self._add_names(action)
+                self._forget_names(action)
+            if self._mirror is not None:
+                self._mirror.apply_actions([(action.get("data", {}).get("board", {}).get("id"), action)
+                                            for action in actions])
+            self._mapper.save()
+            if self._index is not None:
+                self._index.save()
+            self.applied += len(actions)
+
+        return len(actions)
+
+    def _flush_periodically(self):
+        """
+        Flush pending actions every interval, until stopped.
+
+        :return:
+        """
+        while not self._stopped.wait(self._flush_interval):
+            try:
+                self.flush()
+            except Exception as ex:
+                sys.stderr.write("Error while applying webhook actions: {}\n".format(ex))
+
+    def start(self):
+        """
+        Serve in the background.
+
+        :return:
+        """
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def wait(self):
+        """
+        Wait until stopped.
+
+        :return:
+        """
+        # Timeout keeps the main thread interruptible
+        while not self._stopped.wait(1):
+            pass
+
+    def stop(self):
+        """
+        Stop serving and apply the rest of the actions.
+
+        :return:
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._stopped.set()
+        self.flush()